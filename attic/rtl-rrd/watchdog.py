@@ -28,79 +28,155 @@ import subprocess
 import logging
 log = logging.getLogger(__name__)
 
-class WatchdogThread(threading.Thread):
+class Watchdog:
     '''
-    The class WatchdogThread implements a watchdog mechanism.
-    After creating an instance of this class a thread is created that will
-    run for <sleeptime> seconds. If the sleeptime is reached, the method 
-    <action_stop> will be executed and the thread ends.
-    if the method <restart> is called the running thread is ended and a new
-    thread is started. This prevents the call of <action_stop>
-    if <restart> is called when there is no thread running, <action_start> is
+    The class Watchdog implements a watchdog mechanism.
+    A watchdog calls <action_stop>(elapsed_seconds) when it is not fed for
+    <timeout> seconds. When it is fed again after that, <action_start> is
     called to inform the caller that the program resumed its normal course.
+    Feeding a watchdog only sets a new deadline (time.monotonic), all
+    watchdogs share one scheduler thread (see WatchdogScheduler), so several
+    named watchdogs (weather station, P1 meter, ...) use one thread.
     Example:
     def action_start():
         print "program resumed"
-    def action_stop():
+    def action_stop(elapsed_seconds):
         print "program stopped"
     watchdog_period = 10 # after 10 seconds the watchdog calls action_stop()
-    
-    # create and start the first watchdog thread
-    wd = WatchdogThread.restart(action_start,action_stop,watchdog_period)
 
+    wd = Watchdog("weather station", action_start, action_stop, watchdog_period)
     while True:
         do_something_time_consuming_that_may_take_to_long()
-        # restart the watchdog for a new <watchdog_period>
-        wd = WatchdogThread.restart(action_start,action_stop,watchdog_period,wd)
-        
+        # a new <watchdog_period> starts
+        wd.feed()
     '''
-    #thread_count = 0
-
-    def __init__(self, action_start, action_stop, sleeptime=1800):
-        # constructor, setting initial variables
-        log.debug(f"New Watchdog with sleeptime={sleeptime}")
-        self._stopevent = threading.Event(  )
-        self._action_start = action_start
-        self._action_stop = action_stop
-        self._sleepperiod = 1
-        self.sleep_time = sleeptime # default = 1800 = 30 minutes
-        #WatchdogThread.thread_count += 1
-        #name = f"watchdog_{WatchdogThread.thread_count}"
-
-        threading.Thread.__init__(self) #, name=name)
 
-    def run(self):
-        """  main control loop """
-
-        log.debug(f"Watchdog.run {threading.get_ident()}: sleeptime={self.sleep_time},nr of threads={threading.active_count()}")
-        self._start_time = time.time()
-        elapsed_time = 0
-        while not self._stopevent.isSet(  ):
-            elapsed_time += self._sleepperiod
-            self._stopevent.wait(self._sleepperiod)
-            if elapsed_time >= self.sleep_time:
-                log.debug(f"Watchdog.run {threading.get_ident()}: Watchdog elapsed_time = {elapsed_time} >= {self.sleep_time} = self.sleep_time")
-                self._action_stop(elapsed_time)
+    def __init__(self, name, action_start, action_stop, timeout=1800, scheduler=None):
+        self.name = name
+        self.action_start = action_start
+        self.action_stop = action_stop
+        self.timeout = timeout          # default = 1800 = 30 minutes
+        self.scheduler = scheduler or get_watchdog_scheduler()
+        self.fed_time = 0.0             # monotonic time of the last feed
+        self.deadline = None            # None: not running
+        self.expired = False            # action_stop is called
+        self.expiring = False           # deadline passed, action_stop not yet called
+        log.debug(f"New Watchdog {name} with timeout={timeout}")
+        self.scheduler.add(self)
+        self.feed()
+
+    def feed(self):
+        # Start a new period of <timeout> seconds
+        with self.scheduler.condition:
+            resumed = self.expired
+            self.expired = False
+            self.expiring = False       # fed in time after all
+            self.fed_time = time.monotonic()
+            self.deadline = self.fed_time + self.timeout
+            self.scheduler.check_wakeup(self.deadline)
+        if resumed:
+            self.action_start()
+
+    def cancel(self):
+        # Stop the watchdog without calling action_stop
+        with self.scheduler.condition:
+            self.deadline = None
+            self.expiring = False
+
+    def expire(self, now):
+        # Called by the scheduler (without lock) when the deadline passed.
+        # A feed or cancel after the scheduler found the deadline passed wins.
+        with self.scheduler.condition:
+            if not self.expiring:
+                log.debug(f"Watchdog {self.name}: fed in time")
                 return
+            self.expiring = False
+            self.expired = True
+        elapsed_time = int(now - self.fed_time)
+        log.debug(f"Watchdog {self.name}: elapsed_time = {elapsed_time} >= {self.timeout}")
+        self.action_stop(elapsed_time)
+
+    # Same as a running WatchdogThread
+    def is_alive(self):
+        return self.deadline is not None
 
     def join(self, timeout=None):
-        # Stop the thread.
-        seconds_run = time.time() - self._start_time
-        log.debug(f"Watchdog.join ({seconds_run} seconds run) {threading.get_ident()}: with timeout={timeout},nr of threads={threading.active_count()}")
-        self._stopevent.set(  )
-        threading.Thread.join(self, timeout)
+        self.cancel()
+
+# end of class Watchdog
+
+
+class WatchdogScheduler(threading.Thread):
+    '''
+    One thread for all watchdogs: it waits (one condition wait) until the
+    first deadline and calls action_stop of the watchdogs that expired.
+    A feed that moves a deadline further does not wake up the thread.
+    '''
+
+    def __init__(self):
+        threading.Thread.__init__(self, name="watchdog", daemon=True)
+        self.condition = threading.Condition()
+        self.watchdogs = []
+        self.wakeup = None      # monotonic time the thread wakes up (None: no deadline)
+
+    def add(self, watchdog):
+        with self.condition:
+            self.watchdogs.append(watchdog)
+
+    def check_wakeup(self, deadline):
+        # Called with the condition locked: wake up when deadline is earlier
+        if self.wakeup is None or deadline < self.wakeup:
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                expired = [watchdog for watchdog in self.watchdogs
+                           if watchdog.deadline is not None and watchdog.deadline <= now]
+                for watchdog in expired:
+                    watchdog.deadline = None
+                    watchdog.expiring = True
+                if not expired:
+                    deadlines = [watchdog.deadline for watchdog in self.watchdogs
+                                 if watchdog.deadline is not None]
+                    self.wakeup = min(deadlines) if deadlines else None
+                    self.condition.wait(None if self.wakeup is None else self.wakeup - now)
+                    continue
+            # The actions may take some time (kill a process, send a mail)
+            for watchdog in expired:
+                watchdog.expire(now)
+
+# end of class WatchdogScheduler
+
+watchdog_scheduler = None
+watchdog_lock = threading.Lock()
+
+def get_watchdog_scheduler():
+    global watchdog_scheduler
+    with watchdog_lock:
+        if watchdog_scheduler is None:
+            watchdog_scheduler = WatchdogScheduler()
+            watchdog_scheduler.start()
+        return watchdog_scheduler
+
+
+class WatchdogThread:
+    '''
+    Compatible with the former WatchdogThread (a thread per period):
+        wd = WatchdogThread.restart(action_start,action_stop,watchdog_period)
+        wd = WatchdogThread.restart(action_start,action_stop,watchdog_period,wd)
+    returns a Watchdog, restarting feeds the same Watchdog.
+    '''
 
     def restart(action_start, action_stop, num_sec, old_thread=None):
-        log.debug(f"in Watchdog.restart with old_thread={old_thread},nr of threads={threading.active_count()}")
         if old_thread is not None:
-            if old_thread.is_alive():
-                old_thread.join()
-            else:
-                old_thread._action_start()
-
-        new_thread = WatchdogThread(action_start, action_stop, num_sec)
-        new_thread.start()
-        return new_thread
+            old_thread.timeout = num_sec
+            old_thread.feed()
+            return old_thread
+        return Watchdog(action_stop.__name__, action_start, action_stop, num_sec)
+
+# end of class WatchdogThread
 
 # end of file
 
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+
+'''
+    Benchmark: replay of a recorded rtl_433 log (rtl_433_mixed.json: one
+    hour of a Bresser-5in1 weather station and the sensors of neighbours).
+    Routing: the old send_weather (only the Bresser-5in1, fixed idx's)
+    compared to the routing table (Bresser-5in1 temphum/wind/rain and one
+    Nexus-TH channel). Reading: the log is written by a process (cat) and
+    read with Rtl433Reader, the routed packets are put in the queue.
+    Coalescing: the updates sent to Domoticz with a window of 60 seconds,
+    using the time of the packets in the log.
+    Run from this directory: python3 rtl_replay.py [number of replays]
+'''
+
+import os
+import sys
+import json
+import time
+import queue
+import datetime
+import threading
+import subprocess
+import configparser
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import rtl_to_domoticz
+from rtl_to_domoticz import winddir
+
+LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rtl_433_mixed.json")
+DOMOTICZ_URL = "http://localhost:8080"
+
+ROUTES = '''
+[route weather station]
+model = Bresser-5in1
+idx = 12
+template = temphum
+
+[route wind]
+model = Bresser-5in1
+idx = 13
+template = wind
+
+[route rain]
+model = Bresser-5in1
+idx = 14
+template = rain
+
+[route shed]
+model = Nexus-TH
+channel = 1
+idx = 15
+svalue = {temperature_C};{humidity};0
+'''
+
+def send_weather_old(data, urls):
+    # The way send_weather sent the data before
+    if data['model'] == 'Bresser-5in1':
+        tempc = data["temperature_C"]
+        windm = int(10 * float(data["wind_max_m_s"]))
+        winda = int(10 * float(data["wind_avg_m_s"]))
+        windd = data["wind_dir_deg"]
+        humid = data["humidity"]
+        rainmm = data["rain_mm"]
+        urls.append(f"{DOMOTICZ_URL}/json.htm?type=command&param=udevice&idx=13"\
+            + f"&svalue={windd};{winddir(windd)};{winda};{windm};{tempc};0")
+        urls.append(f"{DOMOTICZ_URL}/json.htm?type=command&param=udevice&idx=12"\
+            + f"&svalue={tempc};{humid};0")
+
+def route_new(router, data, urls):
+    routes = router.get_routes(data)
+    if routes:
+        urls.extend(router.get_urls(routes, data))
+
+def bench_routing(name, route, packets):
+    urls = []
+    start = time.perf_counter()
+    for data in packets:
+        route(data, urls)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<14} {len(packets)/elapsed:10.0f} packets/s, {len(urls)} urls")
+
+def bench_coalescing(router, packets, mode):
+    coalescer = rtl_to_domoticz.Coalescer(60, mode, ["temperature_C", "humidity"])
+    urls = []
+    start = time.perf_counter()
+    for data in packets:
+        now = datetime.datetime.strptime(data["time"], "%Y-%m-%d %H:%M:%S").timestamp()
+        for (routes, flushed) in coalescer.flush(now=now):
+            urls.extend(router.get_urls(routes, flushed))
+        routes = router.get_routes(data)
+        if routes:
+            coalescer.add(routes, data, now=now)
+    for (routes, flushed) in coalescer.flush(all=True):
+        urls.extend(router.get_urls(routes, flushed))
+    elapsed = time.perf_counter() - start
+    print(f"{'coalesce '+mode:<14} {len(packets)/elapsed:10.0f} packets/s, {len(urls)} urls, "\
+        + coalescer.report())
+
+def bench_reading(router, replays):
+    packets = queue.Queue(1000)
+    def drain():
+        while True:
+            packets.get()
+            packets.task_done()
+    threading.Thread(target=drain, daemon=True).start()
+    proc = subprocess.Popen(["sh", "-c", f"for i in $(seq {replays}); do cat {LOG_FILE}; done"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    reader = rtl_to_domoticz.Rtl433Reader(proc, packets, router)
+    while reader.is_open():
+        reader.read(timeout=1)
+    proc.wait()
+    packets.join()
+    print(reader.report())
+
+if __name__ == '__main__':
+    replays = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with open(LOG_FILE) as f:
+        packets = [json.loads(line) for line in f] * replays
+    # Without route sections: the routes of domo_idx_temphum and domo_idx_wind
+    default_router = rtl_to_domoticz.get_router({"DOMOTICZ_URL": DOMOTICZ_URL,
+        "routes": rtl_to_domoticz.get_routes(configparser.ConfigParser(),
+                                             {"domo_idx_temphum": 12, "domo_idx_wind": 13})})
+    config_parser = configparser.ConfigParser()
+    config_parser.read_string(ROUTES)
+    router = rtl_to_domoticz.get_router({"DOMOTICZ_URL": DOMOTICZ_URL,
+        "routes": rtl_to_domoticz.get_routes(config_parser, {})})
+    print(f"{len(packets)} packets, {len(router.table)} routing table entries")
+
+    bench_routing("send_weather", send_weather_old, packets)
+    bench_routing("default routes", lambda data, urls: route_new(default_router, data, urls), packets)
+    bench_routing("4 routes", lambda data, urls: route_new(router, data, urls), packets)
+    with open(LOG_FILE) as f:
+        one_hour = [json.loads(line) for line in f]
+    bench_coalescing(default_router, one_hour, "latest")
+    bench_coalescing(default_router, one_hour, "avg")
+    bench_reading(router, replays)
+
+# End Of File
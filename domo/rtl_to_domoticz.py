@@ -26,11 +26,15 @@ import json
 import datetime
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 import sys
 import os
 import signal
 import subprocess
+import selectors
+import queue
 
 import threading
 import logging
@@ -82,7 +86,7 @@ def get_config(config_file):
     if "rtl_to_domoticz" in config_parser:
         my_options = config_parser["rtl_to_domoticz"]
     else:
-        print(f"{configfile_name} has NO section(rtl_to_domoticz)")
+        print(f"{config_file.name} has NO section(rtl_to_domoticz)")
         exit(1)
 
     try:
@@ -107,6 +111,30 @@ def get_config(config_file):
         # URL to your Domoticz server
         config["DOMOTICZ_URL"] = my_options.get('DOMOTICZ_URL', "http://localhost:8080")
 
+        # HTTP connection to Domoticz (kept alive between updates)
+        config["HTTP_POOL_SIZE"] = my_options.getint('HTTP_POOL_SIZE', 2)
+        config["HTTP_RETRIES"] = my_options.getint('HTTP_RETRIES', 2)
+        config["HTTP_CONNECT_TIMEOUT"] = my_options.getfloat('HTTP_CONNECT_TIMEOUT', 0.5)
+        config["HTTP_READ_TIMEOUT"] = my_options.getfloat('HTTP_READ_TIMEOUT', 5)
+
+        # maximum number of received packets waiting to be sent to Domoticz
+        config["QUEUE_SIZE"] = my_options.getint('QUEUE_SIZE', 100)
+
+        # When Domoticz does not answer, the updates are kept in SPOOL_FILE
+        # ("": not kept) and sent again after 1, 2, 4, ... MAX_BACKOFF seconds
+        config["SPOOL_FILE"] = os.path.expanduser(my_options.get('SPOOL_FILE', "rtl_to_domoticz.spool"))
+        config["MAX_BACKOFF"] = my_options.getint('MAX_BACKOFF', 300)
+
+        # Packets of a sensor within COALESCE_WINDOW seconds are sent as one
+        # update: the latest packet (COALESCE_MODE latest) or with the
+        # COALESCE_FIELDS as min, max or avg of the window
+        config["COALESCE_WINDOW"] = my_options.getfloat('COALESCE_WINDOW', 60)
+        config["COALESCE_MODE"] = my_options.get('COALESCE_MODE', "latest")
+        config["COALESCE_FIELDS"] = [field.strip() for field in
+            my_options.get('COALESCE_FIELDS', "temperature_C, humidity").split(",") if field.strip()]
+        if config["COALESCE_MODE"] not in Coalescer.MODES:
+            raise ValueError(f"COALESCE_MODE must be one of {Coalescer.MODES}")
+
         # seconds to wait for next data gathering
         config["POLL_INTERVAL"] = my_options.getint('POLL_INTERVAL',30)  #  30
 
@@ -116,12 +144,15 @@ def get_config(config_file):
         # number of seconds when to give up retrying
         config["GIVE_UP_TIMEOUT"] = my_options.getint('GIVE_UP_TIMEOUT',3600)  # 3600
 
+        # Routes of the packets of sensors to Domoticz devices
+        config["routes"] = get_routes(config_parser, config)
+
         # mail parameters
         config["mail_to"] = my_options.get('mail_to', "")
         config["mail_from"] = my_options.get('mail_from', "")
 
     except ValueError as exc:
-        print(f"Error in configfile ({configfile_name}): {exc}")
+        print(f"Error in configfile ({config_file.name}): {exc}")
         sys.exit(1)
 
     except Exception as exc:
@@ -132,84 +163,174 @@ def get_config(config_file):
     return config
 
 
+def get_routes(config_parser, config):
+    '''
+    Return a list of (model, id, channel, Route) from the [route NAME]
+    sections, e.g.
+        [route garden]
+        model = Bresser-5in1
+        id = *
+        channel = *
+        idx = 12
+        template = temphum
+    Without route sections the weather station (Bresser-5in1) is sent to
+    domo_idx_temphum and domo_idx_wind
+    '''
+    routes = []
+    for section in config_parser.sections():
+        if not section.startswith("route "):
+            continue
+        options = config_parser[section]
+        name = section[len("route "):].strip()
+        route = Route(name, options.getint("idx"), options.get("template", ""),
+                      options.get("svalue", "", raw=True))
+        routes.append((options["model"], options.get("id", "*"),
+                       options.get("channel", "*"), route))
+    if not routes:
+        if config["domo_idx_temphum"]:
+            routes.append(("Bresser-5in1", "*", "*",
+                           Route("temphum", config["domo_idx_temphum"], "temphum")))
+        if config["domo_idx_wind"]:
+            routes.append(("Bresser-5in1", "*", "*",
+                           Route("wind", config["domo_idx_wind"], "wind")))
+    return routes
+
+
 # ====================================================================
 # End of configurable data
 # ====================================================================
 
-class WatchdogThread(threading.Thread):
+class Watchdog:
     '''
-    The class WatchdogThread implements a watchdog mechanism.
-    After creating an instance of this class a thread is created that will
-    run for <sleeptime> seconds. If the sleeptime is reached, the method 
-    <action_stop> will be executed and the thread ends.
-    if the method <restart> is called the running thread is ended and a new
-    thread is started. This prevents the call of <action_stop>
-    if <restart> is called when there is no thread running, <action_start> is
+    The class Watchdog implements a watchdog mechanism.
+    A watchdog calls <action_stop>(elapsed_seconds) when it is not fed for
+    <timeout> seconds. When it is fed again after that, <action_start> is
     called to inform the caller that the program resumed its normal course.
+    Feeding a watchdog only sets a new deadline (time.monotonic), all
+    watchdogs share one scheduler thread (see WatchdogScheduler), so several
+    named watchdogs (weather station, P1 meter, ...) use one thread.
     Example:
     def action_start():
         print "program resumed"
-    def action_stop():
+    def action_stop(elapsed_seconds):
         print "program stopped"
     watchdog_period = 10 # after 10 seconds the watchdog calls action_stop()
-    
-    # create and start the first watchdog thread
-    wd = WatchdogThread.restart(action_start,action_stop,watchdog_period)
 
+    wd = Watchdog("weather station", action_start, action_stop, watchdog_period)
     while True:
         do_something_time_consuming_that_may_take_to_long()
-        # restart the watchdog for a new <watchdog_period>
-        wd = WatchdogThread.restart(action_start,action_stop,watchdog_period,wd)
-        
+        # a new <watchdog_period> starts
+        wd.feed()
     '''
 
-    def __init__(self, action_start, action_stop, sleeptime=1800):
-        # constructor, setting initial variables
-        log.debug(f"New Watchdog with sleeptime={sleeptime}")
-        self._stopevent = threading.Event(  )
-        self._action_start = action_start
-        self._action_stop = action_stop
-        self._sleepperiod = 1
-        self.sleep_time = sleeptime # default = 1800 = 30 minutes
-        #WatchdogThread.thread_count += 1
-        #name = f"watchdog_{WatchdogThread.thread_count}"
-
-        threading.Thread.__init__(self) #, name=name)
-
-    def run(self):
-        """  main control loop """
-
-        log.debug(f"Watchdog.run {threading.get_ident()}: sleeptime={self.sleep_time},nr of threads={threading.active_count()}")
-        self._start_time = time.time()
-        elapsed_time = 0
-        while not self._stopevent.isSet(  ):
-            elapsed_time += self._sleepperiod
-            self._stopevent.wait(self._sleepperiod)
-            if elapsed_time >= self.sleep_time:
-                log.debug(f"Watchdog.run {threading.get_ident()}: Watchdog elapsed_time = {elapsed_time} >= {self.sleep_time} = self.sleep_time")
-                self._action_stop(elapsed_time)
+    def __init__(self, name, action_start, action_stop, timeout=1800, scheduler=None):
+        self.name = name
+        self.action_start = action_start
+        self.action_stop = action_stop
+        self.timeout = timeout          # default = 1800 = 30 minutes
+        self.scheduler = scheduler or get_watchdog_scheduler()
+        self.fed_time = 0.0             # monotonic time of the last feed
+        self.deadline = None            # None: not running
+        self.expired = False            # action_stop is called
+        self.expiring = False           # deadline passed, action_stop not yet called
+        log.debug(f"New Watchdog {name} with timeout={timeout}")
+        self.scheduler.add(self)
+        self.feed()
+
+    def feed(self):
+        # Start a new period of <timeout> seconds
+        with self.scheduler.condition:
+            resumed = self.expired
+            self.expired = False
+            self.expiring = False       # fed in time after all
+            self.fed_time = time.monotonic()
+            self.deadline = self.fed_time + self.timeout
+            self.scheduler.check_wakeup(self.deadline)
+        if resumed:
+            self.action_start()
+
+    def cancel(self):
+        # Stop the watchdog without calling action_stop
+        with self.scheduler.condition:
+            self.deadline = None
+            self.expiring = False
+
+    def expire(self, now):
+        # Called by the scheduler (without lock) when the deadline passed.
+        # A feed or cancel after the scheduler found the deadline passed wins.
+        with self.scheduler.condition:
+            if not self.expiring:
+                log.debug(f"Watchdog {self.name}: fed in time")
                 return
+            self.expiring = False
+            self.expired = True
+        elapsed_time = int(now - self.fed_time)
+        log.debug(f"Watchdog {self.name}: elapsed_time = {elapsed_time} >= {self.timeout}")
+        self.action_stop(elapsed_time)
+
+    # Same as a running WatchdogThread
+    def is_alive(self):
+        return self.deadline is not None
 
     def join(self, timeout=None):
-        # Stop the thread.
-        seconds_run = time.time() - self._start_time
-        log.debug(f"Watchdog.join ({seconds_run} seconds run) {threading.get_ident()}: with timeout={timeout},nr of threads={threading.active_count()}")
-        self._stopevent.set(  )
-        threading.Thread.join(self, timeout)
-
-    def restart(action_start, action_stop, num_sec, old_thread=None):
-        log.debug(f"in Watchdog.restart with old_thread={old_thread},nr of threads={threading.active_count()}")
-        if old_thread is not None:
-            if old_thread.is_alive():
-                old_thread.join()
-            else:
-                old_thread._action_start()
+        self.cancel()
 
-        new_thread = WatchdogThread(action_start, action_stop, num_sec)
-        new_thread.start()
-        return new_thread
+# end of class Watchdog
 
-# end of class WatchdogThread
+
+class WatchdogScheduler(threading.Thread):
+    '''
+    One thread for all watchdogs: it waits (one condition wait) until the
+    first deadline and calls action_stop of the watchdogs that expired.
+    A feed that moves a deadline further does not wake up the thread.
+    '''
+
+    def __init__(self):
+        threading.Thread.__init__(self, name="watchdog", daemon=True)
+        self.condition = threading.Condition()
+        self.watchdogs = []
+        self.wakeup = None      # monotonic time the thread wakes up (None: no deadline)
+
+    def add(self, watchdog):
+        with self.condition:
+            self.watchdogs.append(watchdog)
+
+    def check_wakeup(self, deadline):
+        # Called with the condition locked: wake up when deadline is earlier
+        if self.wakeup is None or deadline < self.wakeup:
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                expired = [watchdog for watchdog in self.watchdogs
+                           if watchdog.deadline is not None and watchdog.deadline <= now]
+                for watchdog in expired:
+                    watchdog.deadline = None
+                    watchdog.expiring = True
+                if not expired:
+                    deadlines = [watchdog.deadline for watchdog in self.watchdogs
+                                 if watchdog.deadline is not None]
+                    self.wakeup = min(deadlines) if deadlines else None
+                    self.condition.wait(None if self.wakeup is None else self.wakeup - now)
+                    continue
+            # The actions may take some time (kill a process, send a mail)
+            for watchdog in expired:
+                watchdog.expire(now)
+
+# end of class WatchdogScheduler
+
+watchdog_scheduler = None
+watchdog_lock = threading.Lock()
+
+def get_watchdog_scheduler():
+    global watchdog_scheduler
+    with watchdog_lock:
+        if watchdog_scheduler is None:
+            watchdog_scheduler = WatchdogScheduler()
+            watchdog_scheduler.start()
+        return watchdog_scheduler
 
 
 def send_mail(mail_to, msg):
@@ -239,20 +360,204 @@ def wd_stop(elapsed_time):
     os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
     mail_program_ended(elapsed_time)
 
+# One session for all updates, the connection to Domoticz is kept alive
+http_session = None
+http_adapter = None
+http_stats = {"requests": 0, "reuses": 0, "errors": 0, "latency": 0.0}
+
+def get_http_session():
+    global http_session, http_adapter
+    if http_session is None:
+        retries = Retry(total=config["HTTP_RETRIES"], read=0, backoff_factor=0.1)
+        http_adapter = HTTPAdapter(pool_connections=1,
+                                   pool_maxsize=config["HTTP_POOL_SIZE"],
+                                   max_retries=retries)
+        http_session = requests.Session()
+        http_session.mount("http://", http_adapter)
+        http_session.mount("https://", http_adapter)
+    return http_session
+
+def log_http_stats():
+    requests_ok = http_stats["requests"] - http_stats["errors"]
+    average = http_stats["latency"]/requests_ok if requests_ok else 0.0
+    log.info(f"Domoticz requests:{http_stats['requests']}, "\
+        + f"reused connections:{http_stats['reuses']}, errors:{http_stats['errors']}, "\
+        + f"average latency:{average*1000:.1f} ms")
+
 def send_url(url):
+    # Returns False when the url must be sent again later
     log.info(f"Url:[{url}]")
 
+    session = get_http_session()
+    http_stats["requests"] += 1
+    start = time.perf_counter()
     try:
-        res = requests.get(url)
+        res = session.get(url,
+            timeout=(config["HTTP_CONNECT_TIMEOUT"], config["HTTP_READ_TIMEOUT"]))
         if res.status_code != 200:
             log.info(f"Result:{res.status_code}, text:{res.text}")
-    except ConnectionError:
-        log.error(f"ConnectionError for url {url} at {timestamp}")
+    except requests.exceptions.RequestException as exc:
+        http_stats["errors"] += 1
+        log.error(f"{type(exc).__name__} for url {url} at {datetime.datetime.now()}")
+        return False
+
+    http_stats["latency"] += time.perf_counter() - start
+    pools = http_adapter.poolmanager.pools
+    connections = sum(pools[key].num_connections for key in pools.keys())
+    http_stats["reuses"] = max(0, http_stats["requests"] - http_stats["errors"] - connections)
+    # A server error may be temporary, other errors will not go away
+    return res.status_code < 500
 
 
+# ====================================================================
+# Sending the updates to Domoticz
+# ====================================================================
+
+class Uploader(threading.Thread):
+    '''
+    The class Uploader sends the urls to Domoticz in its own thread, so
+    reading rtl_433 never waits for Domoticz.
+    send(url) puts the url in a bounded queue (when it is full, the oldest
+    url is dropped). When Domoticz does not answer, the url and all next
+    urls are appended to the spool file (<spool_file>, kept after a restart)
+    and the spool is sent again, in the same order, after 1, 2, 4, ...
+    seconds (at most <max_backoff>). The position in the spool of the
+    urls that were sent is kept in <spool_file>.pos.
+    Example:
+        uploader = Uploader(send_url, "rtl_to_domoticz.spool")
+        uploader.start()
+        uploader.send(url)
+        uploader.stop()
+    '''
+
+    def __init__(self, send_function, spool_file="", queue_size=100,
+                 min_backoff=1, max_backoff=300):
+        threading.Thread.__init__(self, name="uploader", daemon=True)
+        self.send_function = send_function  # send_function(url) returns False when it must be retried
+        self.urls = queue.Queue(queue_size)
+        self.spool_file = spool_file        # "": urls are not kept when Domoticz is down
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = 0                    # 0: Domoticz is up
+        self.retry_time = 0.0               # monotonic time of the next try
+        self.stats = {"sent": 0, "failed": 0, "spooled": 0, "replayed": 0, "dropped": 0}
+        if self.get_spool_position() < self.get_spool_size():
+            log.info(f"Spool {self.spool_file} has urls that are not sent yet")
+            self.backoff = self.min_backoff
+
+    def send(self, url):
+        # Never waits: when the queue is full the oldest url is dropped
+        while True:
+            try:
+                self.urls.put_nowait(url)
+                return
+            except queue.Full:
+                try:
+                    self.urls.get_nowait()
+                    self.stats["dropped"] += 1
+                except queue.Empty:
+                    pass
+
+    def stop(self, timeout=None):
+        # Send (or spool) the urls in the queue and end the thread
+        self.urls.put(None)
+        self.join(timeout)
+
+    def get_spool_size(self):
+        try:
+            return os.path.getsize(self.spool_file) if self.spool_file else 0
+        except OSError:
+            return 0
+
+    def get_spool_position(self):
+        try:
+            with open(self.spool_file+".pos") as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return 0
+
+    def set_spool_position(self, position):
+        with open(self.spool_file+".pos", "w") as f:
+            f.write(str(position))
+
+    def spool(self, url):
+        if not self.spool_file:
+            self.stats["dropped"] += 1
+            return
+        with open(self.spool_file, "a") as f:
+            f.write(url+"\n")
+        self.stats["spooled"] += 1
+
+    def replay(self):
+        '''
+        Send the urls in the spool, in order. Returns True when all are sent,
+        the spool is emptied then.
+        '''
+        position = self.get_spool_position()
+        with open(self.spool_file) as f:
+            f.seek(position)
+            for line in iter(f.readline, ""):
+                if not self.send_function(line.rstrip("\n")):
+                    self.set_spool_position(position)
+                    return False
+                position += len(line.encode("utf-8"))
+                self.stats["replayed"] += 1
+        os.remove(self.spool_file)
+        if os.path.exists(self.spool_file+".pos"):
+            os.remove(self.spool_file+".pos")
+        return True
+
+    def failed(self):
+        self.stats["failed"] += 1
+        self.backoff = min(self.max_backoff, self.backoff*2) if self.backoff else self.min_backoff
+        self.retry_time = time.monotonic() + self.backoff
+        log.warning(f"Domoticz does not answer, trying again in {self.backoff} seconds")
+
+    def run(self):
+        running = True
+        while running:
+            if self.backoff == 0:
+                url = self.urls.get()
+                if url is None:
+                    break
+                if self.send_function(url):
+                    self.stats["sent"] += 1
+                else:
+                    self.spool(url)
+                    if self.spool_file:
+                        self.failed()
+                continue
+
+            # Domoticz is down: new urls go to the spool, after them
+            try:
+                url = self.urls.get(timeout=max(0.0, self.retry_time - time.monotonic()))
+                if url is None:
+                    running = False
+                else:
+                    self.spool(url)
+                continue
+            except queue.Empty:
+                pass
+            if self.replay():
+                log.info(f"Domoticz answers again, the spool is sent")
+                self.backoff = 0
+            else:
+                self.failed()
+
+    def report(self):
+        return f"Domoticz updates sent:{self.stats['sent']}, failed:{self.stats['failed']}, "\
+            + f"spooled:{self.stats['spooled']}, replayed:{self.stats['replayed']}, "\
+            + f"dropped:{self.stats['dropped']}"
+
+# end of class Uploader
+
+# ====================================================================
+# Routing of received packets to Domoticz devices
+# ====================================================================
+
 '''
 =====================
-Temperature/humidity
+Temperature/humidity (template temphum)
 =====================
 URL: /json.htm?type=command&param=udevice&idx=IDX&nvalue=0&svalue=TEMP;HUM;HUM_STAT
 IDX = id of your device (This number can be found in the devices tab in the column "IDX")
@@ -266,14 +571,21 @@ HUM_STAT can be one of:
 2=Dry
 3=Wet
 '''
-def send_temp_hum(temp,hum,hum_stat=0):
+def svalue_temp_hum(data):
+    return f"{data['temperature_C']};{data['humidity']};0"
 
-    get_url = f"{config['DOMOTICZ_URL']}/json.htm?type=command&param=udevice&idx={config['domo_idx_temphum']}&svalue={temp};{hum};{hum_stat}"
-    send_url(get_url)
+'''
+=====================
+Temperature (template temp)
+=====================
+URL: /json.htm?type=command&param=udevice&idx=IDX&nvalue=0&svalue=TEMP
+'''
+def svalue_temp(data):
+    return f"{data['temperature_C']}"
 
 '''
 =====================
-Wind
+Wind (template wind)
 =====================
 URL: /json.htm?type=command&param=udevice&idx=IDX&nvalue=0&svalue=WB;WD;WS;WG;22;24
 IDX = id of your device (This number can be found in the devices tab in the column "IDX")
@@ -286,23 +598,342 @@ WG = 10 * Gust [m/s]
 '''
 windDirection =  ["N","NNE","NE","ENE","E","ESE","SE","SSE","S","SSW","SW","WSW","W","WNW","NW","NNW"]
 def winddir(bearing):
-    return windDirection[int((float(bearing)+11.25)/22.5)]
+    return windDirection[int((float(bearing)+11.25)/22.5) % 16]
+
+def svalue_wind(data):
+    windd = data["wind_dir_deg"]
+    winda = int(10 * float(data["wind_avg_m_s"]))
+    windm = int(10 * float(data["wind_max_m_s"]))
+    return f"{windd};{winddir(windd)};{winda};{windm};{data.get('temperature_C', 0)};0"
+
+'''
+=====================
+Rain (template rain)
+=====================
+URL: /json.htm?type=command&param=udevice&idx=IDX&nvalue=0&svalue=RAINRATE;RAINCOUNTER
+RAINRATE = amount of rain in last hour in [mm x 100] (0: calculated by Domoticz)
+RAINCOUNTER = continues counter of fallen Rain in [mm]
+'''
+def svalue_rain(data):
+    return f"0;{data['rain_mm']}"
+
+TEMPLATES = {"temphum": svalue_temp_hum, "temp": svalue_temp,
+             "wind": svalue_wind, "rain": svalue_rain}
+
+
+class Route:
+    '''
+    A route sends the data of a packet to one Domoticz device (idx), with
+    the svalue made by a template (see TEMPLATES) or by a format string
+    with the fields of the packet, e.g. svalue = {temperature_C};{humidity};0
+    '''
+
+    def __init__(self, name, idx, template="", svalue=""):
+        self.name = name
+        self.idx = idx
+        self.url = ""       # url without svalue, see set_url
+        if svalue:
+            self.get_svalue = lambda data: svalue.format(**data)
+        elif template in TEMPLATES:
+            self.get_svalue = TEMPLATES[template]
+        else:
+            raise ValueError(f"route {name}: unknown template '{template}'")
+
+    def set_url(self, domoticz_url):
+        self.url = f"{domoticz_url}/json.htm?type=command&param=udevice"\
+            + f"&idx={self.idx}&nvalue=0&svalue="
+
+    def get_url(self, data):
+        return self.url + self.get_svalue(data)
+
+# end of class Route
+
+
+class Router:
+    '''
+    The routing table: (model, id, channel) -> routes, '*' matches any id
+    or channel. The routes for the (model, id, channel) of a packet are
+    looked up once and kept, so routing a packet is one dict lookup and
+    packets of other sensors (neighbours) are discarded before anything is
+    converted.
+    '''
+
+    def __init__(self, domoticz_url):
+        self.domoticz_url = domoticz_url
+        self.table = {}     # (model, id, channel) as str -> [Route]
+        self.cache = {}     # (model, id, channel) of packets -> [Route]
+
+    def add(self, model, id, channel, route):
+        route.set_url(self.domoticz_url)
+        self.table.setdefault((model, str(id), str(channel)), []).append(route)
+        self.cache = {}
+
+    def find_routes(self, model, id, channel):
+        # The routes of the most specific entries, id before channel
+        (id, channel) = (str(id), str(channel))
+        for key in ((model, id, channel), (model, id, "*"),
+                    (model, "*", channel), (model, "*", "*")):
+            if key in self.table:
+                return self.table[key]
+        return []
+
+    def get_routes(self, data):
+        key = (data.get("model"), data.get("id"), data.get("channel"))
+        routes = self.cache.get(key)
+        if routes is None:
+            routes = self.find_routes(*key)
+            self.cache[key] = routes
+            if not routes:
+                log.debug(f"Not routed: model={key[0]}, id={key[1]}, channel={key[2]}")
+        return routes
+
+    def get_urls(self, routes, data):
+        urls = []
+        for route in routes:
+            try:
+                urls.append(route.get_url(data))
+            except (KeyError, ValueError, TypeError, IndexError) as exc:
+                log.warning(f"route {route.name}: no data for {data}: {exc!r}")
+        return urls
+
+# end of class Router
+
+def get_router(config):
+    router = Router(config["DOMOTICZ_URL"])
+    for (model, id, channel, route) in config["routes"]:
+        router.add(model, id, channel, route)
+    return router
 
-def send_wind(wb,wd,ws,wg,temp,temp_wc=0):
 
-    get_url = f"{config['DOMOTICZ_URL']}/json.htm?type=command&param=udevice&idx={config['domo_idx_wind']}&svalue={wb};{wd};{ws};{wg};{temp};{temp_wc}"
-    send_url(get_url)
+# ====================================================================
+# Coalescing of the packets of a sensor
+# ====================================================================
+
+class Coalescer:
+    '''
+    The class Coalescer keeps the packets of every sensor (model, id,
+    channel) for <window> seconds and then forwards one packet: the latest
+    one, with the <fields> (e.g. temperature_C, humidity) replaced by the
+    min, max or avg of the window when <mode> is min, max or avg.
+    A packet equal to the previous packet of the sensor within the window
+    (a repeat, the time is not compared) is dropped, so every window still
+    forwards a packet of the sensor. With window 0 every packet is
+    forwarded at once.
+    The received, duplicate and forwarded packets are counted.
+    Example:
+        coalescer = Coalescer(60, "avg", ["temperature_C", "humidity"])
+        coalescer.add(routes, data)
+        for (routes, data) in coalescer.flush():
+            send(routes, data)
+    '''
 
-def send_weather(data):
-    if data['model'] == 'Bresser-5in1':
-        tempc = data["temperature_C"]
-        windm = int(10 * float(data["wind_max_m_s"]))
-        winda = int(10 * float(data["wind_avg_m_s"]))
-        windd = data["wind_dir_deg"]
-        humid = data["humidity"]
-        rainmm = data["rain_mm"]
-        send_wind(windd,winddir(windd),winda,windm,tempc)
-        send_temp_hum(tempc,humid)
+    MODES = ("latest", "min", "max", "avg")
+
+    def __init__(self, window=60, mode="latest", fields=()):
+        if mode not in Coalescer.MODES:
+            raise ValueError(f"COALESCE_MODE must be one of {Coalescer.MODES}, not '{mode}'")
+        self.window = window
+        self.mode = mode
+        self.fields = list(fields)
+        self.last = {}          # sensor -> last packet in the window (without time)
+        self.pending = {}       # sensor -> [deadline, routes, data, {field: [values]}]
+        self.stats = {"received": 0, "duplicates": 0, "forwarded": 0}
+
+    def add(self, routes, data, now=None):
+        # now: time.monotonic(), or another clock (e.g. replaying a log)
+        self.stats["received"] += 1
+        sensor = (data.get("model"), data.get("id"), data.get("channel"))
+        packet = {key: value for (key, value) in data.items() if key != "time"}
+        if sensor in self.pending and self.last.get(sensor) == packet:
+            self.stats["duplicates"] += 1
+            return
+        self.last[sensor] = packet
+        if sensor not in self.pending:
+            self.pending[sensor] = [(now or time.monotonic()) + self.window, routes, data, {}]
+        entry = self.pending[sensor]
+        entry[1] = routes
+        entry[2] = data
+        if self.mode != "latest":
+            for field in self.fields:
+                if isinstance(data.get(field), (int, float)):
+                    entry[3].setdefault(field, []).append(data[field])
+
+    def next_flush(self):
+        # Seconds until the next packet must be forwarded (None: no packets)
+        if not self.pending:
+            return None
+        return max(0.0, min(entry[0] for entry in self.pending.values()) - time.monotonic())
+
+    def flush(self, all=False, now=None):
+        '''
+        Return the (routes, data) of the sensors whose window ended
+        (all=True: of all sensors)
+        '''
+        now = now or time.monotonic()
+        ready = [sensor for (sensor, entry) in self.pending.items() if all or entry[0] <= now]
+        result = []
+        for sensor in ready:
+            (deadline, routes, data, values) = self.pending.pop(sensor)
+            self.last.pop(sensor, None)
+            if values:
+                data = dict(data)
+                for (field, field_values) in values.items():
+                    if self.mode == "min":
+                        data[field] = min(field_values)
+                    elif self.mode == "max":
+                        data[field] = max(field_values)
+                    else:
+                        data[field] = round(sum(field_values)/len(field_values), 2)
+            result.append((routes, data))
+        self.stats["forwarded"] += len(result)
+        return result
+
+    def report(self):
+        received = self.stats["received"]
+        saved = 100 * (1 - self.stats["forwarded"]/received) if received else 0.0
+        return f"packets received:{received}, duplicates:{self.stats['duplicates']}, "\
+            + f"forwarded:{self.stats['forwarded']} ({saved:.0f}% less updates)"
+
+# end of class Coalescer
+
+# ====================================================================
+# Reading the output of rtl_433
+# ====================================================================
+
+class Rtl433Reader:
+    '''
+    The class Rtl433Reader reads stdout (JSON data) and stderr (diagnostics)
+    of the rtl_433 process at the same time, without blocking on one of them.
+    Every complete line is handled as soon as it arrives: data lines are
+    decoded and, when <router> has routes for the sensor, put in <packets>
+    as (routes, data) (a bounded queue, read by the sink thread), stderr
+    lines are logged.
+    When the queue is full the oldest packet is dropped, newer data is better.
+    The number of lines per second and the parse latency (time between
+    reading a line and putting the packet in the queue) are counted.
+    Example:
+        reader = Rtl433Reader(proc, queue.Queue(100), router)
+        while reader.is_open():
+            reader.read(timeout=1)
+        log.info(reader.report())
+    '''
+
+    IGNORED_STDERR = ("rtl_433 version unknown inputs ",
+                      "Use -h for usage help",
+                      "New defaults active")
+
+    def __init__(self, proc, packets, router):
+        self.packets = packets
+        self.router = router
+        self.selector = selectors.DefaultSelector()
+        self.buffers = {}
+        for (stream, handler) in ((proc.stdout, self.handle_data),
+                                  (proc.stderr, self.handle_stderr)):
+            os.set_blocking(stream.fileno(), False)
+            self.selector.register(stream.fileno(), selectors.EVENT_READ, handler)
+            self.buffers[stream.fileno()] = b""
+        self.start_time = time.perf_counter()
+        self.stats = {"lines": 0, "packets": 0, "parse_errors": 0, "unrouted": 0, "dropped": 0,
+                      "stderr_lines": 0, "parse_time": 0.0, "max_parse_time": 0.0}
+
+    def is_open(self):
+        # True until stdout and stderr are both closed
+        return len(self.selector.get_map()) > 0
+
+    def read(self, timeout=1):
+        '''
+        Wait at most <timeout> seconds for output and handle all complete
+        lines. Returns the number of packets put in the queue.
+        '''
+        packets = self.stats["packets"]
+        for (key, events) in self.selector.select(timeout):
+            fd = key.fd
+            try:
+                chunk = os.read(fd, 65536)
+            except BlockingIOError:
+                continue
+            if chunk == b"":
+                # end of file: handle an unterminated last line
+                if self.buffers[fd]:
+                    key.data(self.buffers[fd])
+                self.selector.unregister(fd)
+                del self.buffers[fd]
+                continue
+            lines = (self.buffers[fd] + chunk).split(b"\n")
+            self.buffers[fd] = lines.pop()
+            for line in lines:
+                key.data(line)
+        return self.stats["packets"] - packets
+
+    def handle_data(self, line):
+        start = time.perf_counter()
+        line = line.decode("utf-8", errors="replace").strip()
+        if not line:
+            return
+        self.stats["lines"] += 1
+        log.debug(f"Line:{line}")
+        try:
+            data = json.loads(line)
+        except ValueError:
+            self.stats["parse_errors"] += 1
+            log.warning(f"No JSON data:{line}")
+            return
+        routes = self.router.get_routes(data)
+        if not routes:
+            self.stats["unrouted"] += 1
+            return
+        if self.packets.full():
+            try:
+                self.packets.get_nowait()
+                self.packets.task_done()
+                self.stats["dropped"] += 1
+            except queue.Empty:
+                pass
+        self.packets.put_nowait((routes, data))
+        self.stats["packets"] += 1
+        parse_time = time.perf_counter() - start
+        self.stats["parse_time"] += parse_time
+        self.stats["max_parse_time"] = max(self.stats["max_parse_time"], parse_time)
+
+    def handle_stderr(self, line):
+        line = line.decode("utf-8", errors="replace").rstrip()
+        if not line:
+            return
+        self.stats["stderr_lines"] += 1
+        if not line.startswith(Rtl433Reader.IGNORED_STDERR):
+            log.warning(f"stderr:{line}")
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start_time
+        lines = self.stats["lines"] + self.stats["stderr_lines"]
+        rate = lines/elapsed if elapsed > 0 else 0.0
+        average = self.stats["parse_time"]/self.stats["packets"] if self.stats["packets"] else 0.0
+        return f"rtl_433 lines:{lines} ({rate:.1f}/s), packets:{self.stats['packets']}, "\
+            + f"parse errors:{self.stats['parse_errors']}, unrouted:{self.stats['unrouted']}, "\
+            + f"dropped:{self.stats['dropped']}, "\
+            + f"parse latency avg:{average*1e6:.0f} us, max:{self.stats['max_parse_time']*1e6:.0f} us"
+
+# end of class Rtl433Reader
+
+def sink_worker(packets, router, coalescer, uploader):
+    # Send the packets in the queue to Domoticz (with the uploader, a slow
+    # Domoticz does not stop reading rtl_433). The packets are coalesced,
+    # None in the queue sends the waiting packets and ends the thread
+    running = True
+    while running:
+        try:
+            packet = packets.get(timeout=coalescer.next_flush())
+            if packet is None:
+                running = False
+            else:
+                coalescer.add(*packet)
+            packets.task_done()
+        except queue.Empty:
+            pass
+        for (routes, data) in coalescer.flush(all=not running):
+            for url in router.get_urls(routes, data):
+                uploader.send(url)
+            log.debug(f"Weather info sent:{str(data)}")
 
 ###### MAIN ############
 
@@ -333,6 +964,17 @@ if __name__ == '__main__':
     # The first packet of data received will trigger a new last_time_sent
     last_time_sent = time.time() - config["POLL_INTERVAL"]
 
+    router = get_router(config)
+    coalescer = Coalescer(config["COALESCE_WINDOW"], config["COALESCE_MODE"],
+                          config["COALESCE_FIELDS"])
+    uploader = Uploader(send_url, config["SPOOL_FILE"], config["QUEUE_SIZE"],
+                        max_backoff=config["MAX_BACKOFF"])
+    uploader.start()
+    packets = queue.Queue(config["QUEUE_SIZE"])
+    sink = threading.Thread(target=sink_worker, args=(packets, router, coalescer, uploader),
+                            name="sink", daemon=True)
+    sink.start()
+
     wd = None
     while  time.time() < last_time_sent + config["GIVE_UP_TIMEOUT"] :
         # Wait until next Poll must be done:
@@ -343,7 +985,10 @@ if __name__ == '__main__':
 
         # We will kill the rtl_433 process in wd_stop and restart it
         # in the while loop until the GIVE_UP_TIMEOUT is reached
-        wd = WatchdogThread.restart(wd_start,wd_stop,config["NO_DATA_TIMEOUT"], wd)
+        if wd is None:
+            wd = Watchdog("weather station", wd_start, wd_stop, config["NO_DATA_TIMEOUT"])
+        else:
+            wd.feed()
 
         # The os.setsid() is passed in the argument preexec_fn so
         # it's run after the fork() and before exec() to run the shell.
@@ -352,46 +997,28 @@ if __name__ == '__main__':
             cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            preexec_fn=os.setsid,
-            universal_newlines=True)
+            preexec_fn=os.setsid)
 
         log.debug(f"started process {cmd}")
 
-        # Read the output of rtl_433 process
-        line_in = ""
-        while proc.poll() is None:
-            line_in = proc.stdout.readline().rstrip()
-            if line_in == "":
-                line_err = proc.stderr.readline().rstrip()
-                while line_err != "":
-                    if    not line_err.startswith("rtl_433 version unknown inputs ") \
-                      and not line_err.startswith("Use -h for usage help")\
-                      and not line_err.startswith("New defaults active"):
-                        log.warning(f"stderr:{line_err}")
-                    line_err = proc.stderr.readline().rstrip()
-                continue  # skip error output
-
-            # We received data on stdin
-            log.debug(f"Line:{line_in}")
-            data_received = json.loads(line_in)
-            send_weather(data_received)
-            log.debug(f"Weather info sent:{str(data_received)}")
-            last_time_sent = time.time()
-
-            wd = WatchdogThread.restart(wd_start,wd_stop,config["NO_DATA_TIMEOUT"],wd)
+        # Read the output of rtl_433 process (stdout and stderr) until
+        # both are closed: the process ended or was killed by the watchdog
+        reader = Rtl433Reader(proc, packets, router)
+        while reader.is_open():
+            if reader.read(timeout=1) > 0:
+                # We received data
+                last_time_sent = time.time()
+                wd.feed()
 
         # we arrive here when the rtl_433 process is stopped
-        # and the poll function returned None
-        # First we check the remaining output
-        # rtl_433 is started in a new iteration 
+        # rtl_433 is started in a new iteration
         # (unless the GIVE_UP_TIMEOUT is reached
-        line_err = proc.stderr.readline().rstrip()
-        while line_err != "":
-            if    not line_err.startswith("rtl_433 version unknown inputs ") \
-              and not line_err.startswith("Use -h for usage help")\
-              and not line_err.startswith("New defaults active"):
-                log.warning(f"stderr:{line_err}")
-            line_err = proc.stderr.readline().rstrip()
+        proc.wait()
+        packets.join()
+        log.info(reader.report())
+        log.info(coalescer.report())
+        log.info(uploader.report())
+        log_http_stats()
         if proc.returncode != 0 :
             log.warning(f"Subprocess: Exited with exitcode = {proc.returncode}. Waiting {config['NO_DATA_TIMEOUT']-config['POLL_INTERVAL']} seconds before retrying")
             time.sleep(config["NO_DATA_TIMEOUT"]-config["POLL_INTERVAL"])
@@ -403,8 +1030,14 @@ if __name__ == '__main__':
     if wd :
         if wd.is_alive():
             if args.test :
-                print(f"stop running thread ({wd})")
-            wd.join()
+                print(f"stop running watchdog ({wd.name})")
+            wd.cancel()
+
+    # Send the data waiting in the coalescer
+    packets.put(None)
+    sink.join()
+    uploader.stop(config["HTTP_READ_TIMEOUT"]*config["QUEUE_SIZE"])
+    log.info(uploader.report())
 
     if args.test :
         print(f"Program ended, send mail")
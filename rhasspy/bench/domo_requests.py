@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+
+'''
+    Benchmark: the number of requests to Domoticz per intent, with a fake
+    Domoticz where every request takes 20 ms.
+    DomoDimmer used to retrieve the device (MaxDimLevel) before setting the
+    level (old), now the registry of devices has the MaxDimLevel, so the
+    level is set with a single request.
+    DomoSwitchMany switches 4 devices concurrently, compared to 4 DomoSwitch
+    intents one after another.
+    Run from this directory: python3 domo_requests.py [number of intents]
+'''
+
+import os
+import sys
+import time
+import tempfile
+import datetime
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "handler"))
+
+import intentconfig
+from intentjson import IntentJSON
+from intentdomo import IntentDomo
+from domo import Domo
+import fakedomoticz
+
+NOW = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+DEVICES = [
+    {"idx": "19", "Type": "Temp + Humidity", "SubType": "THGN122/123", "Name": "Buiten",
+     "Temp": 3.7, "Humidity": 88, "LastUpdate": NOW},
+    {"idx": "24", "Type": "Light/Switch", "SubType": "Switch", "SwitchType": "Dimmer",
+     "Name": "Tafellamp", "MaxDimLevel": 15, "Level": 0, "Status": "Off", "LastUpdate": NOW},
+    {"idx": "32", "Type": "Light/Switch", "SubType": "Switch", "SwitchType": "On/Off",
+     "Name": "Leeslamp", "Status": "Off", "LastUpdate": NOW},
+    {"idx": "36", "Type": "Light/Switch", "SubType": "Switch", "SwitchType": "On/Off",
+     "Name": "Boekenkastlamp", "Status": "Off", "LastUpdate": NOW},
+    {"idx": "55", "Type": "Light/Switch", "SubType": "Switch", "SwitchType": "On/Off",
+     "Name": "Bureaulamp", "Status": "Off", "LastUpdate": NOW},
+    ]
+
+INTENTS = [("DomoDimmer", {"idx": 24, "level": 60}),
+           ("DomoSwitch", {"idx": 32, "state": "On"}),
+           ("DomoTemp", {})]
+
+def set_switch_old(domo, idx, state, level=-1):
+    # The way Domo.set_switch set a dimmer before
+    if int(level) >= 0:
+        maxDimLevel = domo.get_domoticz(f"type=devices&rid={idx}").get("MaxDimLevel", "100")
+        level = int((level * int(maxDimLevel))/100 + 0.5)
+        switchcmd = "Set Level&level=%d" % (level)
+    else:
+        switchcmd = state
+    domo.get_domoticz(f"type=command&param=switchlight&idx={idx}&switchcmd={switchcmd}")
+
+def run_intents(fake, count, old=False):
+    intent_domo = IntentDomo(IntentJSON({"intent": {"name": ""}, "slots": {}}))
+    if old:
+        intent_domo.domo.set_switch = lambda idx, state, level=-1:\
+            set_switch_old(intent_domo.domo, idx, state, level)
+    for (name, slots) in INTENTS:
+        requests = []
+        start = time.perf_counter()
+        for i in range(count):
+            before = fake.count()
+            intent_domo.intentjson = IntentJSON({"intent": {"name": name}, "slots": dict(slots),
+                                                 "text": "", "raw_text": ""})
+            getattr(intent_domo, "do"+name)()
+            requests.append(fake.count() - before)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<12} first {requests[0]}, then {max(requests[1:], default=0)} requests,"\
+            + f" {elapsed*1000/count:6.1f} ms per intent")
+    return fake.devices["24"]["Level"]
+
+def run_switch_many(fake, count):
+    intent_domo = IntentDomo(IntentJSON({"intent": {"name": ""}, "slots": {}}))
+    switches = "24=40,32=On,36=On,55=On"
+    for (name, intents) in (("DomoSwitch", [("DomoSwitch", {"idx": idx, "state": state})
+                                for (idx, _, state) in (s.partition("=") for s in switches.split(","))]),
+                            ("DomoSwitchMany", [("DomoSwitchMany", {"switches": switches})])):
+        before = fake.count()
+        start = time.perf_counter()
+        for i in range(count):
+            for (intent, slots) in intents:
+                intent_domo.intentjson = IntentJSON({"intent": {"name": intent}, "slots": dict(slots),
+                                                     "text": "", "raw_text": ""})
+                getattr(intent_domo, "do"+intent)()
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<14} {(fake.count()-before)/count:4.1f} requests,"\
+            + f" {elapsed*1000/count:6.1f} ms for 4 devices")
+    return [fake.devices[idx]["Status"] for idx in ("24", "32", "36", "55")]
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    os.environ["RHASSPY_PROFILE_DIR"] = tempfile.mkdtemp()
+    os.makedirs(intentconfig.get_handler_path(""), exist_ok=True)
+    intentconfig.config["domo"]["registry_min_interval"] = 3600  # no checks for changes
+    for (name, old, registry_file) in (("old", True, ""),
+                                       ("new, registry not saved", False, ""),
+                                       ("new, first start", False, "domo_devices.json"),
+                                       ("new, restart with saved registry", False, "domo_devices.json")):
+        fake = fakedomoticz.FakeDomoticz(DEVICES, latency=0.02)
+        intentconfig.config["urls"]["Domo"] = fakedomoticz.start_server(fake)
+        intentconfig.config["domo"]["registry_file"] = registry_file
+        print(f"{name} ({count} intents):")
+        level = run_intents(fake, count, old)
+        print(f"  dimmer level {level}, requests {dict(fake.requests)}")
+    print(f"Switch 4 devices ({count} times):")
+    print(f"  states {run_switch_many(fake, count)}")
+
+# End Of File
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+
+'''
+    Benchmark: the DomoWeather intent (temperature, humidity, wind and sun
+    times retrieved at the same time with AsyncDomo) compared to asking
+    the same things one after another with Domo, with a fake Domoticz
+    where every request takes 50 ms.
+    The devices are checked for changes before every question
+    (registry_min_interval 0), the worst case.
+    Run from this directory: python3 domo_weather.py [number of intents]
+'''
+
+import os
+import sys
+import time
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "handler"))
+
+import intentconfig
+from intentjson import IntentJSON
+from intentdomo import IntentDomo
+import fakedomoticz
+from domo_requests import DEVICES, NOW
+
+WEATHER_DEVICES = DEVICES + [
+    {"idx": "20", "Type": "Wind", "SubType": "WTGR800", "Name": "Wind",
+     "Speed": "3.0", "DirectionStr": "ESE", "LastUpdate": NOW},
+    ]
+
+def weather_one_by_one(domo):
+    temp = domo.get_device("Temp", "Temp + Humidity", "Temp + Humidity + Baro")
+    humid = domo.get_device("Humidity", "Temp + Humidity", "Temp + Humidity + Baro")
+    wind = domo.get_device("Wind")
+    sun = domo.get_info()
+    return (temp, humid, wind, sun)
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    os.environ["RHASSPY_PROFILE_DIR"] = tempfile.mkdtemp()
+    intentconfig.config["domo"]["registry_file"] = ""
+    intentconfig.config["domo"]["registry_min_interval"] = 0
+    fake = fakedomoticz.FakeDomoticz(WEATHER_DEVICES, latency=0.05)
+    intentconfig.config["urls"]["Domo"] = fakedomoticz.start_server(fake)
+    intent_domo = IntentDomo(IntentJSON({"intent": {"name": ""}, "slots": {}}))
+    intent_domo.domo.registry.refresh()
+
+    start = time.perf_counter()
+    for i in range(count):
+        weather_one_by_one(intent_domo.domo)
+    elapsed = time.perf_counter() - start
+    print(f"{'one by one':<12} {elapsed*1000/count:6.1f} ms per question")
+
+    start = time.perf_counter()
+    for i in range(count):
+        intent_domo.intentjson = IntentJSON({"intent": {"name": "DomoWeather"}, "slots": {},
+                                             "text": "", "raw_text": ""})
+        intent_domo.doDomoWeather()
+    elapsed = time.perf_counter() - start
+    print(f"{'DomoWeather':<12} {elapsed*1000/count:6.1f} ms per question")
+    print(intent_domo.intentjson.jsonevent["speech"]["text"])
+
+# End Of File
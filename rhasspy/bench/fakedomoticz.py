@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+
+'''
+    Fake Domoticz server for benchmarks.
+    It implements just enough of the Domoticz JSON API for the Domo client:
+    type=devices (all devices, rid=idx and lastupdate=ActTime) and
+    type=command with param=switchlight and param=switchscene.
+    Every HTTP request takes at least `latency` seconds and is counted
+    (by type and param), so a benchmark can check the requests per intent.
+'''
+
+import json
+import time
+import datetime
+import threading
+import collections
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class FakeDomoticz:
+    def __init__(self, devices=(), latency=0.002):
+        self.devices = {device["idx"]: dict(device) for device in devices}
+        self.latency = latency
+        self.act_time = int(time.time())
+        self.updated = {idx: self.act_time for idx in self.devices}  # idx -> ActTime of change
+        self.requests = collections.Counter()   # "type" or "type/param" -> count
+        self.lock = threading.Lock()
+
+    def count(self):
+        return sum(self.requests.values())
+
+    def update(self, idx, **fields):
+        with self.lock:
+            self.act_time += 1
+            fields["LastUpdate"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.devices[idx].update(fields)
+            self.updated[idx] = self.act_time
+
+    def get_devices(self, params):
+        if "rid" in params:
+            ids = [params["rid"]] if params["rid"] in self.devices else []
+        else:
+            lastupdate = int(params.get("lastupdate", 0))
+            ids = [idx for idx in self.devices if self.updated[idx] > lastupdate]
+        answer = {"ActTime": self.act_time, "status": "OK",
+                  "CivTwilightStart": "07:32", "Sunrise": "08:06",
+                  "Sunset": "18:41", "CivTwilightEnd": "19:15"}
+        if ids:
+            answer["result"] = [self.devices[idx] for idx in ids]
+        return answer
+
+    def command(self, params):
+        idx = params.get("idx", "")
+        if idx not in self.devices:
+            return {"status": "ERR"}
+        if params.get("param") == "switchlight":
+            switchcmd = params.get("switchcmd", "")
+            if switchcmd == "Set Level":
+                level = int(params.get("level", 0))
+                self.update(idx, Level=level, Status=f"Set Level: {level} %")
+            else:
+                self.update(idx, Status=switchcmd)
+        return {"status": "OK", "title": params.get("param", "")}
+
+    def handle(self, query):
+        params = dict(urllib.parse.parse_qsl(query))
+        name = params.get("type", "")
+        if "param" in params:
+            name += "/" + params["param"]
+        with self.lock:
+            self.requests[name] += 1
+        time.sleep(self.latency)
+        if params.get("type") == "devices":
+            return self.get_devices(params)
+        if params.get("type") == "command":
+            return self.command(params)
+        return {"status": "ERR"}
+
+
+def start_server(fakedomoticz, port=0):
+    '''
+        Start a server for fakedomoticz in a thread, returns the url
+    '''
+    class DomoticzRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            (path, _, query) = self.path.partition("?")
+            if path != "/json.htm":
+                self.send_error(404)
+                return
+            answer = json.dumps(fakedomoticz.handle(query)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(answer)))
+            self.end_headers()
+            self.wfile.write(answer)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), DomoticzRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+# End Of File
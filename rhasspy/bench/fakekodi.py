@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+'''
+    Fake Kodi JSON-RPC server for benchmarks.
+    It implements just enough of the Kodi API for the Kodi client:
+    Player.*, Playlist.Add/Clear and AudioLibrary.GetSongs/GetAlbums
+    (with limits), single requests and batches (lists of requests).
+    With filters=True the filter of GetSongs/GetAlbums is applied (rules
+    "contains" and "after", combined with "and"/"or"), "contains" compares
+    case insensitive for ASCII letters only, like the LIKE of SQLite.
+    Every HTTP request takes at least `latency` seconds, like a real Kodi
+    on a small computer does.
+'''
+
+import json
+import time
+import string
+import threading
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# Fields of the filter rules: the properties they search
+SONG_FIELDS = {"artist": ("artist", "displaycomposer"), "title": ("title", "label"),
+               "genre": ("genre",), "dateadded": ("dateadded",)}
+ALBUM_FIELDS = {"artist": ("artist",), "album": ("label", "title"),
+                "genre": ("genre",), "dateadded": ("dateadded",)}
+
+def get_field(item, properties):
+    values = []
+    for name in properties:
+        value = item.get(name, "")
+        values.extend(value if isinstance(value, list) else [value])
+    return " / ".join(value for value in values if value)
+
+def matches(item, rule, fields):
+    if "and" in rule:
+        return all(matches(item, rule, fields) for rule in rule["and"])
+    if "or" in rule:
+        return any(matches(item, rule, fields) for rule in rule["or"])
+    value = get_field(item, fields[rule["field"]])
+    if rule["operator"] == "contains":
+        return rule["value"].translate(ASCII_LOWER) in value.translate(ASCII_LOWER)
+    if rule["operator"] == "after":
+        return value > rule["value"]
+    raise ValueError(f"FakeKodi: unknown operator {rule['operator']}")
+
+class FakeKodi:
+    def __init__(self, songs=(), albums=(), latency=0.002, filters=False):
+        self.songs = list(songs)
+        self.albums = list(albums)
+        self.latency = latency
+        self.filters = filters
+        self.playlist = []
+        self.http_requests = 0
+        self.rpc_requests = 0
+
+    def call(self, request):
+        self.rpc_requests += 1
+        method = request["method"]
+        params = request.get("params", {})
+        result = "OK"
+        if method == "Playlist.Clear":
+            self.playlist = []
+        elif method == "Playlist.Add":
+            item = params["item"]
+            self.playlist.extend(item if isinstance(item, list) else [item])
+        elif method == "AudioLibrary.GetSongs":
+            result = self.get_items("songs", self.filter(self.songs, params, SONG_FIELDS), params)
+        elif method == "AudioLibrary.GetAlbums":
+            result = self.get_items("albums", self.filter(self.albums, params, ALBUM_FIELDS), params)
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    def filter(self, items, params, fields):
+        if not self.filters or "filter" not in params:
+            return items
+        return [item for item in items if matches(item, params["filter"], fields)]
+
+    def get_items(self, name, items, params):
+        limits = params.get("limits", {})
+        start = limits.get("start", 0)
+        end = min(limits.get("end", len(items)), len(items))
+        return {name: items[start:end],
+                "limits": {"start": start, "end": end, "total": len(items)}}
+
+    def handle(self, data):
+        self.http_requests += 1
+        time.sleep(self.latency)
+        request = json.loads(data)
+        if isinstance(request, list):
+            return [self.call(r) for r in request]
+        return self.call(request)
+
+
+def start_server(fakekodi, port=0):
+    '''
+        Start a server for fakekodi in a thread, returns the url
+    '''
+    class KodiRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            answer = json.dumps(fakekodi.handle(self.rfile.read(length))).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(answer)))
+            self.end_headers()
+            self.wfile.write(answer)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), KodiRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def serve(songs, albums, latency, connection):
+    connection.send(start_server(FakeKodi(songs, albums, latency)))
+    try:
+        connection.recv()  # until the benchmark stops
+    except EOFError:
+        pass
+
+def start_server_process(songs=(), albums=(), latency=0.002):
+    '''
+        Start a fakekodi server in another process, so the benchmark does not
+        share the CPU (GIL) with the server, returns the url
+    '''
+    (connection, child_connection) = multiprocessing.Pipe()
+    multiprocessing.Process(target=serve, args=(songs, albums, latency, child_connection),
+                            daemon=True).start()
+    return connection.recv()
+
+# End Of File
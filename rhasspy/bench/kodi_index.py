@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+'''
+    Check: the local library index (kodiindex.py) finds the same songs and
+    albums as the filters of Kodi ("contains": anywhere in the text), also
+    in Dutch compound titles like "Vioolconcert" or "Orkestsuite", and for
+    broad searches with thousands of results.
+    The fake Kodi applies the filters; the time of a search in the index is
+    compared with the time Kodi takes.
+    Run from this directory: python3 kodi_index.py [number of songs]
+'''
+
+import os
+import sys
+import time
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "handler"))
+
+from kodi import Kodi
+from kodiindex import KodiIndex
+import fakekodi
+from kodi_normalize import make_titles, COMPOSERS
+
+COMPOUND_TITLES = [("Vioolconcert in D", "Johann Sebastian Bach"),
+    ("Concert voor twee violen", "Johann Sebastian Bach"),
+    ("Orkestsuite nr. 3", "Johann Sebastian Bach"),
+    ("Cellosuite 1 - Prélude", "Johann Sebastian Bach"),
+    ("Kerstcantate BWV 140", "Johann Sebastian Bach"),
+    ("Brandenburgs Concert 5", "Johann Sebastian Bach"),
+    ("Pianoconcert nr. 21", "Wolfgang Amadeus Mozart"),
+    ("Klarinetconcert", "Wolfgang Amadeus Mozart"),
+    ("ÉTUDE op. 10 (100% live)", "Frédéric Chopin"),
+    ("Étude_op. 25", "Frédéric Chopin")]
+
+SONG_SEARCHES = [dict(composer="Bach", selection="concert"),
+    dict(composer="Bach", selection="suite"),
+    dict(composer="Bach", selection="cantate"),
+    dict(selection="concert,nr"),
+    dict(title="Pianoconcert", composer="Mozart"),
+    dict(title="étude"),
+    dict(title="Étude"),
+    dict(title="100%"),
+    dict(title="_op"),
+    dict(composer="Bach"),
+    dict(artist="Orchestra", genre="klassiek"),
+    dict(title="Allegro")]
+
+ALBUM_SEARCHES = [dict(album="concert"), dict(artist="Bach"), dict(album="suite", genre="Barok")]
+
+def make_library(count):
+    random.seed(2)
+    titles = [(title, random.choice(COMPOSERS)) for title in make_titles(count)]
+    songs = [{"songid": i, "label": title, "title": title, "displaycomposer": composer,
+              "artist": [random.choice(["Berliner Orchestra", "Amsterdam Baroque", composer])],
+              "displayartist": "", "genre": [random.choice(["Klassiek", "Barok"])],
+              "dateadded": "2021-01-01 10:00:00"}
+             for (i, (title, composer)) in enumerate(COMPOUND_TITLES + titles)]
+    albums = [{"albumid": i, "label": title, "title": title,
+               "artist": [random.choice(COMPOSERS)], "genre": [random.choice(["Klassiek", "Barok"])],
+               "dateadded": "2021-01-01 10:00:00"}
+              for (i, title) in enumerate([title for (title, composer) in COMPOUND_TITLES]
+                                          + make_titles(count//10, seed=3))]
+    return (songs, albums)
+
+def compare(name, find_index, find_kodi, key, search):
+    start = time.perf_counter()
+    found_index = [item[key] for item in find_index(**search)]
+    index_time = time.perf_counter() - start
+    start = time.perf_counter()
+    found_kodi = [item[key] for item in find_kodi(**search)]
+    kodi_time = time.perf_counter() - start
+    identical = sorted(found_index) == sorted(found_kodi)
+    print(f"{name} {str(search):<45} index {len(found_index):6d} in {index_time*1000:7.1f} ms,"\
+        + f" Kodi {len(found_kodi):6d} in {kodi_time*1000:7.1f} ms, identical: {identical}")
+    return identical
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    (songs, albums) = make_library(count)
+    url = fakekodi.start_server(fakekodi.FakeKodi(songs, albums, latency=0.02, filters=True))
+    kodi = Kodi(url)
+    index = KodiIndex(":memory:", kodi)
+    start = time.perf_counter()
+    index.sync(force=True)
+    print(f"{len(songs)} songs and {len(albums)} albums, index built in"\
+        + f" {(time.perf_counter()-start)*1000:.1f} ms, Kodi latency 20 ms")
+
+    results = [compare("songs ", index.find_songs, kodi.get_songs, "songid", search)
+               for search in SONG_SEARCHES]
+    results += [compare("albums", index.find_albums, kodi.get_albums, "albumid", search)
+                for search in ALBUM_SEARCHES]
+    print(f"All identical: {all(results)}")
+    sys.exit(0 if all(results) else 1)
+
+# End Of File
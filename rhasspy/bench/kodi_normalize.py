@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+
+'''
+    Benchmark: cleaning of song titles and names for the slots with the
+    regular expressions in code (old) compared to the compiled rules from
+    kodi_rules.json (normalize.py), over a synthetic corpus of 50000 titles.
+    The output of both must be identical.
+    And the translation of characters (decodeUTF8) character by character
+    (old) compared to str.translate with a translation table.
+    Run from this directory: python3 kodi_normalize.py [number of titles]
+'''
+
+import os
+import re
+import sys
+import time
+import random
+import logging
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "handler"))
+
+import kodi_rhasspy
+from kodi_rhasspy import Kodi_Rhasspy, map_to_ASCII, map_to_SPEECH
+from kodi_rhasspy import decodeUTF8_batch, get_translation_table
+from normalize import Normalizer
+
+log = logging.getLogger(__name__)
+
+# decodeUTF8 before the translation tables
+def get_replacement(char,mapping):
+
+    if ord(char) > 0xff:
+        # No data on characters > 255.
+        return '?'
+    try:
+        return mapping[ord(char)]
+    except IndexError: 
+        log.error(f"Error replacing character {char} =0x{ord(char):02x}")
+
+def decodeUTF8(string,mapping=map_to_ASCII):
+    retval = []
+
+    for char in string:
+        retval.append(get_replacement(char,mapping))
+    return ''.join(retval)
+
+class LegacyCleaner:
+    # The cleaning methods of Kodi_Rhasspy before the rules file
+    # Clean Slot_entry to match with filter
+    def clean_all_filter(self,slot_entry):
+        cleaned = slot_entry
+        # skip everyting after ; or ,
+        cleaned = re.sub('[;,].*','',cleaned)
+        # skip leading numbers followed by - with spaces
+        cleaned = re.sub('^[0-9 ]*-* *','',cleaned)
+        # remove [ until the end : [] give problems in kaldi (rhasspy)
+        cleaned = re.sub('\[.*','',cleaned)
+        # remove ( until the end : () give problems in kaldi (rhasspy)
+        cleaned = re.sub('\(.*','',cleaned) 
+        # remove leading and trailing spaces
+        cleaned = cleaned.strip()
+        log.debug(f"clean_all_filter:<{slot_entry}> clean:<{cleaned}>")
+
+        return cleaned
+        
+    # Clean slot_entry to match with speech
+    def clean_all_speech(self,slot_entry):
+        cleaned = self.clean_all_filter(slot_entry)
+        cleaned = re.sub('&',' en ',cleaned)
+        cleaned = decodeUTF8(cleaned, map_to_SPEECH)
+        cleaned = re.sub('[^a-zA-Z0-9]',' ',cleaned)
+        cleaned = re.sub('  *',' ',cleaned)
+
+        cleaned = cleaned.strip()
+        log.debug(f"clean_all_speech:<{slot_entry}> clean:<{cleaned}>")
+
+        return cleaned
+
+    # Clean Songtitle to match with filter
+    def clean_songtitle_filter(self,songtitle):
+        cleaned = songtitle.lower()
+        # skip leading numbers followed by - with spaces
+        cleaned = re.sub('^[0-9 ]*-* *','',cleaned)
+        # remove leading composername followed by :
+        cleaned = re.sub('^[a-z]*:','',cleaned)
+        # keep only part before - or :
+        cleaned = re.sub('[-:].*','',cleaned)
+        # remove [ until the end
+        cleaned = re.sub('\[.*','',cleaned)
+        # remove ( until the end
+        cleaned = re.sub('\(.*','',cleaned) # () give problems in kaldi (rhasspy)
+        # remove Op. 23
+        cleaned = re.sub('^[a-z]+[. ]*[0-9]+ *[0-9]*','',cleaned)
+        cleaned = re.sub(' in (bes|cis|des|fis|ges|as|es|[a-g])* .*$',' ',cleaned)
+        cleaned = re.sub('(bes|cis|des|fis|ges|as|es|[a-g]) (sharp|flat|moll|dur|majeur|mineur|major|minor|maj|min|klein|groot)$',' ',cleaned)
+        cleaned = re.sub('([0-9])  *[0-9a-z]\.* .*$','\\1',cleaned)
+        cleaned = re.sub('([0-9])  *[0-9.a-z]$','\\1',cleaned)
+        cleaned = re.sub('[0-9]\..*','',cleaned) # . after number gives compile error??
+        # very specific substitutions:
+        cleaned = re.sub('.*contrapunctus.*','contrapunctus',cleaned)
+        cleaned = re.sub('canto ostinato.*','canto ostinato',cleaned)
+        cleaned = re.sub('goldberg variations.*','goldberg variations',cleaned)
+        
+        # remove leading and trailing spaces
+        cleaned = cleaned.strip()
+        log.debug(f"clean_songtitle_filter:<{songtitle}> clean:<{cleaned}>")
+
+        return cleaned
+        
+    # Clean songtitle to match with speech
+    def clean_songtitle_speech(self,songtitle):
+        cleaned = self.clean_songtitle_filter(songtitle)
+        # No.4 1 
+        cleaned = re.sub('( no.\d) [1-9x].*','\\1',cleaned)
+        cleaned = re.sub('op[. ]+\d*[-/0-9]*', '', cleaned)
+        cleaned = re.sub('violin concerto.*','vioolconcert',cleaned)
+        cleaned = re.sub('\.\.\.',',',cleaned)
+        cleaned = re.sub('\[[^\]]*\]',' ',cleaned)
+        cleaned = re.sub('["\'!]',' ',cleaned)
+        cleaned = re.sub('[({].*[)}]',' ',cleaned)
+        cleaned = re.sub(',',' ',cleaned)
+        cleaned = re.sub('no\.','nummer ',cleaned)
+        cleaned = re.sub('nr\.','nummer ',cleaned)
+        cleaned = re.sub('&',' en ',cleaned)
+        cleaned = decodeUTF8(cleaned, map_to_SPEECH)
+
+        cleaned = re.sub('  *',' ',cleaned)
+
+        cleaned = cleaned.strip()
+        log.debug(f"clean_songtitle_speech:<{songtitle}> clean:<{cleaned}>")
+
+        return cleaned
+
+COMPOSERS = ["Johann Sebastian Bach", "Wolfgang Amadeus Mozart", "Ludwig van Beethoven",
+    "Frédéric Chopin", "Antonín Dvořák", "Simeon ten Holt", "Pjotr Iljitsj Tsjaikovski",
+    "Camille Saint-Saëns", "Edvard Grieg", "Maurice Ravel"]
+FORMS = ["Symphony", "Piano Concerto", "Violin Concerto", "String Quartet", "Sonata",
+    "Prelude & Fugue", "Nocturne", "Étude", "Mazurka", "Goldberg Variations, BWV 988",
+    "Die Kunst der Fuge: Contrapunctus", "Canto Ostinato", "Suite", "Partita"]
+KEYS = ["C major", "D minor", "E flat major", "F sharp minor", "G dur", "a moll",
+    "Bes groot", "cis klein", "Es majeur"]
+MOVEMENTS = ["I. Allegro", "II. Adagio", "III. Menuetto", "IV. Presto", "Andante con moto",
+    "Rondo: Allegro ma non troppo"]
+EXTRAS = ["", "", " (Live)", " [Remastered 2011]", " - Aria", "...", " \"Eroica\"", " {bonus}", "!"]
+
+def make_titles(count, seed=1):
+    # Titles like Kodi has them, about a third of them occur more than once
+    random.seed(seed)
+    titles = []
+    for i in range(count):
+        if titles and random.random() < 0.3:
+            titles.append(random.choice(titles))
+            continue
+        form = random.choice(FORMS)
+        title = random.choice([
+            f"{form} No.{random.randint(1, 30)} in {random.choice(KEYS)}, Op. {random.randint(1, 130)}",
+            f"{random.randint(1, 24):02d} - {form} Nr. {random.randint(1, 9)} {random.choice(KEYS)}",
+            f"{random.choice(COMPOSERS).split()[-1].lower()}:{form} - {random.choice(MOVEMENTS)}",
+            f"{form} in {random.choice(KEYS)} {random.randint(1,9)} {random.choice('abcx')}. {random.choice(MOVEMENTS)}",
+            f"{random.choice(COMPOSERS)}; {form}",
+            f"Op. {random.randint(1, 99)} {random.randint(1, 9)} {form}",
+        ]) + random.choice(EXTRAS)
+        titles.append(title)
+    return titles
+
+def clean_all(cleaner, titles, names):
+    # The way create_slots_files uses the cleaning methods
+    result = []
+    for title in titles:
+        filter_song = cleaner.clean_songtitle_filter(title)
+        result.append((filter_song, cleaner.clean_songtitle_speech(filter_song)))
+    for name in names:
+        filter_name = cleaner.clean_all_filter(name)
+        result.append((filter_name, cleaner.clean_all_speech(filter_name)))
+    return result
+
+def bench_decode(name, decode, strings):
+    start = time.perf_counter()
+    result = decode(strings)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<16} {len(strings):6d} strings: {elapsed*1000:8.1f} ms, {len(strings)/elapsed:9.0f} strings/s")
+    return result
+
+def bench(name, cleaner, titles, names):
+    start = time.perf_counter()
+    result = clean_all(cleaner, titles, names)
+    elapsed = time.perf_counter() - start
+    count = len(titles) + len(names)
+    print(f"{name:<16} {count:6d} strings: {elapsed*1000:8.1f} ms, {count/elapsed:9.0f} strings/s")
+    return result
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    titles = make_titles(count)
+    names = titles[:count//10] + COMPOSERS * (count//100)
+    print(f"{len(titles)} titles ({len(set(titles))} different) and {len(names)} names")
+
+    # Characters above 0xff are only translated by the new tables,
+    # compare with the old behaviour (fallback for all of them)
+    old_table = get_translation_table(map_to_SPEECH, '?', extended=False)
+    for mapping_name, mapping in (("ASCII", map_to_ASCII), ("SPEECH", map_to_SPEECH)):
+        old = bench_decode(f"old {mapping_name}", lambda strings:
+            [decodeUTF8(string, mapping) for string in strings], titles)
+        table = get_translation_table(mapping, '?', extended=False)
+        new = bench_decode(f"translate {mapping_name}", lambda strings:
+            [string.translate(table) for string in strings], titles)
+        bench_decode(f"batch {mapping_name}", lambda strings:
+            decodeUTF8_batch(strings, mapping), titles)
+        print(f"Output identical: {old == new}")
+
+    old = bench("old (re.sub)", LegacyCleaner(), titles, names)
+    kodi_rhasspy.normalizers[kodi_rhasspy.RULES_FILE] = Normalizer.from_file(kodi_rhasspy.RULES_FILE,
+        {"speech": lambda string: string.translate(old_table)})
+    new_cleaner = Kodi_Rhasspy(None, None)
+    new = bench("rules (cold)", new_cleaner, titles, names)
+    bench("rules (cached)", new_cleaner, titles, names)
+
+    differences = [(i, o, n) for i, (o, n) in enumerate(zip(old, new)) if o != n]
+    for (i, o, n) in differences[:10]:
+        print(f"Difference for <{(titles+names)[i]}>: old:{o}, new:{n}")
+    print(f"Output identical: {not differences} ({len(differences)} differences)")
+
+# End Of File
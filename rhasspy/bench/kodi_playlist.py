@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+'''
+    Benchmark: time to build a Kodi playlist of 10, 1000 and 20000 songs
+    one Playlist.Add request per song (old) compared to batched requests
+    and time to first sound when the playlist is filled while playing.
+    Run from this directory: python3 kodi_playlist.py
+'''
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "handler"))
+
+from kodi import Kodi
+import fakekodi
+
+def play_songs_one_by_one(kodi, songs):
+    # The way Kodi.play_songs built the playlist before batching
+    kodi.stop_play()
+    kodi.clear_playlist()
+    for song in songs:
+        kodi.add_song_to_playlist(song["songid"])
+    kodi.start_play()
+
+def bench(name, play, kodi, fake, songs):
+    fake.http_requests = 0
+    start = time.perf_counter()
+    play(songs)
+    first_sound = time.perf_counter() - start
+    if kodi.fill_thread is not None:
+        kodi.fill_thread.join()
+    elapsed = time.perf_counter() - start
+    assert len(fake.playlist) == len(songs)
+    print(f"{name:<12} {len(songs):6d} songs: {elapsed*1000:9.1f} ms, "\
+        + f"first sound {first_sound*1000:9.1f} ms, {fake.http_requests:6d} http requests")
+
+if __name__ == '__main__':
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.002
+    fake = fakekodi.FakeKodi(latency=latency)
+    url = fakekodi.start_server(fake)
+    kodi = Kodi(url, first_chunk_size=0)
+    streaming_kodi = Kodi(url)
+    print(f"Fake Kodi latency per http request: {latency*1000:.1f} ms")
+    for count in (10, 1000, 20000):
+        songs = [{"songid": i, "label": f"song {i}", "displaycomposer": "Bach"}
+                 for i in range(count)]
+        bench("one by one", lambda s: play_songs_one_by_one(kodi, s), kodi, fake, songs)
+        bench("batched", kodi.play_songs, kodi, fake, songs)
+        bench("streamed", streaming_kodi.play_songs, streaming_kodi, fake, songs)
+
+# End Of File
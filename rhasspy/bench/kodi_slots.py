@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+
+'''
+    Benchmark: creating the slots for songs, composers, artists, albums and
+    genres from a fake Kodi with 50000 songs and 5000 albums.
+    Slot by slot in one process, every slot sent on its own (old), compared to
+    reading songs and albums at the same time, cleaning in worker processes
+    and sending all slots in one request, with 1 or 4 pages read from Kodi
+    at the same time (kodi: page_workers in intentconfig.py).
+    Every request to Kodi takes at least 20 ms (a page of 1000 songs),
+    every request to Rhasspy 50 ms.
+    Run from this directory: python3 kodi_slots.py [number of songs] [Kodi latency]
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "handler"))
+
+from kodi import Kodi
+from kodi_rhasspy import Kodi_Rhasspy
+from slotbuilder import SlotBuilder
+import kodi_rhasspy
+import fakekodi
+from kodi_normalize import make_titles, COMPOSERS
+
+class Response:
+    status_code = 200
+    text = "OK"
+
+class FakeRhasspy:
+    # Keeps the slots, every request takes latency seconds
+    def __init__(self, latency):
+        self.latency = latency
+        self.slots = {}
+        self.requests = 0
+
+    def rhasspy_replace_slots(self, slots):
+        time.sleep(self.latency)
+        self.requests += 1
+        self.slots.update(json.loads(slots))
+        return Response()
+
+    def rhasspy_train(self):
+        time.sleep(self.latency)
+        self.requests += 1
+        return Response()
+
+def create_slots_files_one_by_one(kodi_rhasspy):
+    # The way create_slots_files made the slots before
+    songslots = SlotBuilder()
+    composerslots = SlotBuilder()
+    for song in kodi_rhasspy.kodi.iter_songs(genre="Klassiek"):
+        kodi_rhasspy.add_song_slot(songslots, song)
+        kodi_rhasspy.add_composer_slot(composerslots, song)
+    kodi_rhasspy.save_slots(songslots, "songs")
+    kodi_rhasspy.save_slots(composerslots, "composers")
+    artistslots = SlotBuilder()
+    albumslots = SlotBuilder()
+    genreslots = SlotBuilder()
+    for album in kodi_rhasspy.kodi.iter_albums():
+        kodi_rhasspy.add_artist_slots(artistslots, album)
+        kodi_rhasspy.add_album_slot(albumslots, album)
+        kodi_rhasspy.add_genre_slots(genreslots, album)
+    kodi_rhasspy.save_slots(artistslots, "artists")
+    kodi_rhasspy.save_slots(albumslots, "albums")
+    kodi_rhasspy.save_slots(genreslots, "genres")
+    kodi_rhasspy.rhasspy.rhasspy_train()
+
+def bench(name, create_slots, rhasspy):
+    # Start without cached results
+    kodi_rhasspy.normalizers.clear()
+    start = time.perf_counter()
+    create_slots()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<20} {elapsed*1000:8.1f} ms, {rhasspy.requests} requests to Rhasspy")
+    return rhasspy.slots
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    random.seed(2)
+    songs = [{"songid": i, "label": title, "displaycomposer": random.choice(COMPOSERS)}
+             for (i, title) in enumerate(make_titles(count))]
+    albums = [{"albumid": i, "label": title, "artist": [random.choice(COMPOSERS)],
+               "genre": [random.choice(["Klassiek", "Pop", "Jazz", "Barok"])]}
+              for (i, title) in enumerate(make_titles(count//10, seed=3))]
+    url = fakekodi.start_server_process(songs, albums, latency)
+    kodi = Kodi(url)
+    print(f"{len(songs)} songs and {len(albums)} albums, {os.cpu_count()} cpus,"\
+        + f" Kodi latency {latency*1000:.0f} ms, Rhasspy latency 50 ms per request")
+
+    rhasspy = FakeRhasspy(0.05)
+    old = bench("one by one", lambda: create_slots_files_one_by_one(Kodi_Rhasspy(kodi, rhasspy)), rhasspy)
+    for (workers, page_workers) in ((0, 1), (2, 1), (4, 1), (2, 4)):
+        rhasspy = FakeRhasspy(0.05)
+        kodi = Kodi(url, page_workers=page_workers)
+        new = bench(f"{workers} workers, {page_workers} pages",
+            Kodi_Rhasspy(kodi, rhasspy, workers=workers).create_slots_files, rhasspy)
+        print(f"Slots identical: {old == new}")
+
+# End Of File
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+   
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+'''
+    Asyncio variant of the Domo client: the same methods, but awaitable,
+    so several devices can be retrieved at the same time, e.g.
+        (temp, wind) = await async_domo.gather(
+            async_domo.get_device("Temp"), async_domo.get_device("Wind"))
+    The requests are done by the (blocking) Domo methods in a thread pool,
+    over the shared connections of httppool. At most `concurrency` requests
+    are running at the same time and every call takes at most `timeout`
+    seconds; gather() has one deadline for all its calls.
+'''
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class AsyncDomo:
+
+    def __init__(self, domo, concurrency=4, timeout=5):
+        self.domo = domo
+        self.concurrency = concurrency
+        self.timeout = timeout      # seconds for a call or a gather
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.semaphore = None
+        self.loop = None
+
+    def get_semaphore(self):
+        # A semaphore belongs to an event loop, every asyncio.run has a new loop
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+            self.loop = loop
+        return self.semaphore
+
+    async def run(self, method, *args, **kwargs):
+        '''
+            Call a method of Domo in the thread pool, returns its result,
+            raises asyncio.TimeoutError after timeout seconds
+        '''
+        async with self.get_semaphore():
+            return await asyncio.wait_for(
+                self.loop.run_in_executor(self.executor,
+                    functools.partial(method, *args, **kwargs)),
+                self.timeout)
+
+    async def gather(self, *calls, timeout=None):
+        '''
+            Run the calls (coroutines) at the same time and return their
+            results in the same order. A call that fails or is not ready
+            within timeout seconds (default self.timeout) returns None.
+        '''
+        tasks = [asyncio.ensure_future(call) for call in calls]
+        if not tasks:
+            return []
+        (done, pending) = await asyncio.wait(tasks, timeout=timeout or self.timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            log.warning(f"gather: {len(pending)} of {len(tasks)} calls timed out")
+        results = []
+        for task in tasks:
+            if task in done and task.exception() is None:
+                results.append(task.result())
+            else:
+                if task in done:
+                    log.warning(f"gather: call failed: {task.exception()!r}")
+                results.append(None)
+        return results
+
+    async def get_domoticz(self, command, firstOnly=True):
+        return await self.run(self.domo.get_domoticz, command, firstOnly)
+
+    async def get_domoticz_json(self, command):
+        return await self.run(self.domo.get_domoticz_json, command)
+
+    async def get_info(self, idx=0, field_name=None, default="", max_age=0):
+        return await self.run(self.domo.get_info, idx, field_name, default, max_age)
+
+    async def get_device(self, *types):
+        return await self.run(self.domo.get_device, *types)
+
+    async def get_devices_by_type(self, *types, switchType=None, favorite=None):
+        return await self.run(self.domo.get_devices_by_type, *types,
+                              switchType=switchType, favorite=favorite)
+
+    async def set_scene(self, idx):
+        return await self.run(self.domo.set_scene, idx)
+
+    async def set_switch(self, idx, state, level=-1):
+        return await self.run(self.domo.set_switch, idx, state, level)
+
+    async def set_switches(self, switches):
+        switches = [tuple(switch) + (-1,)*(3-len(switch)) for switch in switches]
+        results = await self.gather(*[self.set_switch(*switch) for switch in switches])
+        return [(switch[0], bool(result)) for (switch, result) in zip(switches, results)]
+
+    def check_update(self, device, max_age_in_seconds):
+        # No request, not awaitable
+        return self.domo.check_update(device, max_age_in_seconds)
+
+# End Of File
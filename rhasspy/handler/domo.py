@@ -22,24 +22,45 @@ Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
    So any resemblance to already existing code is purely coincidental
 '''
 
+import sys
 import datetime
-import requests
 import logging
 import re
 import json
 log = logging.getLogger(__name__)
 import traceback
+import httppool
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import ConnectionError, Timeout
+from domoregistry import DomoRegistry
+import domocache
 
 class Domo:
-    def __init__(self, url):
+    def __init__(self, url, registry_file="", full_refresh=3600, min_interval=5,
+                 switch_workers=4):
         self.url = url+"/json.htm?"
+        self.switch_workers = switch_workers  # devices switched concurrently
+        self.registry = DomoRegistry(self, registry_file, full_refresh, min_interval)
+        self.dimmers = {}   # idx -> (MaxDimLevel, SwitchType) of devices not in the registry
 
     def get_domoticz(self,command,firstOnly=True):
+        res_json = self.get_domoticz_json(command)
+        if res_json is None:
+            return None
+
+        if "result" in res_json:
+            if firstOnly:
+                return(res_json["result"][0])
+            return(res_json["result"])
+
+        return(res_json)
+
+    def get_domoticz_json(self,command):
         url = self.url+command
         timeout=3.05
         log.debug(f"Url:{url}, timeout={timeout}")
         try:
-            res = requests.get(url, timeout=(0.5, timeout))
+            res = httppool.get(url, timeout=(0.5, timeout))
             log.debug(f"request returned:({res})")
             if res.status_code != 200:
                 log.info(f"Url:[{url}\nResult:{res.status_code}, text:{res.text}")
@@ -58,20 +79,11 @@ class Domo:
         log.debug(str(res))
         res_json = json.loads(res.text)
         log.debug(str(res_json))
-
-        if "result" in res_json:
-            if firstOnly:
-                return(res_json["result"][0])
-            return(res_json["result"])
-
         return(res_json)
 
     def getStringAsDate(self,date_string,date_format="%Y-%m-%d %H:%M:%S"):
-        log.debug(f"getStringAsDate:date_string=[{date_string}], format=[{date_format}]")
-        try :
-            return datetime.datetime.strptime(date_string,date_format)
-        except :
-            return None
+        # Parsed dates are cached, LastUpdate of a device is checked often
+        return domocache.parse_date(date_string,date_format)
 
     def check_update(self, device, max_age_in_seconds):  # Default LastUpdate was less than 1800 sec. = 1/2 hour
         try :
@@ -97,9 +109,15 @@ class Domo:
     def get_info(self, idx=0,field_name=None,default="", max_age=0):
         try:
             log.debug(f"(idx={idx},field_name={field_name},max_age={max_age}")
-            device = self.get_domoticz(f"type=devices&rid={idx}")
+            # idx 0 returns general information (sun rise etc.), not cached
+            device = domocache.get(idx, max_age) if idx else None
+            if device is None:
+                device = self.get_domoticz(f"type=devices&rid={idx}")
+                if idx and device:
+                    domocache.put(idx, device)
             log.debug(f"(device={device}")
             if not self.check_update(device, max_age) :
+                domocache.count_old_data()
                 return "OLD_DATA"
             if field_name is None:
                 return device
@@ -114,88 +132,114 @@ class Domo:
         command = f"type=command&param=switchscene&idx={idx}&switchcmd=On"
         self.get_domoticz(command)
 
+    def get_dimmer(self, idx):
+        '''
+            Return (MaxDimLevel, SwitchType) of a device.
+            The registry has the capabilities of all used devices (also
+            after a restart, when it is saved), so setting a dimmer needs
+            no extra request. Other devices are retrieved once.
+        '''
+        device = self.registry.get(idx)
+        if device is None:
+            if idx in self.dimmers:
+                return self.dimmers[idx]
+            if self.registry.refresh():
+                device = self.registry.get(idx)
+            if device is None:
+                device = self.get_domoticz(f"type=devices&rid={idx}")
+                if device is None:
+                    return (100, "")    # not cached, try again next time
+                self.dimmers[idx] = (int(device.get("MaxDimLevel", 100)), device.get("SwitchType", ""))
+                return self.dimmers[idx]
+        return (int(device.get("MaxDimLevel", 100)), device.get("SwitchType", ""))
+
     def set_switch(self,idx, state, level=-1):
-        log.debug(f"set_switch(idx={idx},state={state},level={state}")
+        log.debug(f"set_switch(idx={idx},state={state},level={level}")
         if int(level) >= 0:
-            maxDimLevel = self.get_info(idx,"MaxDimLevel","100")
-            log.debug(f"(maxDimLevel={maxDimLevel})")
-            level = int((level * int(maxDimLevel))/100 + 0.5)
+            (maxDimLevel, switchType) = self.get_dimmer(idx)
+            log.debug(f"(maxDimLevel={maxDimLevel}, switchType={switchType})")
+            level = int((int(level) * maxDimLevel)/100 + 0.5)
             switchcmd = "Set Level&level=%d" % (level)
         else:
             switchcmd = state
         
         command = f"type=command&param=switchlight&idx={idx}&switchcmd={switchcmd}"
-        self.get_domoticz(command)
+        res_json = self.get_domoticz(command)
+        return res_json is not None and res_json.get("status") == "OK"
 
-
-    def get_devices(self,favorite=1):
+    def set_switches(self, switches):
         '''
-            return list of devices containing selection of fields 
+            Switch several devices at the same time, switches is a list of
+            (idx, state) or (idx, state, level) tuples (as for set_switch).
+            The commands are sent concurrently (at most switch_workers
+            at a time), over the connections of the pool of Domoticz.
+            Returns a list of (idx, True/False) in the order of switches
         '''
-        devices = []
-        res = self.get_domoticz(f"type=devices&filter=all&used=true&order=Name&favorite={favorite}",firstOnly=False)
-        log.debug(f"res={res}")
-
-        for device in res:
-            log.debug(f"get_devices: dev={device}")
-            if "idx" not in device:
-                continue # Should never happen
-            if 'Type' not in device:
-                continue # Should never happen
-            device_idx = int(device["idx"])
-            device_type = device["Type"]
+        switches = [tuple(switch) + (-1,)*(3-len(switch)) for switch in switches]
+        if not switches:
+            return []
+        # Dimmers need MaxDimLevel: refresh the registry once, not in every thread
+        for (idx, state, level) in switches:
+            if int(level) >= 0:
+                self.get_dimmer(idx)
+        workers = min(self.switch_workers, len(switches))
+        if workers <= 1:
+            return [(idx, self.set_switch(idx, state, level)) for (idx, state, level) in switches]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda switch: self.set_switch(*switch), switches))
+        log.debug(f"set_switches: {sum(results)} of {len(switches)} devices switched")
+        return [(idx, result) for ((idx, state, level), result) in zip(switches, results)]
+
+
+    def get_device(self, *types):
+        '''
+            Return the first device of types (Type or (Type, SubType)),
+            e.g. get_device("Temp", "Temp + Humidity") from the registry,
+            with the latest data, or None
+        '''
+        self.registry.refresh()
+        devices = self.registry.query(types)
+        if len(devices) > 0:
+            log.debug(f"get_device{types}: {devices[0]}")
+            return devices[0]
+        return None
 
-            if "LastUpdate" in device:
-                lastupdate = device["LastUpdate"]
-            else:
-                lastupdate = ""
-
-            if "SwitchType" in device:
-                switch_type = device["SwitchType"]
-            else:
-                switch_type = ""
-
-            if "SubType" in device:
-                sub_type = device["SubType"]
-            else:
-                sub_type = ""
-
-            if "Description" in device:
-                device_desc = device["Description"]
-            else:
-                device_desc = ""
-
-            if "Name" in device:
-                device_name = device["Name"]
-            else:
-                device_name = ""
-
-            dev_info = {"idx":device_idx,
-                            "LastUpdate":lastupdate,
-                            "Type":device_type,
-                            "SwitchType":switch_type,
-                            "SubType":sub_type,
-                            "Name":device_name,
-                            "Description":device_desc}
-            devices.append(dev_info)
-            log.debug(f"get_devices:added dev_info: {dev_info}.")
+    def devices_known(self):
+        '''
+            False when Domoticz did not answer yet (and no devices were
+            saved): get_device then returns None for every type
+        '''
+        return self.registry.is_known()
 
-        return devices
+    def get_device_info(self, device):
+        '''
+            Return a selection of the fields of a device
+        '''
+        return {"idx":int(device["idx"]),
+                "LastUpdate":device.get("LastUpdate", ""),
+                "Type":device.get("Type", ""),
+                "SwitchType":device.get("SwitchType", ""),
+                "SubType":device.get("SubType", ""),
+                "Name":device.get("Name", ""),
+                "Description":device.get("Description", "")}
 
-    def get_devices_by_type(devType,subType="", favorite=1):
+    def get_devices(self,favorite=1):
         '''
-            return selection of devices of a Type/SubType (optional)
+            return list of devices containing selection of fields 
+            (favorite=1: only favorites)
         '''
-        devices = get_devices(self,favorite=1)
-        selection = []
-        for device in devices:
-            if devType == device["Type"] and subType == device["SubType"]:
-                selection.append(device)
-                log.debug(f"get_device:added dev: {device}.")
+        return self.get_devices_by_type(favorite=True if favorite else None)
 
-        if len(devices) > 0:
-            return devices[0]
-        return None
+    def get_devices_by_type(self, *types, switchType=None, favorite=None):
+        '''
+            return selection of fields of the devices of types (Type or
+            (Type, SubType)), SwitchType and favorite (optional)
+        '''
+        self.registry.refresh()
+        devices = [self.get_device_info(device)
+                   for device in self.registry.query(types, switchType, favorite)]
+        log.debug(f"get_devices_by_type{types}: {len(devices)} devices")
+        return devices
 
 
 # End Of File
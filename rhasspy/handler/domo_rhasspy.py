@@ -31,6 +31,7 @@ import re
 
 from domo import Domo
 from rhasspy import Rhasspy
+from slotbuilder import SlotBuilder
 log = logging.getLogger(__name__)
 
 class Domo_Rhasspy:
@@ -40,30 +41,6 @@ class Domo_Rhasspy:
         self.rhasspy = rhasspy
 
 
-    '''
-        Add to dict adds a speech to a list of entries
-        If the speech already exists (we already have a filter defined)
-        We check for:
-        new is part of old: use new
-        old is part of new: use old
-        
-    '''
-    def add_to_dict(self,slot_entries,new_speech,new_filter):
-        if new_speech in slot_entries:
-            old_filter = slot_entries[new_speech]
-            if new_filter in old_filter:
-                my_filter = new_filter
-            elif old_filter in new_filter:
-                my_filter = old_filter
-            else: # TODO Check the code
-                my_filter = old_filter
-                while not new_filter.startswith(old_filter):
-                    old_filter = old_filter[:-1]
-        else:
-            my_filter = new_filter
-            
-        slot_entries[new_speech] = my_filter
-
     def dump(self,data):
         if type(data) is str:
             jdata = json.loads(data)
@@ -78,11 +55,9 @@ class Domo_Rhasspy:
                 fslots.write(line+'\n')
             fslots.close()
 
-    def save_slots(self,slots_dict,slotname):
-        slots = []
-        for speech,idx in sorted(slots_dict.items()):
-            slots.append(f"({speech}):({idx})")
-        slots_dict = { slotname :  slots }
+    def save_slots(self,slots,slotname):
+        log.info(f"Slot {slotname}: {slots.get_stats()}")
+        slots_dict = { slotname :  slots.get_lines(short=False) }
         log.debug(f"Send to Rhasspy:<<<<{json.dumps(slots_dict)}>>>>")
         self.rhasspy.rhasspy_replace_slots(json.dumps(slots_dict))
 
@@ -97,7 +72,8 @@ class Domo_Rhasspy:
         return cleaned
 
     def create_slots_switches(self):
-        device_slots = {}
+        # Devices with the same speech: the first one is used
+        device_slots = SlotBuilder(merge=False)
         devices = self.domo.get_devices_by_type("Light/Switch")
         for device in devices:
             if device["Description"] != "":
@@ -105,12 +81,13 @@ class Domo_Rhasspy:
             else:
                 speech_device = device["Name"]
 
-            self.add_to_dict(device_slots,self.clean_speech(speech_device),device["idx"])
+            device_slots.add(self.clean_speech(speech_device),device["idx"])
 
         self.save_slots(device_slots,"switches")
 
-    def create_slots_scenes(self,devices):
-        device_slots = {}
+    def create_slots_scenes(self):
+        # Devices with the same speech: the first one is used
+        device_slots = SlotBuilder(merge=False)
         devices = self.domo.get_devices_by_type("Scene")
         for device in devices:
             if device["Description"] != "":
@@ -118,13 +95,13 @@ class Domo_Rhasspy:
             else:
                 speech_device = device["Name"]
 
-            self.add_to_dict(device_slots,self.clean_speech(speech_device),device["idx"])
+            device_slots.add(self.clean_speech(speech_device),device["idx"])
 
         self.save_slots(device_slots,"scenes")
 
     def create_slots_files(self):
-        self.create_slots_switches(devices)
-        self.create_slots_scenes(devices)
+        self.create_slots_switches()
+        self.create_slots_scenes()
         res = self.rhasspy.rhasspy_train()
         if res and res.status_code != 200:
             return res.text
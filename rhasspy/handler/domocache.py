@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+import time
+import datetime
+import functools
+import threading
+
+import intentconfig
+
+import logging
+log = logging.getLogger(__name__)
+
+'''
+    Cache for the data of Domoticz devices (sensors), by idx.
+    A sensor sends new data every so many seconds (the cadence), so the
+    data from Domoticz does not change until the next update is expected:
+    the cadence is learned from the LastUpdate of the device (the shortest
+    time seen between two updates) and the data is kept until LastUpdate
+    plus the cadence (between min_ttl and max_ttl seconds, default_ttl as
+    long as the cadence is not known).
+    Data with a LastUpdate older than max_age is not used, it is retrieved
+    again (and is reported as OLD_DATA when it is still too old).
+    The hits, misses etc. are counted, see report().
+'''
+
+entries = {}    # idx: CacheEntry
+stats = {"hits": 0, "misses": 0, "expired": 0, "too_old": 0, "old_data": 0}
+lock = threading.Lock()
+
+@functools.lru_cache(maxsize=1024)
+def parse_date(date_string, date_format="%Y-%m-%d %H:%M:%S"):
+    try:
+        return datetime.datetime.strptime(date_string, date_format)
+    except (TypeError, ValueError):
+        return None
+
+
+class CacheEntry:
+    def __init__(self, device, lastupdate, cadence, expires):
+        self.device = device
+        self.lastupdate = lastupdate    # datetime of LastUpdate (or None)
+        self.cadence = cadence          # seconds between updates (or None)
+        self.expires = expires          # time.time() when the entry expires
+
+
+def get_ttl(lastupdate, cadence):
+    config = intentconfig.get_domo_config()
+    if lastupdate is None or cadence is None:
+        return config["cache_default_ttl"]
+    next_update = lastupdate + datetime.timedelta(seconds=cadence)
+    ttl = (next_update - datetime.datetime.now()).total_seconds()
+    return min(max(ttl, config["cache_min_ttl"]), config["cache_max_ttl"])
+
+
+def get(idx, max_age=0):
+    '''
+        Return the cached device or None
+    '''
+    with lock:
+        entry = entries.get(idx)
+        if entry is None:
+            stats["misses"] += 1
+            return None
+        if time.time() >= entry.expires:
+            stats["expired"] += 1
+            return None
+        if max_age and entry.lastupdate is not None\
+                and (datetime.datetime.now() - entry.lastupdate).total_seconds() >= max_age:
+            stats["too_old"] += 1
+            return None
+        stats["hits"] += 1
+        return entry.device
+
+
+def put(idx, device):
+    lastupdate = parse_date(device.get("LastUpdate", ""))
+    with lock:
+        old_entry = entries.get(idx)
+        cadence = None
+        if old_entry is not None:
+            cadence = old_entry.cadence
+            if lastupdate is not None and old_entry.lastupdate is not None\
+                    and lastupdate > old_entry.lastupdate:
+                interval = (lastupdate - old_entry.lastupdate).total_seconds()
+                cadence = interval if cadence is None else min(cadence, interval)
+        ttl = get_ttl(lastupdate, cadence)
+        entries[idx] = CacheEntry(device, lastupdate, cadence, time.time() + ttl)
+        log.debug(f"Cache idx {idx}: cadence {cadence}, ttl {ttl:.1f} s")
+
+
+def count_old_data():
+    with lock:
+        stats["old_data"] += 1
+
+
+def report():
+    with lock:
+        lookups = stats["hits"] + stats["misses"] + stats["expired"] + stats["too_old"]
+        hit_rate = stats["hits"] * 100 / lookups if lookups else 0.0
+        lines = [f"{'devices':<12} {len(entries):6d}",
+                 f"{'hit rate':<12} {hit_rate:6.1f} %"]
+        lines.extend(f"{name:<12} {count:6d}" for (name, count) in stats.items())
+        for (idx, entry) in sorted(entries.items()):
+            cadence = "unknown" if entry.cadence is None else f"{entry.cadence:.0f} s"
+            lines.append(f"idx {idx:<8} cadence {cadence}, LastUpdate {entry.lastupdate}")
+    return "\n".join(lines)
+
+# End Of File
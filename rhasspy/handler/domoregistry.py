@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+   
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+'''
+    Local registry of the Domoticz devices, saved in a JSON file so the
+    devices are known right after starting.
+    The first time (and every full_refresh seconds, to forget removed
+    devices) all devices are retrieved. Otherwise only the devices changed
+    since the last request are retrieved, with the lastupdate parameter of
+    Domoticz (the ActTime of the previous answer).
+    Devices can be found by idx, by Type (and SubType), by SwitchType
+    and by name.
+'''
+
+import os
+import json
+import time
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+DEVICES_COMMAND = "type=devices&filter=all&used=true&order=Name"
+
+
+class DeviceIndex:
+    '''
+        The devices (idx (str) -> device as received from Domoticz) and
+        their indexes. An index is never changed after it is made: a refresh
+        makes a new one, so threads can search without the lock.
+    '''
+
+    def __init__(self, devices):
+        # The order of the devices (by Name, as Domoticz returns them) is kept
+        self.devices = devices
+        self.by_type = {}       # Type -> [idx]
+        self.by_subtype = {}    # (Type, SubType) -> [idx]
+        self.by_switchtype = {} # SwitchType -> [idx]
+        self.by_name = {}       # lowercase Name -> idx
+        for (idx, device) in devices.items():
+            device_type = device.get("Type", "")
+            self.by_type.setdefault(device_type, []).append(idx)
+            self.by_subtype.setdefault((device_type, device.get("SubType", "")), []).append(idx)
+            if "SwitchType" in device:
+                self.by_switchtype.setdefault(device["SwitchType"], []).append(idx)
+            self.by_name.setdefault(device.get("Name", "").lower(), idx)
+
+
+class DomoRegistry:
+
+    def __init__(self, domo, filename="", full_refresh=3600, min_interval=5):
+        self.domo = domo
+        self.filename = filename        # "": not saved
+        self.full_refresh = full_refresh  # seconds between retrieving all devices
+        self.min_interval = min_interval  # seconds between checks for changes
+        self.lock = threading.Lock()
+        self.index = DeviceIndex({})
+        self.act_time = 0       # ActTime (Domoticz time) of the last answer
+        self.full_time = 0      # time of the last retrieval of all devices
+        self.check_time = 0     # time of the last check for changes
+        self.answer_time = 0    # time the answer of the last check was received
+        self.load()
+
+    def load(self):
+        if not self.filename or not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+            devices = {device["idx"]: device for device in data["devices"]}
+            self.act_time = data["ActTime"]
+            self.full_time = data["full_time"]
+        except (OSError, ValueError, KeyError) as exc:
+            log.warning(f"Cannot read device registry {self.filename}: {exc}")
+            devices = {}
+            self.act_time = 0
+            self.full_time = 0
+        self.index = DeviceIndex(devices)
+        log.info(f"Device registry {self.filename}: {len(devices)} devices")
+
+    def save(self):
+        if not self.filename:
+            return
+        data = {"ActTime": self.act_time, "full_time": self.full_time,
+                "devices": list(self.index.devices.values())}
+        try:
+            with open(self.filename+".tmp", "w") as f:
+                json.dump(data, f)
+            os.replace(self.filename+".tmp", self.filename)
+        except OSError as exc:
+            log.warning(f"Cannot write device registry {self.filename}: {exc}")
+
+    def refresh(self, force=False):
+        '''
+            Retrieve the changed devices (or all devices), at most once
+            every min_interval seconds unless force is True.
+            Callers waiting for the check of another thread use its answer.
+            Returns False when Domoticz did not answer
+        '''
+        called = time.time()
+        with self.lock:
+            now = time.time()
+            if not force and (now - self.check_time < self.min_interval
+                              or self.answer_time >= called):
+                return True
+            full = force or not self.index.devices or now - self.full_time > self.full_refresh
+            command = DEVICES_COMMAND if full else f"{DEVICES_COMMAND}&lastupdate={self.act_time}"
+            res = self.domo.get_domoticz_json(command)
+            if res is None or "ActTime" not in res:
+                log.warning("Device registry: no answer from Domoticz")
+                return False
+            self.check_time = now
+            self.answer_time = time.time()
+            self.act_time = res["ActTime"]
+            changed = res.get("result", [])
+            if full:
+                devices = {}
+                self.full_time = now
+            else:
+                devices = dict(self.index.devices)
+            for device in changed:
+                if "idx" in device:
+                    devices[device["idx"]] = device
+            log.debug(f"Device registry: {len(changed)} devices"\
+                + (" (all)" if full else " changed"))
+            if full or changed:
+                self.index = DeviceIndex(devices)
+                self.save()
+            return True
+
+    def is_known(self):
+        '''
+            False when the devices are unknown: Domoticz did not answer
+            yet and there was no saved registry
+        '''
+        return self.answer_time > 0 or len(self.index.devices) > 0
+
+    def get(self, idx):
+        return self.index.devices.get(str(idx))
+
+    def find(self, device_type, sub_type=None):
+        '''
+            Return the devices of a Type (and SubType when given)
+        '''
+        index = self.index
+        if sub_type is None:
+            ids = index.by_type.get(device_type, [])
+        else:
+            ids = index.by_subtype.get((device_type, sub_type), [])
+        return [index.devices[idx] for idx in ids]
+
+    def query(self, types=(), switch_type=None, favorite=None):
+        '''
+            Return all devices matching one of types, in the order of types.
+            A type is a Type or a tuple (Type, SubType), no types: all devices.
+            switch_type and favorite (True/False) select further.
+        '''
+        index = self.index
+        if types:
+            ids = []
+            for device_type in types:
+                if isinstance(device_type, tuple):
+                    ids.extend(index.by_subtype.get(device_type, []))
+                else:
+                    ids.extend(index.by_type.get(device_type, []))
+            if switch_type is not None:
+                ids = [idx for idx in ids if index.devices[idx].get("SwitchType") == switch_type]
+        elif switch_type is not None:
+            ids = index.by_switchtype.get(switch_type, [])
+        else:
+            ids = index.devices.keys()
+        devices = [index.devices[idx] for idx in ids]
+        if favorite is not None:
+            devices = [device for device in devices if (device.get("Favorite", 0) == 1) == favorite]
+        return devices
+
+    def find_by_name(self, name):
+        index = self.index
+        idx = index.by_name.get(name.lower())
+        return None if idx is None else index.devices[idx]
+
+# End Of File
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+import time
+import threading
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import intentconfig
+
+import logging
+log = logging.getLogger(__name__)
+
+'''
+    Shared HTTP connection pool for all clients (Domoticz, Kodi, Rhasspy, ...)
+    There is one requests.Session per host, so connections are kept alive
+    and reused for the next request to the same host.
+    Pool size, retries and timeouts are configured in intentconfig (http).
+    For every host the number of requests, reused connections, errors
+    and the latency is counted.
+'''
+
+sessions = {}   # host: (session, adapter)
+stats = {}      # host: HostStats
+lock = threading.Lock()
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.reuses = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+
+    def __str__(self):
+        average = self.latency/self.requests if self.requests else 0.0
+        return f"requests {self.requests:6d}, reuses {self.reuses:6d}, "\
+            + f"errors {self.errors:4d}, latency avg {average*1000:7.1f} ms, "\
+            + f"max {self.max_latency*1000:7.1f} ms"
+
+
+def get_host(url):
+    return urllib.parse.urlsplit(url).netloc
+
+
+def get_session(url):
+    host = get_host(url)
+    with lock:
+        if host not in sessions:
+            http_config = intentconfig.get_http_config()
+            retries = Retry(total=http_config["retries"], read=0,
+                            backoff_factor=http_config["backoff_factor"])
+            adapter = HTTPAdapter(pool_connections=1,
+                                  pool_maxsize=http_config["pool_size"],
+                                  max_retries=retries)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            sessions[host] = (session, adapter)
+            stats[host] = HostStats()
+            log.debug(f"New session for host {host}, config={http_config}")
+        return sessions[host]
+
+
+def request(method, url, **kwargs):
+    '''
+        Same as requests.request, using the session of the host of url.
+        When no timeout is given, the configured timeouts are used.
+        Exceptions of requests (ConnectionError, Timeout, ...) are passed
+        to the caller.
+    '''
+    (session, adapter) = get_session(url)
+    if "timeout" not in kwargs:
+        http_config = intentconfig.get_http_config()
+        kwargs["timeout"] = (http_config["connect_timeout"], http_config["read_timeout"])
+
+    host_stats = stats[get_host(url)]
+    start = time.perf_counter()
+    try:
+        res = session.request(method, url, **kwargs)
+    except requests.exceptions.RequestException:
+        with lock:
+            host_stats.requests += 1
+            host_stats.errors += 1
+        raise
+    latency = time.perf_counter() - start
+
+    # New connections are counted by the pools (of this host),
+    # all other requests reused a connection
+    pools = adapter.poolmanager.pools
+    connections = sum(pools[key].num_connections for key in pools.keys())
+    with lock:
+        host_stats.requests += 1
+        host_stats.reuses = max(0, host_stats.requests - host_stats.errors - connections)
+        host_stats.latency += latency
+        host_stats.max_latency = max(host_stats.max_latency, latency)
+    return res
+
+
+def internet_timeout():
+    '''
+        Timeouts (connect, read) for services on the internet instead of
+        the local network, pass as timeout to get or post.
+    '''
+    http_config = intentconfig.get_http_config()
+    return (http_config["internet_connect_timeout"], http_config["internet_read_timeout"])
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def report():
+    with lock:
+        return "\n".join(f"{host:<32} {host_stats}" for host, host_stats in sorted(stats.items()))
+
+# End Of File
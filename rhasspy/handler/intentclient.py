@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+'''
+    Small replacement for intenthandler.py as Rhasspy command handler.
+    The intent (JSON) is read from stdin and passed to the intent server,
+    the result is written to stdout.
+    Only when the server is not running, the intent is handled
+    by this program itself (like intenthandler.py does).
+'''
+
+import sys
+import json
+import urllib.request
+import urllib.error
+
+import intentconfig
+
+SERVER_TIMEOUT = 300  # Some intents wait for a confirmation of the user
+
+
+def forward_intent(data):
+    url = intentconfig.get_url("IntentServer")
+    request = urllib.request.Request(url, data=data,
+                headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=SERVER_TIMEOUT) as res:
+        return res.read().decode("utf-8")
+
+
+if __name__ == '__main__':
+    data = sys.stdin.buffer.read()
+    try:
+        print(forward_intent(data))
+    except urllib.error.URLError as exc:
+        if not isinstance(exc.reason, ConnectionRefusedError):
+            raise
+        # No intent server running, handle the intent ourselves
+        import intenthandler
+        intenthandler.setup_logging()
+        print(intenthandler.handle_intent(json.loads(data)))
+
+# End Of File
@@ -38,7 +38,10 @@ Text = Enum('Text',
 DomoText = Enum('DomoText',
             'Error GetWind_Response GetWind_Direction GetWind_Beaufort' +
             ' Old_data AskUpdateSlotsConfirmation' +
-            ' SayUpdateSlotsConfirmation SayNoUpdateSlotsConfirmation')
+            ' SayUpdateSlotsConfirmation SayNoUpdateSlotsConfirmation' +
+            ' NoDevice Temp_Response Humid_Response Baro_Response' +
+            ' Rain_Response Elec_Response Gas_Response SwitchMany_Error' +
+            ' Weather_Wind Weather_Sun')
 KodiText = Enum('KodiText',
             'Music AskPlayConfirmation SayNoMusicFound SayPlayConfirmation' +
             ' SayNoPlayConfirmation WhatsPlaying_Response WhatsPlaying_Error' +
@@ -57,6 +60,43 @@ config = {
         , "Kodi" : "http://localhost:8080"
         , "SmartCity" : "https://api.smartcitizen.me"
         , "KNMI" : "https://weerlive.nl/api/json-data-10min.php"
+        , "IntentServer" : "http://localhost:12183"
+        }
+    , "kodi" :
+        { "playlist_chunk_size" : 1000  # songs/albums added with one request
+        , "first_chunk_size" : 20       # songs/albums added before playing starts
+                                        # (0: add all before playing)
+        , "page_size" : 1000            # songs/albums retrieved with one request
+        , "page_workers" : 1            # pages retrieved concurrently
+        , "index_file" : "kodi_library.db"  # local index of the library in the
+                                        # handler directory ("": no index)
+        , "index_max_age" : 3600        # seconds between synchronizations of the index
+        , "slots_state_file" : "kodi_slots.json"  # fingerprints of the last slots update
+                                        # ("": always send all slots and train)
+        , "slot_workers" : 2            # processes cleaning titles for the slots
+                                        # (0: no extra processes)
+        }
+    , "domo" :
+        { "registry_file" : "domo_devices.json"  # devices of Domoticz in the
+                                        # handler directory ("": not saved)
+        , "registry_full_refresh" : 3600  # seconds between retrieving all devices
+        , "registry_min_interval" : 5   # seconds between checks for changed devices
+        , "cache_default_ttl" : 30      # seconds sensor data is kept (cadence unknown)
+        , "cache_min_ttl" : 5           # seconds sensor data is kept at least
+        , "cache_max_ttl" : 300         # seconds sensor data is kept at most
+        , "switch_workers" : 4          # devices switched concurrently (DomoSwitchMany)
+        , "async_workers" : 4           # requests at the same time (DomoWeather)
+        , "async_timeout" : 5           # seconds for all requests of an intent
+        }
+    , "http" :
+        { "pool_size" : 4          # connections kept per host
+        , "retries" : 2            # retries when connecting fails
+        , "backoff_factor" : 0.1   # seconds, doubled for every retry
+        , "connect_timeout" : 0.5  # seconds
+        , "read_timeout" : 60      # seconds
+        # Internet services (KNMI, smartcitizen, duckduckgo) are further away
+        , "internet_connect_timeout" : 3.05  # seconds
+        , "internet_read_timeout" : 10       # seconds
         }
     }
 
@@ -128,6 +168,16 @@ text = {
     DomoText.AskUpdateSlotsConfirmation: "do you want me to update the domotics devices ?",
     DomoText.SayUpdateSlotsConfirmation: "the update of the domotics devices is done.",
     DomoText.SayNoUpdateSlotsConfirmation: "i will leave the domotics devices as it is",
+    DomoText.NoDevice: "i cannot find a device for this question",
+    DomoText.Temp_Response: "the temperature is {VALUE} degrees",
+    DomoText.Humid_Response: "the humidity is {VALUE} percent",
+    DomoText.Baro_Response: "the air pressure is {VALUE} hectopascal",
+    DomoText.Rain_Response: "today {VALUE} millimeter of rain has fallen",
+    DomoText.Elec_Response: "the electricity usage is {VALUE}",
+    DomoText.Gas_Response: "today {VALUE} cubic meter of gas is used",
+    DomoText.SwitchMany_Error: "{FAILED} of {TOTAL} devices did not respond",
+    DomoText.Weather_Wind: "the wind is {BEAUFORT} beaufort from the {DIRECTION}",
+    DomoText.Weather_Sun: "the sun rises at {SUNRISE} and sets at {SUNSET}",
 
     KodiText.Music: "music",
     KodiText.AskPlayConfirmation: "do you want me to play {TITLE} of {ARTIST} ?",
@@ -207,6 +257,16 @@ text = {
     DomoText.AskUpdateSlotsConfirmation: "weet je zeker dat ik de domotics dievaaises moet vurversen ?",
     DomoText.SayUpdateSlotsConfirmation: "ik ben klaar met het vurversen van de domotics dievaaises gegevens.",
     DomoText.SayNoUpdateSlotsConfirmation: "ik zal de domotics dievaaises niet vurversen",
+    DomoText.NoDevice: "ik kan geen dievaais vinden voor deze vraag",
+    DomoText.Temp_Response: "het is {VALUE} graden",
+    DomoText.Humid_Response: "de luchtvochtigheid is {VALUE} procent",
+    DomoText.Baro_Response: "de luchtdruk is {VALUE} hectopascal",
+    DomoText.Rain_Response: "vandaag is er {VALUE} millimeter regen gevallen",
+    DomoText.Elec_Response: "het elektriciteitsverbruik is {VALUE}",
+    DomoText.Gas_Response: "vandaag is er {VALUE} kuub gas gebruikt",
+    DomoText.SwitchMany_Error: "{FAILED} van de {TOTAL} dievaaises reageren niet",
+    DomoText.Weather_Wind: "het waait {BEAUFORT} bo for uit {DIRECTION}elijke richting",
+    DomoText.Weather_Sun: "de zon komt op om {SUNRISE} en gaat onder om {SUNSET}",
 
     KodiText.Music: "muziek",
     KodiText.AskPlayConfirmation: "wil je dat ik {TITLE} van {ARTIST} ga afspelen ?",
@@ -221,6 +281,16 @@ text = {
     }
 }
 
+# Intent plugins: intent name prefix : (module, class)
+# A plugin is imported when the first intent starting with its prefix
+# arrives, e.g. intent KodiSongs imports intentkodi and creates IntentKodi
+plugins = {
+    "Domo" : ("intentdomo", "IntentDomo"),
+    "Kodi" : ("intentkodi", "IntentKodi"),
+    "SmartCity" : ("intentsmartcity", "IntentSmartCity"),
+    "KNMI" : ("intentknmi", "IntentKNMI")
+}
+
 domo_rhasspy_type_map = {
     "Wind":"util",
     "Temp + Humidity" :"util",
@@ -259,37 +329,29 @@ def get_text(textid=Text.ERROR,textsubid=None):
 def get_url(key):
     return config["urls"][key]
 
+def get_http_config():
+    return config["http"]
+
+def get_kodi_config():
+    return config["kodi"]
+
+def get_domo_config():
+    return config["domo"]
+
+def get_handler_path(filename):
+    profiledir = os.getenv("RHASSPY_PROFILE_DIR", default=".")
+    return os.path.join(profiledir, "handler", filename)
+
 def replace_decimal_point(str_in):
     decimal_point = get_text(Text.DecimalPoint)
     return str_in.replace(".", f" {decimal_point} ")
     
-def get_instances(json):
-    instances = {}
-    if "Domo" in config["urls"]:
-        try:
-            from intentdomo import IntentDomo
-            instances["Domo"] = IntentDomo(json)
-        except Exception as exc:
-            log.error(f"Exception instantiating Domo: {exc}")
-    if "Kodi" in config["urls"]:
-        try:
-            from intentkodi import IntentKodi
-            instances["Kodi"] = IntentKodi(json)
-        except Exception as exc:
-            log.error(f"Exception instantiating Kodi: {exc}")
-    if "SmartCity" in config["urls"]:
-        try:
-            from intentsmartcity import IntentSmartCity
-            instances["SmartCity"] = IntentSmartCity(json)
-        except Exception as exc:
-            log.error(f"Exception instantiating SmartCity: {exc}")
-    if "KNMI" in config["urls"]:
-        try:
-            from intentknmi import IntentKNMI
-            instances["KNMI"] = IntentKNMI(json)
-        except Exception as exc:
-            log.error(f"Exception instantiating SmartCity: {exc}")
-    return instances
+def get_plugins():
+    '''
+        Return the intent plugins with a configured url
+    '''
+    return {prefix: plugin for (prefix, plugin) in plugins.items()
+            if prefix in config["urls"]}
 
 def get_slots(filename):
     fslots = open(filename, "r")
@@ -23,10 +23,13 @@ Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
 '''
 
 from domo import Domo
+from asyncdomo import AsyncDomo
 from rhasspy import Rhasspy
 from domo_rhasspy import Domo_Rhasspy
 
+import re
 import json
+import asyncio
 import requests
 import intentconfig
 from intentexcept import error_missing_parameter
@@ -50,6 +53,7 @@ class IntentDomo:
             speech - text to speak with the result, see parameter result
             result (optional, default RESULT)
                 - string to replace in speech with result
+            maxage (optional, default 1800) - seconds the data may be old
     DomoScene - Start a Scene
         Parameter:
             idx (required)- Scene idx from Domoticz
@@ -63,15 +67,33 @@ class IntentDomo:
             idx (required)- Device idx from Domoticz
             state (required) - Must contain 'On' or 'Off'
                 You can use (..:On|..:Off){state} to get the right value in sentences.ini
-    DomoGetWind - Special info intent to hear the wind speed and direction
+    DomoSwitchMany - Put several devices On or Off (or a dimmer on a level)
+        at the same time
+        Parameters:
+            switches (required) - Devices and states, separated by ','
+                e.g. 32=Off,36=Off,24=40 (idx=On, idx=Off or idx=level)
+            speech - text to speak, when all devices are switched
+    DomoWeather - Temperature, humidity, wind and sun times in one answer,
+        retrieved from Domoticz at the same time
         Parameter:
+            maxage (optional, default 1800) - seconds the data may be old
+    DomoGetWind - Special info intent to hear the wind speed and direction
+        Parameters:
             idx (required)- Device idx from Domoticz
+            maxage (optional, default 1800) - seconds the data may be old
     '''
 
     def __init__(self, intentjson):
         self.intentjson = intentjson
         domo_url = intentconfig.get_url("Domo")
-        self.domo = Domo(domo_url)
+        domo_config = intentconfig.get_domo_config()
+        registry_file = domo_config["registry_file"]
+        self.domo = Domo(domo_url,
+            intentconfig.get_handler_path(registry_file) if registry_file else "",
+            domo_config["registry_full_refresh"], domo_config["registry_min_interval"],
+            domo_config["switch_workers"])
+        self.async_domo = AsyncDomo(self.domo, domo_config["async_workers"],
+            domo_config["async_timeout"])
         rhasspy_url = intentconfig.get_url("Rhasspy")
         self.rhasspy = Rhasspy(rhasspy_url)
 
@@ -109,10 +131,42 @@ class IntentDomo:
         # perform action
         self.domo.set_switch(idx,state)
 
+    def get_switches(self, switches):
+        '''
+            Return a list of (idx, state, level) from "idx=state,idx=level,..."
+        '''
+        result = []
+        for switch in switches.split(","):
+            (idx, _, state) = switch.strip().partition("=")
+            if not idx.strip().isdigit() or not state.strip():
+                error_missing_parameter("switches","DomoSwitchMany")
+            state = state.strip()
+            if state.isdigit():
+                result.append((int(idx), "On", int(state)))
+            else:
+                result.append((int(idx), state, -1))
+        return result
+
+    def doDomoSwitchMany(self):
+        # get slots
+        switches = self.intentjson.get_slot_value("switches")
+        if not switches:
+            error_missing_parameter("switches","DomoSwitchMany")
+        switches = self.get_switches(str(switches))
+        log.debug(f"doDomoSwitchMany:switches={switches}")
+
+        # perform action
+        results = self.domo.set_switches(switches)
+        failed = [idx for (idx, result) in results if not result]
+        if failed:
+            log.warning(f"DomoSwitchMany: devices {failed} not switched")
+            speech = intentconfig.get_text(intentconfig.DomoText.SwitchMany_Error)
+            self.intentjson.set_speech(speech.format(FAILED=len(failed), TOTAL=len(results)))
+
     def doDomoInfo(self):
         # get slots
         field_name = self.intentjson.get_slot_value("name", "Data")
-        max_age = self.intentjson.get_slot_intvalue("maxage", 0)
+        max_age = self.intentjson.get_slot_intvalue("maxage", 1800)
         
         idx = self.intentjson.get_slot_intvalue("idx")
         if not idx:
@@ -124,7 +178,7 @@ class IntentDomo:
         log.debug(f"field_name={field_name},speech={speech},resultMatch={resultMatch}")
 
         # perform action
-        info = self.domo.get_info(idx, field_name=field_name, max_age=1800)
+        info = self.domo.get_info(idx, field_name=field_name, max_age=max_age)
         log.debug(f"idx={idx},max_age={max_age},info={info}")
         if info == "":
             # No info received, return Error result 
@@ -148,10 +202,11 @@ class IntentDomo:
         idx = self.intentjson.get_slot_intvalue("idx")
         if not idx:
             error_missing_parameter("idx","DomoGetWind")
-        log.debug(f"doDomoGetWind:idx={idx}")
+        max_age = self.intentjson.get_slot_intvalue("maxage", 1800)
+        log.debug(f"doDomoGetWind:idx={idx},max_age={max_age}")
 
         # perform action
-        res_json = self.domo.get_info(idx,max_age=1800)
+        res_json = self.domo.get_info(idx,max_age=max_age)
 
         log.debug(f"Received: <{res_json}>")
         if str(res_json) == "OLD_DATA" :
@@ -162,7 +217,10 @@ class IntentDomo:
             log.debug("x")
             return
 
-        if "Speed" and "DirectionStr" in res_json:   # json result is Ok
+        self.say_wind(idx, res_json)
+
+    def say_wind(self, idx, res_json):
+        if "Speed" in res_json and "DirectionStr" in res_json:   # json result is Ok
             speed = res_json["Speed"]
             direction = res_json["DirectionStr"]
             log.debug(f"Received: {speed},{direction}")
@@ -236,19 +294,43 @@ class IntentDomo:
 
         self.intentjson.set_speech(speech)
 
+    def no_device_speech(self):
+        # No device found: there is none, or Domoticz did not answer
+        if self.domo.devices_known():
+            return intentconfig.get_text(intentconfig.DomoText.NoDevice)
+        return intentconfig.get_text(intentconfig.DomoText.Error)
+
+    def say_device_value(self, device, value, textid):
+        '''
+            Set the speech for a value of device: the slot speech (with
+            result, default RESULT, replaced by the value) or textid
+        '''
+        max_age = self.intentjson.get_slot_intvalue("maxage", 1800)
+        if device is None:
+            speech = self.no_device_speech()
+        elif value == "":
+            log.warning(f"No value for device {device}")
+            speech = intentconfig.get_text(intentconfig.DomoText.Error)
+        elif not self.domo.check_update(device, max_age):
+            speech = intentconfig.get_text(intentconfig.DomoText.Old_data)
+        else:
+            value = intentconfig.replace_decimal_point(str(value))
+            speech = self.intentjson.get_slot_value("speech")
+            if speech:
+                speech = speech.replace(self.intentjson.get_slot_value("result","RESULT"), value)
+            else:
+                speech = intentconfig.get_text(textid).format(VALUE=value)
+        self.intentjson.set_speech(speech)
+
     '''
     Get info from devices e.g.
     DomoGas   007 Type:P1 Smart Meter         SubType:Gas		   Data:5905.186      Name:Gas
             Counter:5905.186	CounterToday:3.380 m3,
     '''
     def doDomoGas(self):
-        device = self.domo.get_device("P1 Smart Meter")
-        if device :
-            data = device["CounterToday"]
-            data = re.sub(' .*','',data)
-        else:
-            data = ""
-
+        device = self.domo.get_device(("P1 Smart Meter", "Gas"))
+        value = re.sub(' .*','',device["CounterToday"]) if device else ""
+        self.say_device_value(device, value, intentconfig.DomoText.Gas_Response)
 
     '''
     DomoHumid 152 Type:Humidity				  SubType:LaCrosse TX3 Data:Humidity 50 % Name:dummy humidity
@@ -259,20 +341,10 @@ class IntentDomo:
             Barometer:1010	DewPoint:-9.20	Forecast:1	ForecastStr:Sunny	Humidity:50	HumidityStatus:Comfortable	Temp:0.0,
     '''
     def doDomoHumid(self):
-        device = self.domo.get_device("Humidity")
-        if device :
-            data = device["Humidity"]
-        else:
-            device = self.domo.get_device("Temp + Humidity")
-            if device :
-                data = device["Humidity"]
-            else:
-                device = self.domo.get_device("Temp + Humidity + Baro")
-                if device :
-                    data = device["Humidity"]
-                else:
-                    data = ""
-
+        device = self.domo.get_device("Humidity", "Temp + Humidity",
+            "Temp + Humidity + Baro")
+        value = device["Humidity"] if device else ""
+        self.say_device_value(device, value, intentconfig.DomoText.Humid_Response)
 
     '''
     DomoBaro  147 Type:Temp + Humidity + Baro SubType:THB1 - BTHR..Data:0.0 C 50 %	1010 hPa	Name:dummy temp hum baro
@@ -281,16 +353,9 @@ class IntentDomo:
             Barometer:1038.0	Forecast:0	ForecastStr:Stable	Temp:0.0,
     '''
     def doDomoBaro(self):
-        device = self.domo.get_device("Temp + Humidity + Baro")
-        if device :
-            data = device["Barometer"]
-        else:
-            device = self.domo.get_device("Temp + Baro")
-            if device :
-                data = device["Barometer"]
-            else:
-                data = ""
-
+        device = self.domo.get_device("Temp + Humidity + Baro", "Temp + Baro")
+        value = device["Barometer"] if device else ""
+        self.say_device_value(device, value, intentconfig.DomoText.Baro_Response)
 
     '''
     DomoRain  143 Type:Rain					  SubType:TFA		   Data:0             Name:dummy rain
@@ -298,12 +363,8 @@ class IntentDomo:
     '''
     def doDomoRain(self):
         device = self.domo.get_device("Rain")
-        if device :
-            data = device["Data"]
-            data = re.sub(' .*','',data)
-        else:
-            data = ""
-
+        value = re.sub(' .*','',device["Data"]) if device else ""
+        self.say_device_value(device, value, intentconfig.DomoText.Rain_Response)
 
     '''
     DomoTemp  019 Type:Temp + Humidity		  SubType:THGN122/123..Data:3.7 C 88 %    Name:Temp/Humid
@@ -318,20 +379,10 @@ class IntentDomo:
             Temp:0.0,
     '''
     def doDomoTemp(self):
-        device = self.domo.get_device("Temp")
-        if device :
-            data = device["Temp"]
-        else:
-            device = self.domo.get_device("Temp + Humidity")
-            if device :
-                data = device["Temp"]
-            else:
-                device = self.domo.get_device("Temp + Humidity + Baro")
-                if device :
-                    data = device["Temp"]
-                else:
-                    data = ""
-
+        device = self.domo.get_device("Temp", "Temp + Humidity",
+            "Temp + Humidity + Baro")
+        value = device["Temp"] if device else ""
+        self.say_device_value(device, value, intentconfig.DomoText.Temp_Response)
 
     '''
     DomoElec  006 Type:Usage				  SubType:Electric	   Data:345 Watt	  Name:Verbruik elektriciteit,
@@ -339,20 +390,17 @@ class IntentDomo:
             CounterToday:0.000 kWh	EnergyMeterMode:	Usage:0 Watt,
     '''
     def doDomoElec(self):
-        device = self.domo.get_device("Usage","Electric")
-        if device :
-            data = device["Data"]
-            data = re.sub(' .*','',data)
+        device = self.domo.get_device(("Usage", "Electric"), ("General", "kWh"))
+        if device is None:
+            value = ""
+        elif device["Type"] == "Usage":
+            value = re.sub(' .*','',device["Data"])
         else:
-            device = self.domo.get_device("General","kWh")
-            if device :
-                data = device["CounterToday"]
-                data = re.sub(' .*','',data) # remove everyting after first space
-                data = re.sub('\.','',data)  # remove decimal point
-                data = re.sub('^0*','',data) # remove leading zeroes
-            else:
-                data = ""
-
+            value = device["CounterToday"]
+            value = re.sub(' .*','',value) # remove everyting after first space
+            value = re.sub('\.','',value)  # remove decimal point
+            value = re.sub('^0*','',value) # remove leading zeroes
+        self.say_device_value(device, value, intentconfig.DomoText.Elec_Response)
 
     '''
     DomoWind  020 Type:Wind					  SubType:WTGR800	   Data:112.5;ESE;0.0;0.0;3.7;0	Name:Wind
@@ -364,14 +412,49 @@ class IntentDomo:
     '''
     def doDomoWind(self):
         device = self.domo.get_device("Wind")
-        if device :
-            data = device["Data"]
-            data = re.sub(' .*','',data)
+        max_age = self.intentjson.get_slot_intvalue("maxage", 1800)
+        if device is None:
+            self.intentjson.set_speech(self.no_device_speech())
+        elif not self.domo.check_update(device, max_age):
+            self.intentjson.set_speech(intentconfig.get_text(intentconfig.DomoText.Old_data))
         else:
-            data = ""
-
+            self.say_wind(device["idx"], device)
+
+    async def get_weather(self):
+        return await self.async_domo.gather(
+            self.async_domo.get_device("Temp", "Temp + Humidity", "Temp + Humidity + Baro"),
+            self.async_domo.get_device("Humidity", "Temp + Humidity", "Temp + Humidity + Baro"),
+            self.async_domo.get_device("Wind"),
+            self.async_domo.get_info())
+
+    def doDomoWeather(self):
+        max_age = self.intentjson.get_slot_intvalue("maxage", 1800)
+        (temp, humid, wind, sun) = asyncio.run(self.get_weather())
+        log.debug(f"doDomoWeather: temp={temp}, humid={humid}, wind={wind}, sun={sun}")
+
+        # Only recent data is used, the other parts of the answer are left out
+        parts = []
+        if temp and self.domo.check_update(temp, max_age):
+            value = intentconfig.replace_decimal_point(str(temp["Temp"]))
+            parts.append(intentconfig.get_text(intentconfig.DomoText.Temp_Response).format(VALUE=value))
+        if humid and self.domo.check_update(humid, max_age):
+            value = intentconfig.replace_decimal_point(str(humid["Humidity"]))
+            parts.append(intentconfig.get_text(intentconfig.DomoText.Humid_Response).format(VALUE=value))
+        if wind and self.domo.check_update(wind, max_age) and "Speed" in wind:
+            (beaufort, text) = intentconfig.get_beauforttext(float(wind["Speed"]))
+            direction = intentconfig.get_text(intentconfig.DomoText.GetWind_Direction,
+                wind.get("DirectionStr", ""))
+            parts.append(intentconfig.get_text(intentconfig.DomoText.Weather_Wind).format(
+                BEAUFORT=beaufort, DIRECTION=direction))
+        if isinstance(sun, dict) and "Sunrise" in sun and "Sunset" in sun:
+            parts.append(intentconfig.get_text(intentconfig.DomoText.Weather_Sun).format(
+                SUNRISE=sun["Sunrise"].replace(':',' '), SUNSET=sun["Sunset"].replace(':',' ')))
+
+        if parts:
+            self.intentjson.set_speech(". ".join(parts))
+        else:
+            self.intentjson.set_speech(intentconfig.get_text(intentconfig.DomoText.Error))
 
-    
     def doDomoUpdateSlots(self):
         question = intentconfig.get_text(intentconfig.DomoText.AskUpdateSlotsConfirmation)
         if self.rhasspy.rhasspy_confirm(question):
@@ -27,12 +27,14 @@ import os
 import time
 import json
 import datetime
-import requests
 import subprocess
 import logging
 import re
 from intentjson import IntentJSON
+from intentregistry import IntentRegistry
 import intentconfig
+import httppool
+from requests.exceptions import RequestException
 import traceback
 from intentexcept import error_missing_parameter
 from intentexcept import SentencesError
@@ -56,12 +58,15 @@ def get_duckduckgo(search):
 
     log.debug(f"duckduckgo({search})")
     try:
-        res = requests.get(duckduckgo_url, params=params)
+        res = httppool.get(duckduckgo_url, params=params,
+                           timeout=httppool.internet_timeout())
         if res.status_code != 200:
             log.info(f"Url:[{duckduckgo_url}]")
             log.info("Result:{res.status_code}, text:{res.text}")
-    except ConnectionError:
-        log.error(f"ConnectionError for url {duckduckgo_url}")
+    except RequestException as e:
+        log.error(f"{type(e).__name__} for url {duckduckgo_url}")
+        result = intentconfig.get_text(intentconfig.Text.DuckDuckGo_ERROR)
+        return(result.format(SEARCH=search))
 
     log.debug(str(res.text))
     res_json = json.loads(res.text)
@@ -271,17 +276,40 @@ def doDuckDuckGo():
 # ============================================================================
 
 
-if __name__ == '__main__':
+def setup_logging(logfile='intenthandler.log'):
     formatstr = '%(asctime)s %(levelname)-4.4s %(module)-12.12s'\
                  +' %(funcName)-8.8s (%(lineno)d)- %(message)s'
-    logging.basicConfig(filename=LOGPATH+'intenthandler.log',
+    logging.basicConfig(filename=LOGPATH+logfile,
                         level=logging.DEBUG,
                         format=formatstr,
                         datefmt='%Y%m%d %H:%M:%S')
 
-    # get json from stdin and load into python dict
-    log.debug("Intent received")
-    inputjson = json.loads(sys.stdin.read())
+
+registry = None
+
+def get_registry():
+    '''
+        Return the table with all intent handlers, build it on first use
+    '''
+    global registry
+    if registry is None:
+        registry = IntentRegistry()
+        registry.add_functions(globals())
+        for (prefix, (module_name, class_name)) in intentconfig.get_plugins().items():
+            registry.add_plugin(prefix, module_name, class_name)
+        log.debug(f"Intent handlers:\n{registry.dump()}")
+    return registry
+
+
+def handle_intent(inputjson):
+    '''
+        Handle one intent as received from Rhasspy (a dict)
+        and return the resulting json as a string.
+        The intent handlers use the global intentjson, so intents must be
+        handled one at a time (the intent server does this)
+    '''
+    global intentjson
+    start = time.perf_counter()
     log.debug("JSON:"+json.dumps(inputjson))
     intentjson = IntentJSON(inputjson)
     intent = intentjson.get_intent()
@@ -292,33 +320,31 @@ if __name__ == '__main__':
     intentjson.set_speech(intentjson.get_speech(text_to_speak))
 
     try:
-        intentcalled = False
-        for (key, intentinstance) in\
-                intentconfig.get_instances(intentjson).items():
-            log.debug(f"Trying intent{key}.do{intent}")
-            if intent.startswith(key):
-                try:
-                    log.debug(f"Calling intent{key}.do{intent}")
-                    eval(f"intentinstance.do"+intent)()
-                    intentcalled = True
-                    break  # Dirty programming!
-                except AttributeError:
-                    log.debug(f"{traceback.format_exc()}")
-                    continue  # Dirty programming!
-
-        if not intentcalled:
-            try:
-                log.debug(f"Calling default intent do{intent}")
-                eval("do"+intent)()
-            except NameError:
-                log.debug(f"{traceback.format_exc()}")
-                speech = intentconfig.get_text(intentconfig.Text.Intent_Error)
-                intentjson.set_speech(speech.format(INTENT=intent))
+        handler = get_registry().get_handler(intent, intentjson)
+        if handler is None:
+            log.warning(f"No handler found for intent {intent}")
+            speech = intentconfig.get_text(intentconfig.Text.Intent_Error)
+            intentjson.set_speech(speech.format(INTENT=intent))
+        else:
+            log.debug(f"Calling {handler.__qualname__}")
+            handler()
     except SentencesError as se:
         speech = se.handle()
         intentjson.set_speech(speech)
 
-    # convert dict to json and print to stdout
+    # convert dict to json
     returnJson = intentjson.get_json_as_string()
     log.debug(f"JSON:{returnJson}")
-    print(returnJson)
+    log.info(f"Intent {intent} handled in {(time.perf_counter()-start)*1000:.1f} ms")
+    return returnJson
+
+
+if __name__ == '__main__':
+    setup_logging()
+
+    # get json from stdin and load into python dict
+    log.debug("Intent received")
+    inputjson = json.loads(sys.stdin.read())
+
+    # print the resulting json to stdout
+    print(handle_intent(inputjson))
@@ -29,7 +29,8 @@ from domo_rhasspy import Domo_Rhasspy
 import json
 import random
 import re
-import requests
+import httppool
+from requests.exceptions import RequestException
 import intentconfig
 from intentexcept import error_missing_parameter
 
@@ -47,11 +48,11 @@ class Rain:
     def get_http(self, url):
         log.debug(f"get data(url={url}")
         try:
-            res = requests.get(url)
+            res = httppool.get(url, timeout=httppool.internet_timeout())
             if res.status_code != 200:
                 log.info(f"do_get(Url:{url}\nResult:{res.status_code}, text:{res.text}")
-        except ConnectionError:
-            log.warning(f"ConnectionError for url [{url}]")
+        except RequestException as e:
+            log.warning(f"{type(e).__name__} for url [{url}]")
             return None
 
         log.debug("Get Result:"+res.text)
@@ -200,11 +201,11 @@ class IntentKNMI:
         url = f"{self.knmi_url}?key={key}&locatie={location}"
         log.debug(f"get data(url={self.knmi_url}?key={key}&locatie={location}")
         try:
-            res = requests.get(url)
+            res = httppool.get(url, timeout=httppool.internet_timeout())
             if res.status_code != 200:
                 log.info(f"do_get(Url:{url}\nResult:{res.status_code}, text:{res.text}")
-        except ConnectionError:
-            log.warning(f"ConnectionError for url [{url}]")
+        except RequestException as e:
+            log.warning(f"{type(e).__name__} for url [{url}]")
             return None
 
         log.debug("Get Result:"+res.text)
@@ -25,6 +25,7 @@ Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
 from kodi import Kodi
 from rhasspy import Rhasspy
 from kodi_rhasspy import Kodi_Rhasspy
+from kodiindex import KodiIndex
 
 import intentconfig
 import logging
@@ -74,10 +75,51 @@ Speel [de|het] ($titles){title}   [van ($composers){composer}]
     def __init__(self, intentjson):
         self.intentjson = intentjson
         kodi_url = intentconfig.get_url("Kodi")
-        self.kodi = Kodi(kodi_url)
+        kodi_config = intentconfig.get_kodi_config()
+        self.kodi = Kodi(kodi_url, kodi_config["playlist_chunk_size"],
+            kodi_config["first_chunk_size"], kodi_config["page_size"],
+            kodi_config["page_workers"])
+        if kodi_config["index_file"]:
+            self.index = KodiIndex(intentconfig.get_handler_path(kodi_config["index_file"]),
+                self.kodi, kodi_config["index_max_age"])
+        else:
+            self.index = None
         rhasspy_url = intentconfig.get_url("Rhasspy")
         self.rhasspy = Rhasspy(rhasspy_url)
 
+    def sync_index(self, force=False):
+        try:
+            self.index.sync(force)
+        except Exception as exc:
+            log.warning(f"Synchronizing the Kodi library index failed: {exc}")
+
+    def find_in_index(self, find, *args, **kwargs):
+        # Search in the local index, nothing is found when the index fails
+        self.sync_index()
+        try:
+            return find(*args, **kwargs)
+        except Exception as exc:
+            log.warning(f"Searching the Kodi library index failed: {exc}")
+            return []
+
+    def find_albums(self, artist, album, genre):
+        # Search in the local index, ask Kodi when nothing is found
+        if self.index is not None:
+            albums = self.find_in_index(self.index.find_albums,
+                artist=artist, album=album, genre=genre)
+            if len(albums) > 0:
+                return albums
+        return self.kodi.get_albums(artist=artist, album=album, genre=genre)
+
+    def find_songs(self, artist, composer, title, selection, genre):
+        # Search in the local index, ask Kodi when nothing is found
+        if self.index is not None:
+            songs = self.find_in_index(self.index.find_songs,
+                artist, composer, title, selection, genre)
+            if len(songs) > 0:
+                return songs
+        return self.kodi.get_songs(artist, composer, title, selection, genre)
+
     def play_albums(self):
         artist = self.intentjson.get_slot_value("artist")
         album = self.intentjson.get_slot_value("album")
@@ -85,7 +127,7 @@ Speel [de|het] ($titles){title}   [van ($composers){composer}]
         artist_raw = self.intentjson.get_raw_value("artist")
         album_raw = self.intentjson.get_raw_value("album")
         log.debug(f"play_albums:(artist={artist}, album={album}, genre={genre})")
-        albums = self.kodi.get_albums(artist=artist, album=album, genre=genre)
+        albums = self.find_albums(artist, album, genre)
 
         question = intentconfig.get_text(intentconfig.KodiText.AskPlayConfirmation).\
             format(TITLE=album_raw, ARTIST=artist_raw)
@@ -111,7 +153,7 @@ Speel [de|het] ($titles){title}   [van ($composers){composer}]
         selection = self.intentjson.get_slot_value("selection")
         log.debug(f"play_songs:(artist={artist}, composer={composer}, title=={title},"\
             + f"selection={selection}, genre={genre})")
-        songs = self.kodi.get_songs(artist, composer, title, selection, genre)
+        songs = self.find_songs(artist, composer, title, selection, genre)
 
         if selection == "":
             selection = intentconfig.get_text(intentconfig.KodiText.Music) 
@@ -187,7 +229,13 @@ Speel [de|het] ($titles){title}   [van ($composers){composer}]
         if self.rhasspy.rhasspy_confirm(question):
             self.rhasspy.rhasspy_speak(
                 intentconfig.get_text(intentconfig.Text.Please_Wait))
-            kodi_rhasspy = Kodi_Rhasspy(self.kodi, self.rhasspy)
+            if self.index is not None:
+                self.sync_index(force=True)
+            kodi_config = intentconfig.get_kodi_config()
+            state_file = kodi_config["slots_state_file"]
+            kodi_rhasspy = Kodi_Rhasspy(self.kodi, self.rhasspy,
+                intentconfig.get_handler_path(state_file) if state_file else "",
+                workers=kodi_config["slot_workers"])
             res = kodi_rhasspy.create_slots_files()
             if res:
                 confirmation = res
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+import time
+import importlib
+
+import logging
+log = logging.getLogger(__name__)
+
+class IntentRegistry:
+    '''
+    Class IntentRegistry maps the name of an intent to the method or
+    function that handles the intent.
+    All intent handlers start with do followed by the intent name:
+    - methods of the intent classes of the plugins (IntentDomo, IntentKodi, ...)
+      A plugin only handles intents starting with its prefix
+      (e.g. IntentDomo handles DomoInfo with method doDomoInfo)
+    - functions (the default intents in intenthandler.py)
+    Finding a handler is a single dict lookup.
+    The module of a plugin is imported and its intent class is instantiated
+    when the first intent with the prefix of the plugin is called.
+    The instance is reused for the next intents.
+    The time needed to import and instantiate a plugin is kept in timing.
+    '''
+    HANDLER_PREFIX = "do"
+
+    def __init__(self):
+        self.handlers = {}   # intent: (prefix of plugin, method name) or (None, function)
+        self.plugins = {}    # prefix: (module name, class name)
+        self.classes = {}    # prefix: intent class
+        self.instances = {}  # prefix: instance of intent class
+        self.timing = {}     # prefix: {"import": seconds, "instantiate": seconds}
+
+    def add_functions(self, namespace):
+        for name, function in namespace.items():
+            if name.startswith(self.HANDLER_PREFIX) and callable(function):
+                intent = name[len(self.HANDLER_PREFIX):]
+                self.handlers[intent] = (None, function)
+
+    def add_plugin(self, prefix, module_name, class_name):
+        self.plugins[prefix] = (module_name, class_name)
+
+    def add_class(self, prefix, intentclass):
+        self.classes[prefix] = intentclass
+        for name in dir(intentclass):
+            intent = name[len(self.HANDLER_PREFIX):]
+            if name.startswith(self.HANDLER_PREFIX) and intent.startswith(prefix)\
+                    and callable(getattr(intentclass, name)):
+                self.handlers[intent] = (prefix, name)
+
+    def find_plugin(self, intent):
+        # Longest matching prefix of a plugin that is not loaded yet
+        found = None
+        for prefix in self.plugins:
+            if intent.startswith(prefix) and prefix not in self.classes\
+                    and (found is None or len(prefix) > len(found)):
+                found = prefix
+        return found
+
+    def load_plugin(self, prefix):
+        (module_name, class_name) = self.plugins[prefix]
+        start = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name)
+            intentclass = getattr(module, class_name)
+        except Exception as exc:
+            log.error(f"Exception importing {prefix} ({module_name}.{class_name}): {exc}")
+            return False
+        self.timing[prefix] = {"import": time.perf_counter() - start}
+        self.add_class(prefix, intentclass)
+        log.info(f"Plugin {prefix} imported in {self.timing[prefix]['import']*1000:.1f} ms")
+        return True
+
+    def get_instance(self, prefix, intentjson):
+        if prefix in self.instances:
+            intentinstance = self.instances[prefix]
+            intentinstance.intentjson = intentjson
+            return intentinstance
+
+        start = time.perf_counter()
+        try:
+            intentinstance = self.classes[prefix](intentjson)
+        except Exception as exc:
+            log.error(f"Exception instantiating {prefix}: {exc}")
+            return None
+        self.timing[prefix]["instantiate"] = time.perf_counter() - start
+        log.info(f"Plugin {prefix} instantiated in "\
+            + f"{self.timing[prefix]['instantiate']*1000:.1f} ms")
+        self.instances[prefix] = intentinstance
+        return intentinstance
+
+    def get_handler(self, intent, intentjson):
+        '''
+            Return the handler for intent (a callable without arguments)
+            or None if there is no handler
+        '''
+        if intent not in self.handlers:
+            prefix = self.find_plugin(intent)
+            if prefix is None or not self.load_plugin(prefix)\
+                    or intent not in self.handlers:
+                return None
+        (prefix, handler) = self.handlers[intent]
+        if prefix is None:
+            return handler
+        intentinstance = self.get_instance(prefix, intentjson)
+        if intentinstance is None:
+            return None
+        return getattr(intentinstance, handler)
+
+    def dump(self):
+        lines = []
+        for intent, (prefix, handler) in sorted(self.handlers.items()):
+            if prefix is None:
+                lines.append(f"{intent:<24} {handler.__module__}.{handler.__name__}")
+            else:
+                loaded = "loaded" if prefix in self.instances else "not loaded"
+                lines.append(f"{intent:<24} {self.classes[prefix].__name__}.{handler} ({loaded})")
+        for prefix, (module_name, class_name) in sorted(self.plugins.items()):
+            if prefix not in self.classes:
+                lines.append(f"{prefix+'*':<24} {module_name}.{class_name} (not imported)")
+        return "\n".join(lines)
+
+    def timing_report(self):
+        lines = []
+        for prefix in sorted(self.plugins):
+            if prefix in self.timing:
+                timing = self.timing[prefix]
+                line = f"{prefix:<12} import {timing['import']*1000:8.1f} ms"
+                if "instantiate" in timing:
+                    line = line + f", instantiate {timing['instantiate']*1000:8.1f} ms"
+                lines.append(line)
+            else:
+                lines.append(f"{prefix:<12} not imported")
+        return "\n".join(lines)
+
+# End Of File
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+import sys
+import time
+import json
+import traceback
+import urllib.parse
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+start_import = time.perf_counter()
+import intentconfig
+import intenthandler
+import httppool
+import domocache
+import_time = time.perf_counter() - start_import
+from intentjson import IntentJSON
+
+import logging
+log = logging.getLogger(__name__)
+
+'''
+    The intent server is a long running alternative for calling
+    intenthandler.py for every intent.
+    Modules, configuration and the clients for Domoticz, Kodi and Rhasspy
+    are loaded once and kept for all intents.
+
+    Rhasspy can use the server directly as remote intent handler:
+        Intent Handling: Remote HTTP, url: http://localhost:12183
+    or keep using a command handler with the small program intentclient.py,
+    that passes the intent to this server.
+'''
+
+class IntentRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        # Show the intent handlers and timing, for debugging
+        if self.path == "/intents":
+            self.send_answer(intenthandler.get_registry().dump()+"\n", "text/plain")
+        elif self.path == "/timing":
+            self.send_answer(timing_report()+"\n", "text/plain")
+        elif self.path == "/http":
+            self.send_answer(httppool.report()+"\n", "text/plain")
+        elif self.path == "/cache":
+            self.send_answer(domocache.report()+"\n", "text/plain")
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length)
+        try:
+            inputjson = json.loads(data.decode("utf-8"))
+        except ValueError as exc:
+            log.warning(f"Received invalid JSON: {exc}")
+            self.send_error(400, "Invalid JSON")
+            return
+
+        try:
+            returnJson = intenthandler.handle_intent(inputjson)
+        except Exception:
+            # One failing intent must not stop the server
+            log.error(f"{traceback.format_exc()}")
+            intentjson = IntentJSON(inputjson)
+            intentjson.set_speech(intentconfig.get_text(intentconfig.Text.ERROR))
+            returnJson = intentjson.get_json_as_string()
+
+        self.send_answer(returnJson)
+
+    def send_answer(self, text, content_type="application/json"):
+        answer = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    def log_message(self, format, *args):
+        log.debug(f"{self.address_string()} {format % args}")
+
+
+startup_timing = {}
+
+def warm_up():
+    # Build the table with intent handlers before the first intent arrives.
+    # Plugins are imported and instantiated when their first intent is called
+    start = time.perf_counter()
+    registry = intenthandler.get_registry()
+    startup_timing["import"] = import_time
+    startup_timing["registry"] = time.perf_counter() - start
+    log.info(f"Startup timing:\n{timing_report()}")
+
+
+def timing_report():
+    registry = intenthandler.get_registry()
+    lines = [f"{'modules':<12} import {startup_timing['import']*1000:8.1f} ms",
+             f"{'handlers':<12} table  {startup_timing['registry']*1000:8.1f} ms"\
+                + f" ({len(registry.handlers)} intents)"]
+    return "\n".join(lines) + "\n" + registry.timing_report()
+
+
+def run_server(url):
+    address = urllib.parse.urlsplit(url)
+    server = HTTPServer((address.hostname, address.port), IntentRequestHandler)
+    log.info(f"Intent server listening on {url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Intent server stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    intenthandler.setup_logging('intentserver.log')
+    warm_up()
+    if len(sys.argv) > 1:
+        url = sys.argv[1]
+    else:
+        url = intentconfig.get_url("IntentServer")
+    run_server(url)
+
+# End Of File
@@ -23,7 +23,8 @@ Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
 '''
 
 import json
-import requests
+import httppool
+from requests.exceptions import RequestException
 import intentconfig
 from intentexcept import error_missing_parameter
 import logging
@@ -53,12 +54,12 @@ class IntentSmartCity:
         url = self.smartcitizen_url+kit
         log.debug("Url:"+url)
         try:
-            res = requests.get(url)
+            res = httppool.get(url, timeout=httppool.internet_timeout())
             if res.status_code != 200:
                 log.info(f"Url:[{url}\nResult:{res.status_code}, text:{res.text}")
                 return None
-        except ConnectionError:
-            log.warning(f"ConnectionError for {url}")
+        except RequestException as e:
+            log.warning(f"{type(e).__name__} for {url}")
             return None
 
         log.debug(str(res.text))
@@ -23,181 +23,291 @@ Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
 '''
 
 import datetime
-import requests
 import logging
+import json
 import re
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import httppool
+from kodirpc import KodiRequest, Filter, serialize_batch
+from requests.exceptions import RequestException
 log = logging.getLogger(__name__)
 
 class Kodi:
-    def __init__(self, url):
+    # Number of items added to the playlist with one request
+    PLAYLIST_CHUNK_SIZE = 1000
+    # Number of items added before playing starts, the rest of the items
+    # is added in the background. 0: add all items before playing
+    FIRST_CHUNK_SIZE = 20
+    # Number of songs/albums retrieved from the library with one request
+    PAGE_SIZE = 1000
+
+    # Requests that never change are serialized once
+    GET_WHATS_PLAYING = KodiRequest("Player.GetItem", "itemData", playerid=0)\
+        .properties("album", "artist", "genre", "title").serialize()
+    STOP_PLAY = KodiRequest("Player.Stop", playerid=1).serialize()
+    START_PLAY = KodiRequest("Player.Open", item={"playlistid": 0}).serialize()
+    PAUSE_RESUME = KodiRequest("Player.PlayPause", playerid=0).serialize()
+    NEXT_TRACK = KodiRequest("Player.GoTo", playerid=0, to="next").serialize()
+    PREVIOUS_TRACK = KodiRequest("Player.GoTo", playerid=0, to="previous").serialize()
+    CLEAR_PLAYLIST = KodiRequest("Playlist.Clear", playlistid=0).serialize()
+    GET_LIBRARY_TOTALS = serialize_batch([
+        KodiRequest("AudioLibrary.GetSongs", "libSongs").limits(0, 1),
+        KodiRequest("AudioLibrary.GetAlbums", "libAlbums").limits(0, 1)])
+    STOP_AND_CLEAR_PLAYLIST = serialize_batch([
+        KodiRequest("Player.Stop", 1, playerid=1),
+        KodiRequest("Playlist.Clear", 2, playlistid=0)])
+
+    def __init__(self, url, chunk_size=PLAYLIST_CHUNK_SIZE,
+                 first_chunk_size=FIRST_CHUNK_SIZE, page_size=PAGE_SIZE, page_workers=1):
         self.url = url+"/jsonrpc"
+        self.chunk_size = chunk_size
+        self.first_chunk_size = first_chunk_size
+        self.page_size = page_size
+        self.page_workers = page_workers  # > 1: get pages concurrently
+        self.fill_thread = None
+        self.fill_cancel = threading.Event()
 
     def do_post(self, data):
         log.debug(f"Post data(url={self.url}:<{data}>")
         try:
-            res = requests.post(self.url, data=data.encode("utf-8"),
+            res = httppool.post(self.url, data=data.encode("utf-8"),
                                 headers={"Content-Type": "application/json"})
             if res.status_code != 200:
                 log.info("do_post(Url:[%s]\nResult:%s, text:[%s]"
-                         % (url, res.status_code, res.text))
-        except ConnectionError:
-            log.warning(f"ConnectionError for url [{url}]")
+                         % (self.url, res.status_code, res.text))
+        except RequestException as e:
+            log.warning(f"{type(e).__name__} for url [{self.url}]")
             return None
 
         log.debug("Post Result:"+res.text)
         return(res.json())
 
+    def do_post_batch(self, data):
+        '''
+            Post a serialized JSON-RPC batch (see serialize_batch) in one request.
+            Returns the list of results
+        '''
+        res = self.do_post(data)
+        if res is None:
+            return []
+        return res
+
     def get_whats_playing(self):
         log.debug("get_whats_playing")
-        data = '{"jsonrpc":"2.0","method":"Player.GetItem","params":'\
-                + '{"properties":["album", "artist", "genre", "title"]'\
-                + ', "playerid": 0},"id":"itemData"}'
-        return self.do_post(data)
+        return self.do_post(Kodi.GET_WHATS_PLAYING)
+
+    def stop(self):
+        self.cancel_fill_playlist()
+        self.stop_play()
 
     def stop_play(self):
-        data = '{"jsonrpc": "2.0", "method": "Player.Stop",'\
-               + ' "params": { "playerid": 1 }, "id": 1}'
-        self.do_post(data)
+        self.do_post(Kodi.STOP_PLAY)
 
     def start_play(self):
-        data = '{"jsonrpc":"2.0", "id":1,"method":"Player.Open",'\
-               + '"params":{"item":{"playlistid":0}}}'
-        self.do_post(data)
+        self.do_post(Kodi.START_PLAY)
 
     def pause_resume(self):
-        data = '{"jsonrpc": "2.0", "method": "Player.PlayPause",'\
-               + ' "params": { "playerid": 0 }, "id": 1}'
-        self.do_post(data)
+        self.do_post(Kodi.PAUSE_RESUME)
 
     def next_track(self):
-        data = '{"jsonrpc": "2.0", "method": "Player.GoTo",'\
-               + ' "params": { "playerid": 0 , "to":"next"}, "id": 1}'
-        self.do_post(data)
+        self.do_post(Kodi.NEXT_TRACK)
 
     def previous_track(self):
-        data = '{"jsonrpc": "2.0", "method": "Player.GoTo",'\
-               + ' "params": { "playerid": 0 , "to":"previous"}, "id": 1}'
-        self.do_post(data)
-        data = '{"jsonrpc": "2.0", "method": "Player.GoTo",'\
-               + ' "params": { "playerid": 0 , "to":"previous"}, "id": 1}'
-        self.do_post(data)
+        self.do_post(Kodi.PREVIOUS_TRACK)
+        self.do_post(Kodi.PREVIOUS_TRACK)
 
     def volume(self, volume):
-        data = '{"jsonrpc":"2.0", "method":"Application.SetVolume",'\
-               + '"id":1,"params":{"volume":'+str(volume)+'}}'
-        self.do_post(data)
+        self.do_post(KodiRequest("Application.SetVolume", volume=int(volume)).serialize())
 
     def clear_playlist(self):
-        data = '{"jsonrpc":"2.0", "id":1,"method":"Playlist.Clear",'\
-               + '"params":{"playlistid":0}}'
-        self.do_post(data)
+        self.do_post(Kodi.CLEAR_PLAYLIST)
+
+    def add_to_playlist(self, item):
+        self.do_post(KodiRequest("Playlist.Add", playlistid=0, item=item).serialize())
 
     def add_album_to_playlist(self, albumid):
-        data = '{"jsonrpc":"2.0", "id":1,"method":"Playlist.Add","params":{'\
-               + '"playlistid":0, "item":{"albumid":'+str(albumid)+'}}}'
-        self.do_post(data)
+        self.add_to_playlist({"albumid": albumid})
 
     def add_stream_to_playlist(self, stream_url):
-        data = '{"jsonrpc":"2.0", "id":1,"method":"Playlist.Add","params":{'\
-               + '"playlistid":0, "item":{"file":"'+stream_url+'"}}}'
-        self.do_post(data)
+        self.add_to_playlist({"file": stream_url})
 
     def add_song_to_playlist(self, songid):
-        data = '{"jsonrpc":"2.0", "id":1,"method":"Playlist.Add","params":{'\
-               + '"playlistid":0, "item":{"songid":'+str(songid)+'}}}'
-        self.do_post(data)
+        self.add_to_playlist({"songid": songid})
 
-    def get_albums(self,artist="", album="", genre=""):
-        log.debug("get_albums")
-
-        data = '{"jsonrpc":"2.0","method":"AudioLibrary.GetAlbums"'\
-                + ',"params":{"properties":["artist","genre"]'
-        if artist != "" or album != "" or genre != "":
-            data = data + ',"filter":{"and":[{"field":"artist", "operator":'\
-                + '"contains", "value":"'+artist+'"}'\
-                + ',{"field":"album", "operator":'\
-                + '"contains", "value":"'+album+'"}'\
-                + ',{"field": "genre", "operator":'\
-                + '"contains","value": "'+genre+'"}]}'
-        data = data + ',"sort":{"order":"ascending","method":"album"}}'\
-                + ',"id":"libAlbums"}'
-        res = self.do_post(data)
-        if "result" in res and "albums" in res["result"]:
-            albums = res["result"]["albums"]
-        else:
-            albums = []
-        return albums
+    def add_items_to_playlist(self, items):
+        '''
+            Add items (e.g. {"songid":12} or {"albumid":3}) to the playlist.
+            Playlist.Add accepts a list of items, chunk_size items are sent
+            in one request and all chunks are sent in one batch
+        '''
+        batch = []
+        for start in range(0, len(items), self.chunk_size):
+            batch.append(KodiRequest("Playlist.Add", len(batch)+1, playlistid=0,
+                item=items[start:start+self.chunk_size]))
+        if batch:
+            self.do_post_batch(serialize_batch(batch))
 
+    def stop_and_clear_playlist(self):
+        self.do_post_batch(Kodi.STOP_AND_CLEAR_PLAYLIST)
 
-    def get_songs(self, artist="", composer="", title="", selection="", genre=""):
-        log.debug(f"get_songs artist={artist}, "\
+    def get_page(self, request, name, start):
+        '''
+            Get the items (name is "songs" or "albums") start..start+page_size
+            Returns (items, total number of items)
+        '''
+        res = self.do_post(request.serialize_page(start, start+self.page_size))
+        if res and "result" in res and name in res["result"]:
+            return (res["result"][name], res["result"]["limits"]["total"])
+        return ([], 0)
+
+    def iter_items(self, request, name):
+        '''
+            Yield the items of request page by page, so the library is never
+            completely in memory. The first page tells the total number of items,
+            with page_workers > 1 the next pages are retrieved concurrently
+            (at most page_workers pages are waiting)
+        '''
+        (items, total) = self.get_page(request, name, 0)
+        yield from items
+        starts = range(self.page_size, total, self.page_size)
+        if self.page_workers <= 1:
+            for start in starts:
+                yield from self.get_page(request, name, start)[0]
+            return
+
+        with ThreadPoolExecutor(max_workers=self.page_workers) as executor:
+            pages = deque()
+            for start in starts:
+                pages.append(executor.submit(self.get_page, request, name, start))
+                if len(pages) >= self.page_workers:
+                    yield from pages.popleft().result()[0]
+            while pages:
+                yield from pages.popleft().result()[0]
+
+    def iter_albums(self,artist="", album="", genre=""):
+        log.debug("iter_albums")
+        request = KodiRequest("AudioLibrary.GetAlbums", "libAlbums")\
+            .properties("artist", "genre")\
+            .filter(Filter.all_of(
+                Filter.contains("artist", artist) if artist else None,
+                Filter.contains("album", album) if album else None,
+                Filter.contains("genre", genre) if genre else None))\
+            .sort("album")
+        return self.iter_items(request, "albums")
+
+    def get_albums(self,artist="", album="", genre=""):
+        return list(self.iter_albums(artist, album, genre))
+
+    def iter_songs(self, artist="", composer="", title="", selection="", genre=""):
+        log.debug(f"iter_songs artist={artist}, "\
             + f"composer={composer}, title={title}")
-        data = '{"jsonrpc": "2.0", "method": "AudioLibrary.GetSongs",'\
-                + '"params": { "limits": { "start" : 0, "end": 50000 },'\
-                + '"properties": ["displayartist", "displaycomposer"],'\
-                + '"filter":{"and":[ '
-        comma = ""
+        rules = []
         if artist != "":
-            data = data + comma + '{"field": "artist", "operator": "contains",'\
-                + '"value": "'+artist+'"}'
-            comma = ","
+            rules.append(Filter.contains("artist", artist))
         if composer != "":
-            data = data + comma + '{"field": "artist", "operator": "contains",'\
-                + '"value": "'+composer+'"}'
-            comma = ","
+            rules.append(Filter.contains("artist", composer))
         if title != "":
-            data = data + comma + '{"field": "title", "operator": "contains",'\
-                + '"value": "'+title+'"}'
-            comma = ","
+            rules.append(Filter.contains("title", title))
         if selection != "":
             for select in selection.split(","):
-                data = data + comma + '{"field": "title", "operator": "contains",'\
-                    + '"value": "'+select+'"}'
-                comma = ","
+                rules.append(Filter.contains("title", select))
         if genre != "":
-            data = data + comma + '{"field": "genre", "operator": "contains",'\
-                + '"value": "'+genre+'"}'
-        data = data + ']}'
-        # data = data + ',"sort": { "order": "ascending", "method": "title", "ignorearticle": true }'
-        data = data + '},"id": "libSongs"}'
+            rules.append(Filter.contains("genre", genre))
+        request = KodiRequest("AudioLibrary.GetSongs", "libSongs")\
+            .properties("displayartist", "displaycomposer")\
+            .filter(Filter.all_of(*rules))
+        return self.iter_items(request, "songs")
 
-        res = self.do_post(data)
-        log.debug(f"get_songs:Found:{res['result']['limits']['end']}")
+    def get_songs(self, artist="", composer="", title="", selection="", genre=""):
+        songs = list(self.iter_songs(artist, composer, title, selection, genre))
+        log.debug(f"get_songs:Found:{len(songs)}")
+        return songs
 
-        if "result" in res and "songs" in res["result"]:
-            songs = res["result"]["songs"]
-        else:
-            songs = []
+    def iter_all_songs(self, properties, added_after=None):
+        request = KodiRequest("AudioLibrary.GetSongs", "libSongs")\
+            .properties(*properties)\
+            .filter(Filter.rule("dateadded", "after", added_after) if added_after else None)
+        return self.iter_items(request, "songs")
 
-        return songs
+    def iter_all_albums(self, properties, added_after=None):
+        request = KodiRequest("AudioLibrary.GetAlbums", "libAlbums")\
+            .properties(*properties)\
+            .filter(Filter.rule("dateadded", "after", added_after) if added_after else None)
+        return self.iter_items(request, "albums")
+
+    def get_library_totals(self):
+        '''
+            Return the number of songs and albums in the library
+            or (None, None) when Kodi does not answer
+        '''
+        res = self.do_post_batch(Kodi.GET_LIBRARY_TOTALS)
+        try:
+            totals = {answer["id"]: answer["result"]["limits"]["total"] for answer in res}
+            return (totals["libSongs"], totals["libAlbums"])
+        except (KeyError, TypeError):
+            log.warning(f"get_library_totals: unexpected answer:{res}")
+            return (None, None)
 
     def play_stream(self, stream_url):
         log.debug(f"play_stream:stream_url:{stream_url}")
+        self.cancel_fill_playlist()
         self.stop_play()
         self.clear_playlist()
         self.add_stream_to_playlist(stream_url)
         self.start_play()
-        # data = '{"jsonrpc":"2.0", "id":1,"method":"Player.Open",'\
-            # + '"params":{"item" : {"file":"' + stream_url + '" }}}'
-        # self.do_post(data)
 
-    def play_albums(self, albums):
-        log.debug(f"play_albums:albums:{albums}")
-        self.stop_play()
-        self.clear_playlist()
-        for album in albums:
-            log.debug(f"album={album}")
-            self.add_album_to_playlist(album["albumid"])
+    def cancel_fill_playlist(self):
+        # Stop adding items of a previous play request in the background
+        if self.fill_thread is not None and self.fill_thread.is_alive():
+            log.info("Cancel adding items to the playlist")
+            self.fill_cancel.set()
+            self.fill_thread.join()
+        self.fill_thread = None
+
+    def fill_playlist(self, items, cancel, start_time):
+        for start in range(0, len(items), self.chunk_size):
+            if cancel.is_set():
+                log.info(f"Adding items cancelled after {start} of {len(items)} items")
+                return
+            self.add_items_to_playlist(items[start:start+self.chunk_size])
+        log.info(f"Playlist complete after {(time.perf_counter()-start_time)*1000:.1f} ms,"\
+            + f" {len(items)} items added while playing")
+
+    def play_items(self, items):
+        '''
+            Replace the playlist by items and start playing.
+            Playing starts after the first first_chunk_size items are added,
+            the other items are added by a background thread
+        '''
+        start_time = time.perf_counter()
+        self.cancel_fill_playlist()
+        self.stop_and_clear_playlist()
+        if self.first_chunk_size > 0:
+            first_items = items[:self.first_chunk_size]
+            other_items = items[self.first_chunk_size:]
+        else:
+            first_items = items
+            other_items = []
+        self.add_items_to_playlist(first_items)
         self.start_play()
+        log.info(f"Time to first sound: {(time.perf_counter()-start_time)*1000:.1f} ms"\
+            + f" ({len(first_items)} of {len(items)} items on playlist)")
+
+        if other_items:
+            self.fill_cancel = threading.Event()
+            self.fill_thread = threading.Thread(target=self.fill_playlist,
+                args=(other_items, self.fill_cancel, start_time), name="fill_playlist")
+            self.fill_thread.start()
+
+    def play_albums(self, albums):
+        log.debug(f"play_albums:{len(albums)} albums")
+        self.play_items([{"albumid": album["albumid"]} for album in albums])
 
     def play_songs(self, songs):
-        log.debug(f"play_songs:songs:{songs}")
-        self.stop_play()
-        self.clear_playlist()
-        for song in songs:
-            log.debug(f"On playlist: {song['songid']},label={song['label']}" \
-                + f"van {song['displaycomposer']}")
-            self.add_song_to_playlist(song["songid"])
-        self.start_play()
+        log.debug(f"play_songs:{len(songs)} songs")
+        self.play_items([{"songid": song["songid"]} for song in songs])
 
 # End Of File
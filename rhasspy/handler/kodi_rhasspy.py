@@ -90,39 +90,183 @@ map_to_SPEECH = (
   'd', 'nj','o', 'o', 'o', 'o', 'eu',' ', 'eu','u', 'u', 'u', 'uu','y', 'th','y'
 )
 
-def get_replacement(char,mapping):
-
-    if ord(char) > 0xff:
-        # No data on characters > 255.
-        return '?'
-    try:
-        return mapping[ord(char)]
-    except IndexError: 
-        log.error(f"Error replacing character {char} =0x{ord(char):02x}")
-
-def decodeUTF8(string,mapping=map_to_ASCII):
-    retval = []
-
-    for char in string:
-        retval.append(get_replacement(char,mapping))
-    return ''.join(retval)
+# Characters above 0xff without a decomposition to latin characters,
+# translated to characters of the mapping tables above
+EXTRA_CHARACTERS = {
+    '\u0110': 'D', '\u0111': 'd', '\u0126': 'H', '\u0127': 'h', '\u0131': 'i',
+    '\u0141': 'L', '\u0142': 'l', '\u0152': 'OE', '\u0153': 'oe', '\u0166': 'T', '\u0167': 't',
+    '\u2010': '-', '\u2011': '-', '\u2012': '-', '\u2013': '-', '\u2014': '-', '\u2015': '-',
+    '\u2018': '\'', '\u2019': '\'', '\u201a': ',', '\u201b': '\'',
+    '\u201c': '"', '\u201d': '"', '\u201e': '"', '\u201f': '"',
+    '\u2022': '*', '\u2026': '...', '\u2032': '\'', '\u2033': '"',
+    '\u2039': '<', '\u203a': '>', '\u20ac': 'EUR', '\u2122': '(tm)',
+}
+
+class TranslationTable(dict):
+    '''
+        Translation table for str.translate, made from a mapping table
+        (map_to_ASCII, map_to_SPEECH) for the characters 0x00-0xff.
+        Other characters are looked up when they are used (__missing__):
+        EXTRA_CHARACTERS or the unicode decomposition (e.g. c with caron
+        becomes c), translated with the mapping table. Combining accents
+        are removed.
+        Characters that cannot be translated become fallback.
+        With extended=False every character above 0xff becomes fallback.
+    '''
+    def __init__(self, mapping, fallback='?', extended=True):
+        super().__init__(enumerate(mapping))
+        self.fallback = fallback
+        self.extended = extended
+
+    def __missing__(self, code):
+        replacement = self.fallback
+        if self.extended:
+            char = chr(code)
+            latin = EXTRA_CHARACTERS.get(char)
+            if latin is None:
+                latin = ''.join(c for c in unicodedata.normalize('NFKD', char) if ord(c) <= 0xff)
+            if latin:
+                replacement = latin.translate(self)
+            elif unicodedata.combining(char):
+                replacement = ''  # accent of the previous character
+        self[code] = replacement
+        return replacement
+
+translation_tables = {}
+
+def get_translation_table(mapping=map_to_ASCII, fallback='?', extended=True):
+    key = (id(mapping), fallback, extended)
+    if key not in translation_tables:
+        translation_tables[key] = TranslationTable(mapping, fallback, extended)
+    return translation_tables[key]
+
+def decodeUTF8(string,mapping=map_to_ASCII,fallback='?'):
+    return string.translate(get_translation_table(mapping, fallback))
+
+def decodeUTF8_batch(strings,mapping=map_to_ASCII,fallback='?'):
+    # Translate a list of strings (e.g. all labels) with the same table
+    table = get_translation_table(mapping, fallback)
+    return [string.translate(table) for string in strings]
 
 
 import datetime
 import requests
 import logging
+import hashlib
+import unicodedata
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 import json
-import re
+import time
+import os
 
 from kodi import Kodi
 from rhasspy import Rhasspy
+from normalize import Normalizer
+from slotbuilder import SlotBuilder
 log = logging.getLogger(__name__)
 
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kodi_rules.json")
+
+# Compiled rules per rules file, shared by all instances
+normalizers = {}
+
+def get_normalizer(rules_file):
+    if rules_file not in normalizers:
+        normalizers[rules_file] = Normalizer.from_file(rules_file,
+            {"speech": lambda string: decodeUTF8(string, map_to_SPEECH)})
+    return normalizers[rules_file]
+
+# Slot: (rules for the filter, rules for the speech, skip empty entries)
+SLOT_RULES = {
+    "songs": ("songtitle_filter", "songtitle_speech", True),
+    "composers": ("all_filter", "all_speech", False),
+    "artists": ("all_filter", "all_speech", False),
+    "albums": ("all_filter", "all_speech", True),
+    "genres": ("all_filter", "all_speech", False),
+}
+CLEAN_CHUNK_SIZE = 2000
+
+def clean_labels(rules_file, slotname, labels):
+    # Return (filter, speech) for every label, runs in a worker process
+    (filter_rules, speech_rules, skip_empty) = SLOT_RULES[slotname]
+    normalizer = get_normalizer(rules_file)
+    clean_filter = normalizer.get_pipeline(filter_rules)
+    clean_speech = normalizer.get_pipeline(speech_rules)
+    result = []
+    for label in labels:
+        filter_label = clean_filter(label)
+        result.append((filter_label, clean_speech(filter_label)))
+    return result
+
+class SlotCollector:
+    '''
+        Collects the labels of one slot. Every CLEAN_CHUNK_SIZE labels are
+        cleaned by the executor (or right away without executor), the
+        results are merged in the order of the labels.
+        A label is cleaned only once: adding the same entry to a slot
+        again (SlotBuilder.add) does not change the slot.
+    '''
+    def __init__(self, slotname, rules_file, executor=None):
+        self.slotname = slotname
+        self.rules_file = rules_file
+        self.executor = executor
+        self.labels = []
+        self.seen = set()
+        self.results = []   # futures or lists of (filter, speech)
+
+    def add(self, label):
+        if label in self.seen:
+            return
+        self.seen.add(label)
+        self.labels.append(label)
+        if len(self.labels) >= CLEAN_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.labels:
+            return
+        if self.executor is None:
+            self.results.append(clean_labels(self.rules_file, self.slotname, self.labels))
+        else:
+            self.results.append(self.executor.submit(clean_labels,
+                self.rules_file, self.slotname, self.labels))
+        self.labels = []
+
+    def get_slot(self):
+        self.flush()
+        skip_empty = SLOT_RULES[self.slotname][2]
+        slot = SlotBuilder()
+        for result in self.results:
+            if isinstance(result, Future):
+                result = result.result()
+            for (filter_label, speech_label) in result:
+                if skip_empty and (filter_label == "" or speech_label == ""):
+                    continue
+                slot.add(speech_label, filter_label)
+        return slot
+
+    def cancel(self):
+        # Cancel the cleaning of the chunks that did not start yet
+        for result in self.results:
+            if isinstance(result, Future):
+                result.cancel()
+
 class Kodi_Rhasspy:
 
-    def __init__(self, kodi, rhasspy):
+    def __init__(self, kodi, rhasspy, state_file="", rules_file=RULES_FILE, workers=0):
         self.kodi = kodi
         self.rhasspy = rhasspy
+        # worker processes for cleaning the labels (0: clean in this process)
+        self.workers = workers
+        self.rules_file = rules_file
+        # fingerprints of the library and the slots of the last update ("": none)
+        self.state_file = state_file
+        # The cleaning rules are in a rules file (see normalize.py)
+        normalizer = get_normalizer(rules_file)
+        self.all_filter = normalizer.get_pipeline("all_filter")
+        self.all_speech = normalizer.get_pipeline("all_speech")
+        self.songtitle_filter = normalizer.get_pipeline("songtitle_filter")
+        self.songtitle_speech = normalizer.get_pipeline("songtitle_speech")
 
     # 
     # ========================================================================
@@ -130,112 +274,19 @@ class Kodi_Rhasspy:
     # ========================================================================
     # Clean Slot_entry to match with filter
     def clean_all_filter(self,slot_entry):
-        cleaned = slot_entry
-        # skip everyting after ; or ,
-        cleaned = re.sub('[;,].*','',cleaned)
-        # skip leading numbers followed by - with spaces
-        cleaned = re.sub('^[0-9 ]*-* *','',cleaned)
-        # remove [ until the end : [] give problems in kaldi (rhasspy)
-        cleaned = re.sub('\[.*','',cleaned)
-        # remove ( until the end : () give problems in kaldi (rhasspy)
-        cleaned = re.sub('\(.*','',cleaned) 
-        # remove leading and trailing spaces
-        cleaned = cleaned.strip()
-        log.debug(f"clean_all_filter:<{slot_entry}> clean:<{cleaned}>")
-
-        return cleaned
-        
+        return self.all_filter(slot_entry)
+
     # Clean slot_entry to match with speech
     def clean_all_speech(self,slot_entry):
-        cleaned = self.clean_all_filter(slot_entry)
-        cleaned = re.sub('&',' en ',cleaned)
-        cleaned = decodeUTF8(cleaned, map_to_SPEECH)
-        cleaned = re.sub('[^a-zA-Z0-9]',' ',cleaned)
-        cleaned = re.sub('  *',' ',cleaned)
-
-        cleaned = cleaned.strip()
-        log.debug(f"clean_all_speech:<{slot_entry}> clean:<{cleaned}>")
-
-        return cleaned
+        return self.all_speech(slot_entry)
 
     # Clean Songtitle to match with filter
     def clean_songtitle_filter(self,songtitle):
-        cleaned = songtitle.lower()
-        # skip leading numbers followed by - with spaces
-        cleaned = re.sub('^[0-9 ]*-* *','',cleaned)
-        # remove leading composername followed by :
-        cleaned = re.sub('^[a-z]*:','',cleaned)
-        # keep only part before - or :
-        cleaned = re.sub('[-:].*','',cleaned)
-        # remove [ until the end
-        cleaned = re.sub('\[.*','',cleaned)
-        # remove ( until the end
-        cleaned = re.sub('\(.*','',cleaned) # () give problems in kaldi (rhasspy)
-        # remove Op. 23
-        cleaned = re.sub('^[a-z]+[. ]*[0-9]+ *[0-9]*','',cleaned)
-        cleaned = re.sub(' in (bes|cis|des|fis|ges|as|es|[a-g])* .*$',' ',cleaned)
-        cleaned = re.sub('(bes|cis|des|fis|ges|as|es|[a-g]) (sharp|flat|moll|dur|majeur|mineur|major|minor|maj|min|klein|groot)$',' ',cleaned)
-        cleaned = re.sub('([0-9])  *[0-9a-z]\.* .*$','\\1',cleaned)
-        cleaned = re.sub('([0-9])  *[0-9.a-z]$','\\1',cleaned)
-        cleaned = re.sub('[0-9]\..*','',cleaned) # . after number gives compile error??
-        # very specific substitutions:
-        cleaned = re.sub('.*contrapunctus.*','contrapunctus',cleaned)
-        cleaned = re.sub('canto ostinato.*','canto ostinato',cleaned)
-        cleaned = re.sub('goldberg variations.*','goldberg variations',cleaned)
-        
-        # remove leading and trailing spaces
-        cleaned = cleaned.strip()
-        log.debug(f"clean_songtitle_filter:<{songtitle}> clean:<{cleaned}>")
-
-        return cleaned
-        
+        return self.songtitle_filter(songtitle)
+
     # Clean songtitle to match with speech
     def clean_songtitle_speech(self,songtitle):
-        cleaned = self.clean_songtitle_filter(songtitle)
-        # No.4 1 
-        cleaned = re.sub('( no.\d) [1-9x].*','\\1',cleaned)
-        cleaned = re.sub('op[. ]+\d*[-/0-9]*', '', cleaned)
-        cleaned = re.sub('violin concerto.*','vioolconcert',cleaned)
-        cleaned = re.sub('\.\.\.',',',cleaned)
-        cleaned = re.sub('\[[^\]]*\]',' ',cleaned)
-        cleaned = re.sub('["\'!]',' ',cleaned)
-        cleaned = re.sub('[({].*[)}]',' ',cleaned)
-        cleaned = re.sub(',',' ',cleaned)
-        cleaned = re.sub('no\.','nummer ',cleaned)
-        cleaned = re.sub('nr\.','nummer ',cleaned)
-        cleaned = re.sub('&',' en ',cleaned)
-        cleaned = decodeUTF8(cleaned, map_to_SPEECH)
-
-        cleaned = re.sub('  *',' ',cleaned)
-
-        cleaned = cleaned.strip()
-        log.debug(f"clean_songtitle_speech:<{songtitle}> clean:<{cleaned}>")
-
-        return cleaned
-
-    '''
-        Add to dict adds a speech to a list of entries
-        If the speech already exists (we already have a filter defined)
-        We check for:
-        new is part of old: use new
-        old is part of new: use old
-        
-    '''
-    def add_to_dict(self,slot_entries,new_speech,new_filter):
-        if new_speech in slot_entries:
-            old_filter = slot_entries[new_speech]
-            if new_filter in old_filter:
-                my_filter = new_filter
-            elif old_filter in new_filter:
-                my_filter = old_filter
-            else: # TODO Check the code
-                my_filter = old_filter
-                while not new_filter.startswith(old_filter):
-                    old_filter = old_filter[:-1]
-        else:
-            my_filter = new_filter
-            
-        slot_entries[new_speech] = my_filter
+        return self.songtitle_speech(songtitle)
 
     def dump(self,data):
         if type(data) is str:
@@ -251,83 +302,219 @@ class Kodi_Rhasspy:
                 fslots.write(line+'\n')
             fslots.close()
 
-    def save_slots(self,slots_dict,slotname):
-        slots = []
-        for speech,title in sorted(slots_dict.items()):
-            if title.startswith(speech):
-                slots.append(speech)
-            else:
-                slots.append(f"({speech}):({title})")
-        slots_dict = { slotname :  slots }
+    def save_slots(self,slots,slotname):
+        return self.save_slots_lines(slotname, slots.get_lines())
+
+    def save_slots_lines(self,slotname,lines):
+        slots_dict = { slotname :  lines }
         log.debug(f"Send to Rhasspy:<<<<{json.dumps(slots_dict)}>>>>")
-        self.rhasspy.rhasspy_replace_slots(json.dumps(slots_dict))
+        return self.rhasspy.rhasspy_replace_slots(json.dumps(slots_dict))
+
+    # Add the slot entries of one song/album to the slot(s)
+    def add_album_slot(self,albumslots,album):
+        filter_album = self.clean_all_filter(album["label"])
+        speech_album = self.clean_all_speech(filter_album)
+        if filter_album == "" or speech_album == "":
+            return
+        albumslots.add(speech_album,filter_album)
+
+    def add_song_slot(self,songslots,song):
+        filter_song = self.clean_songtitle_filter(song["label"])
+        speech_song = self.clean_songtitle_speech(filter_song)
+        if filter_song == "" or speech_song == "":
+            return
+        songslots.add(speech_song,filter_song)
+
+    def add_composer_slot(self,composerslots,song):
+        filter_composer = self.clean_all_filter(song["displaycomposer"])
+        speech_composer = self.clean_all_speech(filter_composer)
+        composerslots.add(speech_composer,filter_composer)
+
+    def add_artist_slots(self,artistslots,album):
+        for artist in album["artist"]:
+            filter_artist = self.clean_all_filter(artist)
+            speech_artist = self.clean_all_speech(filter_artist)
+            artistslots.add(speech_artist,filter_artist)
+
+    def add_genre_slots(self,genreslots,album):
+        for genre in album["genre"]:
+            filter_genre = self.clean_all_filter(genre)
+            speech_genre = self.clean_all_speech(filter_genre)
+            genreslots.add(speech_genre,filter_genre)
 
     def create_slots_albums(self,albums):
-        albumslots = {}
-        
+        albumslots = SlotBuilder()
         for album in albums:
-            filter_album = self.clean_all_filter(album["label"])
-            speech_album = self.clean_all_speech(filter_album)
-            if filter_album == "" or speech_album == "":
-                continue
-            self.add_to_dict(albumslots,speech_album,filter_album)
-
+            self.add_album_slot(albumslots,album)
         self.save_slots(albumslots,"albums")
 
     def create_slots_songs(self,songs):
-        songslots = {}
+        songslots = SlotBuilder()
         for song in songs:
-            filter_song = self.clean_songtitle_filter(song["label"])
-            speech_song = self.clean_songtitle_speech(filter_song)
-            if filter_song == "" or speech_song == "":
-                continue
-            self.add_to_dict(songslots,speech_song,filter_song)
-
+            self.add_song_slot(songslots,song)
         self.save_slots(songslots,"songs")
 
     def create_slots_composers(self,songs):
-        composerslots = {}
+        composerslots = SlotBuilder()
         for song in songs:
-            filter_composer = self.clean_all_filter(song["displaycomposer"])
-            speech_composer = self.clean_all_speech(filter_composer)
-            self.add_to_dict(composerslots,speech_composer,filter_composer)
-
+            self.add_composer_slot(composerslots,song)
         self.save_slots(composerslots,"composers")
 
     def create_slots_artists(self,albums):
-        artistslots = {}
+        artistslots = SlotBuilder()
         for album in albums:
-            for artist in album["artist"]:
-                filter_artist = self.clean_all_filter(artist)
-                speech_artist = self.clean_all_speech(filter_artist)
-                self.add_to_dict(artistslots,speech_artist,filter_artist)
-
+            self.add_artist_slots(artistslots,album)
         self.save_slots(artistslots,"artists")
 
-
     def create_slots_genres(self,albums):
-        genreslots = {}
+        genreslots = SlotBuilder()
         for album in albums:
-            for genre in album["genre"]:
-                filter_genre = self.clean_all_filter(genre)
-                speech_genre = self.clean_all_speech(filter_genre)
-                self.add_to_dict(genreslots,speech_genre,filter_genre)
-
+            self.add_genre_slots(genreslots,album)
         self.save_slots(genreslots,"genres")
-  
+
+    # ========================================================================
+    # Incremental update of the slots
+    # The state file keeps a fingerprint of the library (songs, albums) and
+    # of every slot with its lines, of the last update.
+    # Only slots with changed lines are sent and Rhasspy is only trained
+    # when at least one slot changed.
+    # ========================================================================
+    def load_state(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {"library": {}, "slots": {}}
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError) as exc:
+            log.warning(f"Cannot read slots state {self.state_file}: {exc}")
+            return {"library": {}, "slots": {}}
+
+    def save_state(self, state):
+        if not self.state_file:
+            return
+        try:
+            with open(self.state_file+".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(self.state_file+".tmp", self.state_file)
+        except OSError as exc:
+            log.warning(f"Cannot write slots state {self.state_file}: {exc}")
+
+    def get_fingerprint(self, lines):
+        digest = hashlib.sha256()
+        for line in lines:
+            digest.update(line.encode("utf-8"))
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    def read_library(self, items, add_labels):
+        # Stream items from Kodi, add their labels to the slots, return
+        # the number of items and the fingerprint of the items
+        count = 0
+        fingerprint = hashlib.sha256()
+        for item in items:
+            fingerprint.update(repr(item).encode("utf-8"))
+            add_labels(item)
+            count += 1
+        return {"count": count, "fingerprint": fingerprint.hexdigest()}
+
+    def get_slots_diff(self, old_lines, new_lines):
+        old_lines = set(old_lines)
+        new_lines = set(new_lines)
+        return (len(new_lines - old_lines), len(old_lines - new_lines))
+
     def create_slots_files(self):
-        songs = self.kodi.get_songs(genre="Klassiek")
-        if len(songs) > 0:
-            self.create_slots_songs(songs)
-            self.create_slots_composers(songs)
-        albums = self.kodi.get_albums()
-        if len(albums) > 0:
-            self.create_slots_artists(albums)
-            self.create_slots_albums(albums)
-            self.create_slots_genres(albums)
-        res = self.rhasspy.rhasspy_train()
-        if res and res.status_code != 200:
-            return res.text
+        # Songs and albums are read from Kodi at the same time, page by page.
+        # The labels are cleaned in worker processes (chunk by chunk, while
+        # Kodi is read), all changed slots are sent in one request.
+        timings = {"fetch": 0.0, "clean": 0.0, "post": 0.0, "train": 0.0}
+        state = self.load_state()
+
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 0 else None
+        collectors = {slotname: SlotCollector(slotname, self.rules_file, executor)
+                      for slotname in SLOT_RULES}
+        def add_song(song):
+            collectors["songs"].add(song["label"])
+            collectors["composers"].add(song["displaycomposer"])
+        def add_album(album):
+            for artist in album["artist"]:
+                collectors["artists"].add(artist)
+            collectors["albums"].add(album["label"])
+            for genre in album["genre"]:
+                collectors["genres"].add(genre)
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(2) as readers:
+                songs = readers.submit(self.read_library,
+                    self.kodi.iter_songs(genre="Klassiek"), add_song)
+                albums = readers.submit(self.read_library,
+                    self.kodi.iter_albums(), add_album)
+                library = {"songs": songs.result(), "albums": albums.result()}
+            timings["fetch"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            slots = {}
+            for (source, slotnames) in (("songs", ("songs", "composers")),
+                                        ("albums", ("artists", "albums", "genres"))):
+                if library[source]["count"] > 0:
+                    for slotname in slotnames:
+                        slot = collectors[slotname].get_slot()
+                        log.info(f"Slot {slotname}: {slot.get_stats()}")
+                        slots[slotname] = slot.get_lines()
+            timings["clean"] = time.perf_counter() - start
+        finally:
+            if executor is not None:
+                # shutdown(cancel_futures=True) needs python 3.9
+                for collector in collectors.values():
+                    collector.cancel()
+                executor.shutdown(wait=True)
+
+        for name, info in library.items():
+            old_info = state["library"].get(name, {})
+            changed = "changed" if info != old_info else "unchanged"
+            log.info(f"Library {name}: {info['count']} (was {old_info.get('count', '-')}), {changed}")
+        state["library"] = library
+
+        changed_slots = {}
+        for slotname, lines in slots.items():
+            fingerprint = self.get_fingerprint(lines)
+            old_slot = state["slots"].get(slotname, {})
+            if fingerprint == old_slot.get("fingerprint"):
+                log.info(f"Slot {slotname}: {len(lines)} entries, unchanged")
+                continue
+            (added, removed) = self.get_slots_diff(old_slot.get("lines", []), lines)
+            log.info(f"Slot {slotname}: {len(lines)} entries, {added} added, {removed} removed")
+            changed_slots[slotname] = {"fingerprint": fingerprint, "lines": lines}
+
+        # Send the changed slots, keep the old state when sending fails
+        error = None
+        if changed_slots:
+            start = time.perf_counter()
+            slots_dict = {slotname: slot["lines"] for (slotname, slot) in changed_slots.items()}
+            log.debug(f"Send to Rhasspy:<<<<{json.dumps(slots_dict)[:1000]}>>>>")
+            res = self.rhasspy.rhasspy_replace_slots(json.dumps(slots_dict))
+            timings["post"] = time.perf_counter() - start
+            if res is None or res.status_code != 200:
+                error = res.text if res is not None else "Error sending slots"
+                changed_slots = {}
+            state["slots"].update(changed_slots)
+
+        if changed_slots:
+            start = time.perf_counter()
+            res = self.rhasspy.rhasspy_train()
+            timings["train"] = time.perf_counter() - start
+            if res is None or res.status_code != 200:
+                # Train again next time, even when the slots are the same
+                for slotname in slots:
+                    state["slots"].pop(slotname, None)
+                error = res.text if res is not None else "Error training Rhasspy"
+        self.save_state(state)
+
+        log.info(f"Slots created for {library['songs']['count']} songs and"\
+            + f" {library['albums']['count']} albums, {len(changed_slots)} slots changed"\
+            + ("" if changed_slots else ", not trained")\
+            + ", " + ", ".join(f"{phase}:{duration*1000:.0f} ms" for phase, duration in timings.items()))
+        return error
 
 
 if __name__ == '__main__':
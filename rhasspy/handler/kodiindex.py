@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+import re
+import time
+import sqlite3
+import datetime
+
+import logging
+log = logging.getLogger(__name__)
+
+'''
+    Local index of the Kodi music library (SQLite), so songs and albums
+    can be found without querying Kodi.
+    A search value matches a field when the field contains the value
+    anywhere (case insensitive), with LIKE '%value%' just like the "contains"
+    filter of Kodi, so "concert" also finds "Vioolconcert in D".
+    The index is synchronized with Kodi using the dateadded of songs/albums,
+    only songs and albums added since the last synchronization are retrieved.
+    When Kodi has less songs or albums than the index (something was removed)
+    the index is rebuilt.
+'''
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (songid INTEGER PRIMARY KEY, label TEXT,
+    displayartist TEXT, displaycomposer TEXT, artist TEXT, title TEXT,
+    genre TEXT, dateadded TEXT);
+CREATE TABLE IF NOT EXISTS albums (albumid INTEGER PRIMARY KEY, label TEXT,
+    artist TEXT, genre TEXT, dateadded TEXT);
+DROP TABLE IF EXISTS tokens;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+SONG_PROPERTIES = ("title", "artist", "displayartist", "displaycomposer", "genre", "dateadded")
+ALBUM_PROPERTIES = ("title", "artist", "genre", "dateadded")
+
+def like_contains(value):
+    # LIKE pattern for "contains value", % and _ in value are no wildcards
+    return "%" + re.sub(r"([\\%_])", r"\\\1", value) + "%"
+
+def join_list(value):
+    if isinstance(value, list):
+        return " / ".join(value)
+    return value or ""
+
+
+class KodiIndex:
+
+    def __init__(self, filename, kodi, max_age=3600):
+        self.kodi = kodi
+        self.max_age = max_age   # seconds between synchronizations
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.last_check = self.get_last_sync()
+
+    def get_meta(self, key, default=""):
+        row = self.db.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def get_last_sync(self):
+        '''
+            Time (seconds since the epoch) of the last synchronization stored
+            in the index, 0 if the index was never synchronized. So a restart
+            of the handler does not synchronize a fresh index again.
+        '''
+        last_sync = self.get_meta("last_sync")
+        try:
+            return datetime.datetime.strptime(last_sync, "%Y-%m-%d %H:%M:%S").timestamp()
+        except ValueError:
+            return 0
+
+    def count(self, table):
+        return self.db.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Synchronization with Kodi
+    # ------------------------------------------------------------------
+    def add_song(self, song):
+        songid = song["songid"]
+        # Kodi filters on artist also match the composer
+        artist = join_list(song.get("artist")) + " / " + song.get("displaycomposer", "")
+        title = song.get("title") or song.get("label", "")
+        genre = join_list(song.get("genre"))
+        self.db.execute("INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (songid, song.get("label", title), song.get("displayartist", ""),
+             song.get("displaycomposer", ""), artist, title, genre, song.get("dateadded", "")))
+
+    def add_album(self, album):
+        albumid = album["albumid"]
+        label = album.get("label") or album.get("title", "")
+        artist = join_list(album.get("artist"))
+        genre = join_list(album.get("genre"))
+        self.db.execute("INSERT OR REPLACE INTO albums VALUES (?, ?, ?, ?, ?)",
+            (albumid, label, artist, genre, album.get("dateadded", "")))
+
+    def get_added_after(self, table):
+        # Kodi compares dates without time, so start a day earlier
+        # Songs/albums that are already in the index are replaced
+        last = self.db.execute(f"SELECT max(dateadded) FROM {table}").fetchone()[0]
+        if not last:
+            return None
+        try:
+            date = datetime.datetime.strptime(last[:10], "%Y-%m-%d") - datetime.timedelta(days=1)
+        except ValueError:
+            return None
+        return date.strftime("%Y-%m-%d")
+
+    def sync_table(self, table, total, iter_items, properties, add_item):
+        # Retrieve the songs/albums added since the last synchronization
+        added = 0
+        for item in iter_items(properties, self.get_added_after(table)):
+            add_item(item)
+            added += 1
+        if self.count(table) != total:
+            # Songs/albums were removed (or the index is incomplete): rebuild
+            log.info(f"Kodi library index: {table} in Kodi:{total}, in index:"\
+                + f"{self.count(table)}, rebuilding the {table}")
+            self.db.execute(f"DELETE FROM {table}")
+            added = 0
+            for item in iter_items(properties, None):
+                add_item(item)
+                added += 1
+        return added
+
+    def sync(self, force=False):
+        '''
+            Synchronize the index with Kodi, at most once every max_age seconds
+            (unless force is True). Returns the number of songs and albums retrieved
+        '''
+        if not force and time.time() - self.last_check < self.max_age:
+            return (0, 0)
+        start = time.perf_counter()
+        (songs_total, albums_total) = self.kodi.get_library_totals()
+        if songs_total is None:
+            log.warning("Kodi library index: no answer from Kodi, using the index as it is")
+            return (0, 0)
+        self.last_check = time.time()
+
+        songs_added = self.sync_table("songs", songs_total,
+            self.kodi.iter_all_songs, SONG_PROPERTIES, self.add_song)
+        albums_added = self.sync_table("albums", albums_total,
+            self.kodi.iter_all_albums, ALBUM_PROPERTIES, self.add_album)
+        self.set_meta("last_sync", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self.db.commit()
+        log.info(f"Kodi library index synchronized in {(time.perf_counter()-start)*1000:.1f} ms:"\
+            + f" {songs_added} songs and {albums_added} albums retrieved,"\
+            + f" index has {self.count('songs')} songs and {self.count('albums')} albums")
+        return (songs_added, albums_added)
+
+    # ------------------------------------------------------------------
+    # Searching
+    # ------------------------------------------------------------------
+    def find(self, table, key, columns, conditions):
+        '''
+            conditions is a list of (column, value), return rows (as dict)
+            where every column contains its value (as the Kodi filter
+            "contains"). Empty values are skipped, without conditions
+            nothing is returned.
+        '''
+        conditions = [(column, value) for (column, value) in conditions if value]
+        if not conditions:
+            return []
+        where = " AND ".join(f"{column} LIKE ? ESCAPE '\\'" for (column, value) in conditions)
+        select = ", ".join(columns)
+        rows = self.db.execute(f"SELECT {select} FROM {table} WHERE {where} ORDER BY {key}",
+                               tuple(like_contains(value) for (column, value) in conditions))
+        return [dict(zip(columns, row)) for row in rows]
+
+    def find_songs(self, artist="", composer="", title="", selection="", genre=""):
+        conditions = [("artist", artist), ("artist", composer), ("title", title), ("genre", genre)]
+        if selection:
+            conditions.extend(("title", select) for select in selection.split(","))
+        songs = self.find("songs", "songid",
+            ("songid", "label", "displayartist", "displaycomposer", "artist", "title", "genre"),
+            conditions)
+        log.debug(f"find_songs: found {len(songs)} songs in index")
+        return songs
+
+    def find_albums(self, artist="", album="", genre=""):
+        albums = self.find("albums", "albumid", ("albumid", "label", "artist", "genre"),
+            [("artist", artist), ("label", album), ("genre", genre)])
+        albums.sort(key=lambda album: album["label"].lower())
+        log.debug(f"find_albums: found {len(albums)} albums in index")
+        return albums
+
+# End Of File
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+import json
+
+'''
+    Build requests for the Kodi JSON-RPC API as dicts instead of strings.
+    Example:
+        request = KodiRequest("AudioLibrary.GetSongs", "libSongs")\
+            .properties("displayartist", "displaycomposer")\
+            .filter(Filter.all_of(Filter.contains("artist", "Bach"),
+                                  Filter.contains("title", "cantate")))\
+            .limits(0, 500)
+        data = request.serialize()
+    Requests that never change can be serialized once and reused.
+'''
+
+class Filter:
+    '''
+        Filter rules for the filter parameter of AudioLibrary methods.
+        all_of and any_of combine rules, empty rules (None) are skipped
+    '''
+    @staticmethod
+    def rule(field, operator, value):
+        return {"field": field, "operator": operator, "value": value}
+
+    @staticmethod
+    def contains(field, value):
+        return Filter.rule(field, "contains", value)
+
+    @staticmethod
+    def combine(operator, rules):
+        rules = [rule for rule in rules if rule]
+        if len(rules) == 0:
+            return None
+        if len(rules) == 1:
+            return rules[0]
+        return {operator: rules}
+
+    @staticmethod
+    def all_of(*rules):
+        return Filter.combine("and", rules)
+
+    @staticmethod
+    def any_of(*rules):
+        return Filter.combine("or", rules)
+
+
+class KodiRequest:
+    def __init__(self, method, id=1, **params):
+        self.method = method
+        self.id = id
+        self.params = params
+
+    def param(self, name, value):
+        self.params[name] = value
+        return self
+
+    def properties(self, *properties):
+        return self.param("properties", list(properties))
+
+    def filter(self, rule):
+        if rule:
+            self.params["filter"] = rule
+        return self
+
+    def sort(self, method, order="ascending", ignorearticle=False):
+        sort = {"order": order, "method": method}
+        if ignorearticle:
+            sort["ignorearticle"] = True
+        return self.param("sort", sort)
+
+    def limits(self, start, end):
+        return self.param("limits", {"start": start, "end": end})
+
+    def payload(self):
+        payload = {"jsonrpc": "2.0", "method": self.method, "id": self.id}
+        if self.params:
+            payload["params"] = self.params
+        return payload
+
+    def serialize(self):
+        return json.dumps(self.payload())
+
+    def serialize_page(self, start, end):
+        # Serialize with limits start..end, without changing the request
+        payload = self.payload()
+        payload["params"] = dict(payload.get("params", {}), limits={"start": start, "end": end})
+        return json.dumps(payload)
+
+
+def serialize_batch(requests):
+    '''
+        Serialize a list of requests as one JSON-RPC batch
+    '''
+    return json.dumps([request.payload() for request in requests])
+
+# End Of File
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+   
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+'''
+    Normalization of strings (titles, names) by a list of rules.
+    The rules are read from a JSON file with named pipelines, e.g.:
+    {
+      "all_filter": [
+        {"sub": "^[0-9 ]*-* *", "with": ""},
+        {"strip": true}
+      ],
+      "all_speech": [
+        {"pipeline": "all_filter"},
+        {"sub": "&", "with": " en "},
+        {"call": "speech"}
+      ]
+    }
+    A step is one of:
+      sub/with : regular expression and replacement (re.sub)
+      lower    : convert to lowercase
+      strip    : remove leading and trailing spaces
+      pipeline : all steps of another pipeline
+      call     : a function given to the Normalizer (e.g. character mapping)
+    Optional keys (like "comment") are ignored.
+    The patterns are compiled once, pipelines are flattened to a list of
+    functions and the results are cached, titles often occur more than once.
+'''
+
+import functools
+import json
+import re
+import logging
+log = logging.getLogger(__name__)
+
+
+class NormalizeError(Exception):
+    pass
+
+
+class Normalizer:
+
+    def __init__(self, rules, functions=None, cache_size=65536):
+        self.rules = rules
+        self.functions = functions or {}
+        self.pipelines = {}
+        for name in rules:
+            if not name.startswith("_"):
+                steps = self.compile(name, ())
+                self.pipelines[name] = functools.lru_cache(maxsize=cache_size)(
+                    functools.partial(Normalizer.run, steps))
+
+    @classmethod
+    def from_file(cls, filename, functions=None, cache_size=65536):
+        with open(filename, encoding="utf-8") as f:
+            return cls(json.load(f), functions, cache_size)
+
+    def compile(self, name, parents):
+        if name in parents:
+            raise NormalizeError(f"Pipeline {name} includes itself")
+        if name not in self.rules:
+            raise NormalizeError(f"Unknown pipeline {name}")
+        steps = []
+        for rule in self.rules[name]:
+            if "sub" in rule:
+                try:
+                    pattern = re.compile(rule["sub"])
+                except re.error as exc:
+                    raise NormalizeError(f"Pipeline {name}: wrong pattern {rule['sub']}: {exc}")
+                steps.append(functools.partial(pattern.sub, rule.get("with", "")))
+            elif "lower" in rule:
+                steps.append(str.lower)
+            elif "strip" in rule:
+                steps.append(str.strip)
+            elif "pipeline" in rule:
+                steps.extend(self.compile(rule["pipeline"], parents + (name,)))
+            elif "call" in rule:
+                if rule["call"] not in self.functions:
+                    raise NormalizeError(f"Pipeline {name}: unknown function {rule['call']}")
+                steps.append(self.functions[rule["call"]])
+            else:
+                raise NormalizeError(f"Pipeline {name}: unknown rule {rule}")
+        return tuple(steps)
+
+    @staticmethod
+    def run(steps, text):
+        for step in steps:
+            text = step(text)
+        return text
+
+    def normalize(self, name, text):
+        return self.pipelines[name](text)
+
+    def get_pipeline(self, name):
+        return self.pipelines[name]
+
+    def cache_info(self):
+        return {name: pipeline.cache_info() for (name, pipeline) in self.pipelines.items()}
+
+# End Of File
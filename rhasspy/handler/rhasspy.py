@@ -23,8 +23,10 @@ Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
 '''
 
 import json
-import requests
 import logging
+import httppool
+import intentconfig
+from requests.exceptions import RequestException
 
 log = logging.getLogger(__name__)
 
@@ -41,12 +43,14 @@ class Rhasspy:
     def do_post_rhasspy(self, url, data="", headers=HEADERS_TEXT):
         log.debug(f"Post data to rhasspy. url:{url}, data=[{data[:100]}], headers={headers}")
         try:
-            res = requests.post(url, data=data.encode("utf-8"), headers=headers)
+            # No read timeout: listening for a command or training can take long
+            res = httppool.post(url, data=data.encode("utf-8"), headers=headers,
+                                timeout=(intentconfig.get_http_config()["connect_timeout"], None))
             if res.status_code != 200:
                 log.info(f"do_post(Url:[{url}]\n"+
                     f"Result:{res.status_code}, text:[{res}]")
-        except ConnectionError:
-            log.warning(f"ConnectionError for url [{url}]")
+        except RequestException as e:
+            log.warning(f"{type(e).__name__} for url [{url}]")
             return None
 
         if log.isEnabledFor(logging.DEBUG):
@@ -89,11 +93,11 @@ class Rhasspy:
 
     def rhasspy_replace_slots(self,slots):
         log.info(f"Slots=<{slots[:100]}>")
-        self.do_post_rhasspy(self.url+"slots?overwriteAll=true",slots, Rhasspy.HEADERS_JSON)
+        return self.do_post_rhasspy(self.url+"slots?overwriteAll=true",slots, Rhasspy.HEADERS_JSON)
 
 
     def rhasspy_train(self):
-        self.do_post_rhasspy(self.url+"train")
+        return self.do_post_rhasspy(self.url+"train")
 
     def rhasspy_restart(self):
         self.do_post_rhasspy(self.url+"restart")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+'''
+Copyright 2021 - Albert Montijn (montijnalbert@gmail.com)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+   
+   ---------------------------------------------------------------------------
+   Programming is the result of learning from others and making errors.
+   A good programmer often follows the tips and tricks of better programmers.
+   The solution of a problem seldom leads to new or original code.
+   So any resemblance to already existing code is purely coincidental
+'''
+
+
+'''
+    Slot entries for Rhasspy: a speech (the words Rhasspy recognizes) with
+    a value (the filter for Kodi, the idx of a Domoticz device).
+    When a speech is added again with another value:
+    merge=True  (filters): new is part of old: use new,
+                           old is part of new: use old,
+                           otherwise the common prefix of both
+                           (or old when there is no common prefix)
+    merge=False (ids): the first value is kept
+    The number of collisions of each kind is kept in stats.
+'''
+
+import os
+from collections import Counter
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class SlotBuilder:
+
+    def __init__(self, merge=True):
+        self.merge = merge
+        self.entries = {}
+        self.stats = Counter()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, speech, value):
+        self.stats["added"] += 1
+        if speech not in self.entries:
+            self.entries[speech] = value
+            return
+        old_value = self.entries[speech]
+        if old_value == value:
+            self.stats["same"] += 1
+        elif not self.merge:
+            self.stats["kept"] += 1
+        elif value in old_value:
+            self.stats["shorter"] += 1
+            self.entries[speech] = value
+        elif old_value in value:
+            self.stats["longer"] += 1
+        else:
+            prefix = os.path.commonprefix((old_value, value)).rstrip()
+            if prefix:
+                self.stats["prefix"] += 1
+                self.entries[speech] = prefix
+            else:
+                self.stats["kept"] += 1
+
+    def get_lines(self, short=True):
+        '''
+            Return the sorted slot lines "(speech):(value)", or just "speech"
+            when short is True and the value starts with the speech
+        '''
+        lines = []
+        for speech, value in sorted(self.entries.items()):
+            value = str(value)
+            if short and value.startswith(speech):
+                lines.append(speech)
+            else:
+                lines.append(f"({speech}):({value})")
+        return lines
+
+    def get_stats(self):
+        collisions = self.stats["added"] - len(self.entries) - self.stats["same"]
+        return f"{len(self.entries)} entries from {self.stats['added']},"\
+            + f" {self.stats['same']} duplicates, {collisions} collisions"\
+            + "".join(f" {kind}:{self.stats[kind]}" for kind in ("shorter", "longer", "prefix", "kept")
+                      if self.stats[kind])
+
+# End Of File